@@ -37,18 +37,46 @@ def softmax(x):
     exp = np.exp(x - np.max(x, axis=1, keepdims=True))
     return exp / np.sum(exp, axis=1, keepdims=True)
 
+def log_softmax(x):
+    """
+    Applies the log-softmax function to a 2D array in a numerically stable way.
+
+    Args:
+        x (np.ndarray): The input array, typically the logits.
+
+    Returns:
+        np.ndarray: The log-probabilities along the rows of the input array.
+    """
+    shifted = x - np.max(x, axis=1, keepdims=True)
+    return shifted - np.log(np.sum(np.exp(shifted), axis=1, keepdims=True))
+
+def nll_loss(log_probs, labels):
+    """
+    Computes the negative log-likelihood of integer labels.
+
+    Args:
+        log_probs (np.ndarray): The log-probabilities (after log-softmax).
+        labels (np.ndarray): The integer class labels (shape: [batch_size]).
+
+    Returns:
+        float: The mean negative log-likelihood.
+    """
+    return -np.mean(log_probs[np.arange(labels.shape[0]), labels])
+
 def cross_entropy_loss(preds, labels):
     """
     Computes the cross-entropy loss between predicted probabilities and true labels.
 
     Args:
         preds (np.ndarray): The predicted probabilities (after softmax).
-        labels (np.ndarray): The one-hot encoded true labels.
+        labels (np.ndarray): The one-hot encoded true labels, or integer labels (shape: [batch_size]).
 
     Returns:
         float: The cross-entropy loss value.
     """
     m = labels.shape[0]
+    if labels.ndim == 1:
+        return -np.sum(np.log(preds[np.arange(m), labels] + 1e-8)) / m
     loss = -np.sum(labels * np.log(preds + 1e-8)) / m
     return loss
 
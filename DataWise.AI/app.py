@@ -1,50 +1,377 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import numpy as np
 import json
-import pickle
+import hmac
+import os
+import io
+import itertools
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
 from model import softmax
-from data_utils import tokenize, encode_sentence;
+from data_utils import iter_json_array, iter_ndjson;
+from inference import classify_records, top_k_probabilities
+from model_registry import ModelRegistry, load_bundle
+from metrics import Registry, Counter, Gauge, Histogram, CONTENT_TYPE, server_timing
+from result_cache import ResultCache, SQLiteResultCache, cache_key, cached_predict
+from similarity import query_vectors
 
-with open("models/cnn_model_fixed.pkl", "rb") as f:
-    model = pickle.load(f)
+max_len = 42
 
-with open('word2idx.json', 'r') as f:
-    word2idx = json.load(f)
-with open('label2idx.json', 'r') as f:
-    label2idx = json.load(f)
+# Concurrent /predict requests are grouped into one batched forward pass.
+# Set MICRO_BATCHING=0 to run every request on its own. A request waiting longer than
+# PREDICT_TIMEOUT seconds for its batch gets a 503.
+micro_batching = os.environ.get("MICRO_BATCHING", "1") != "0"
+max_batch_size = 32
+max_batch_wait_ms = 2.0
+predict_timeout = float(os.environ.get("PREDICT_TIMEOUT", "30"))
+batch_chunk_size = 256
 
-idx2label = {v: k for k, v in label2idx.items()}
+# With CASCADE=1, the fast head trained by train.py (fast_head.npz next to the model)
+# answers the inputs it is confident about (softmax margin >= CASCADE_THRESHOLD, default:
+# the threshold saved with the head) and only the rest run through the CNN.
+use_cascade = os.environ.get("CASCADE", "0") != "0"
+cascade_threshold = float(os.environ["CASCADE_THRESHOLD"]) if os.environ.get("CASCADE_THRESHOLD") else None
 
-max_len = 42
+# Repeated exercises are answered from a cache keyed by their token ids and the model
+# version. Set RESULT_CACHE_PATH to share the cache between worker processes through
+# SQLite, RESULT_CACHE_TTL (seconds) to expire entries, or RESULT_CACHE_SIZE=0 to disable it.
+result_cache_size = int(os.environ.get("RESULT_CACHE_SIZE", "4096"))
+result_cache_ttl = float(os.environ["RESULT_CACHE_TTL"]) if os.environ.get("RESULT_CACHE_TTL") else None
+result_cache_path = os.environ.get("RESULT_CACHE_PATH")
+if result_cache_size <= 0:
+    result_cache = None
+elif result_cache_path:
+    result_cache = SQLiteResultCache(result_cache_path, result_cache_size, result_cache_ttl)
+else:
+    result_cache = ResultCache(result_cache_size, result_cache_ttl)
+
+# /similar searches the feature index built by similarity.py (memory-mapped, so every
+# worker shares its pages): the one published with the model version, or else this one.
+# An index built with a different model file is not loaded, since its vectors would not
+# be comparable. SIMILAR_NPROBE overrides the number of IVF lists scanned per query (0
+# for an exact scan).
+similar_index_path = os.environ.get("SIMILAR_INDEX", "models/similar")
+similar_nprobe = int(os.environ["SIMILAR_NPROBE"]) if os.environ.get("SIMILAR_NPROBE") else None
+max_similar_k = 100
+
+# Children are resolved once here so that recording a request costs a few microseconds.
+registry = Registry()
+stage_seconds = Histogram('datawise_predict_stage_seconds', 'Time spent in each stage of a /predict request.',
+                          ['stage'], registry=registry)
+stage_timers = {stage: stage_seconds.labels(stage) for stage in ('encode', 'queue', 'model', 'serialize')}
+request_seconds = Histogram('datawise_request_seconds', 'Request latency by endpoint.', ['endpoint'], registry=registry)
+endpoint_timers = {endpoint: request_seconds.labels(endpoint) for endpoint in ('/predict', '/predict/batch', '/similar')}
+predictions_total = Counter('datawise_predictions_total', 'Predictions served, by predicted label.', ['label'],
+                            registry=registry)
+prediction_counters = {}
+in_flight = Gauge('datawise_requests_in_flight', 'Requests currently being handled, by endpoint.', ['endpoint'],
+                  registry=registry)
+in_flight_gauges = {endpoint: in_flight.labels(endpoint) for endpoint in endpoint_timers}
+model_info = Gauge('datawise_model_info', 'The model being served (1) and the ones replaced by it (0).',
+                   ['version', 'precision', 'path'], registry=registry)
+if result_cache is not None:
+    Counter('datawise_result_cache_hits_total', 'Predictions answered from the result cache.',
+            registry=registry).labels().set_function(lambda: result_cache.hits)
+    Counter('datawise_result_cache_misses_total', 'Predictions not found in the result cache.',
+            registry=registry).labels().set_function(lambda: result_cache.misses)
+    if isinstance(result_cache, SQLiteResultCache):
+        Counter('datawise_result_cache_errors_total', 'Result cache lookups and stores that failed with an SQLite error.',
+                registry=registry).labels().set_function(lambda: result_cache.errors)
+    Gauge('datawise_result_cache_entries', 'Results held by the result cache.',
+          registry=registry).labels().set_function(lambda: len(result_cache))
+
+def load_version(directory, name=None):
+    bundle = load_bundle(directory, name, fallback_directory=".", max_len=max_len, cascade=use_cascade,
+                         cascade_threshold=cascade_threshold, micro_batching=micro_batching,
+                         max_batch_size=max_batch_size, max_wait_ms=max_batch_wait_ms,
+                         similar_index_path=similar_index_path)
+    for label in bundle.label2idx:
+        if label not in prediction_counters:
+            prediction_counters[label] = predictions_total.labels(label)
+    return bundle
+
+def model_info_child(bundle):
+    return model_info.labels(bundle.model_version, getattr(bundle.model, 'precision', 'float32'), bundle.path)
+
+def on_swap(old, new):
+    if old is not None:
+        model_info_child(old).set(0)
+    model_info_child(new).set(1)
+
+# The model, vocabulary, label map, micro-batcher and similarity index are swapped
+# together as one ModelBundle. When MODEL_REGISTRY (default models/registry) exists,
+# its pinned or latest version is served, and newly published versions are loaded and
+# warmed up in the background (checked every MODEL_POLL_SECONDS) before being swapped
+# in; see model_registry.py. Otherwise the model in models/ (the memory-mapped artifact,
+# or the legacy pickle) is served with the vocabulary and label map in the working
+# directory, versioned by MODEL_VERSION or the model file's digest. Handlers read
+# `model_registry.active` once per request, without locking.
+registry_path = os.environ.get("MODEL_REGISTRY", "models/registry")
+poll_seconds = float(os.environ.get("MODEL_POLL_SECONDS", "5"))
+# The registry is loaded here, but its watcher thread (like each micro-batcher's worker)
+# is started by the first request in every process, so gunicorn --preload workers get
+# their own threads.
+if os.path.isdir(registry_path):
+    model_registry = ModelRegistry(registry_path, load_version, poll_seconds, on_swap)
+    model_registry.start()
+else:
+    model_registry = ModelRegistry(None, load_version, on_swap=on_swap)
+    model_registry.swap(load_version("models", os.environ.get("MODEL_VERSION")))
+
+# Rollback and activation need an "Authorization: Bearer <MODEL_ADMIN_TOKEN>" header,
+# and are disabled when MODEL_ADMIN_TOKEN is not set.
+admin_token = os.environ.get("MODEL_ADMIN_TOKEN")
+
+Gauge('datawise_batcher_pending', 'Inputs waiting for the micro-batcher.', registry=registry).labels().set_function(
+    lambda: model_registry.active.batcher.pending() if model_registry.active.batcher is not None else 0)
+Counter('datawise_model_reloads_total', 'Model versions swapped in after the first one.',
+        registry=registry).labels().set_function(lambda: model_registry.reloads)
+Counter('datawise_model_reload_failures_total', 'Model versions that failed to load or warm up.',
+        registry=registry).labels().set_function(lambda: model_registry.failures)
 
 app = Flask(__name__)
 CORS(app)
 
+@app.before_request
+def watch_model_registry():
+    model_registry.watch()
+
+def parse_top_k(data=None, name='top_k'):
+    """
+    Reads the optional top_k option from the JSON body or the query string.
+
+    Args:
+        data (dict, optional): The JSON body of the request.
+        name (str, optional): The name of the option. Defaults to "top_k".
+
+    Returns:
+        int: The number of results to return, or None if the option is missing.
+    """
+    value = data.get(name) if isinstance(data, dict) and name in data else request.args.get(name)
+    if value is None:
+        return None
+    try:
+        top_k = int(value)
+    except (TypeError, ValueError):
+        top_k = 0
+    if top_k < 1:
+        raise ValueError(f'"{name}" must be a positive integer.')
+    return top_k
+
 @app.route('/predict', methods=['POST'])
 def predict():
+    start = time.perf_counter()
+    gauge = in_flight_gauges['/predict']
+    gauge.inc()
+    try:
+        return predict_one(start)
+    finally:
+        gauge.dec()
+        endpoint_timers['/predict'].observe(time.perf_counter() - start)
+
+def predict_one(start):
     if not request.is_json:
         return jsonify({'error': 'Request must be JSON.'}), 400
     
     data = request.get_json()
     if 'exercise' not in data:
         return jsonify({'error': 'Missing "exercise" field in JSON data.'}), 400
+    try:
+        top_k = parse_top_k(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     exercise_text = data['exercise']
+    if not isinstance(exercise_text, str) or not exercise_text.strip():
+        return jsonify({'error': '"exercise" must be a non-empty string.'}), 400
+    bundle = model_registry.active
     
-    encoded = encode_sentence(exercise_text, word2idx, max_len)
-    X = np.expand_dims(encoded, axis=0)
-    
-    preds = model.forward(X)
+    # The result cache lookup is counted in the encode stage.
+    encoded = bundle.encoder.encode(exercise_text)
+    key = cache_key(encoded, bundle.model_version) if result_cache is not None else None
+    cached = result_cache.get(key) if key is not None else None
+    encoded_at = time.perf_counter()
+    if cached is not None:
+        preds = np.expand_dims(cached, axis=0)
+        queued_until = encoded_at
+    elif bundle.batcher is not None:
+        future = bundle.batcher.submit(encoded)
+        try:
+            preds = np.expand_dims(future.result(timeout=predict_timeout), axis=0)
+        except FutureTimeoutError:
+            future.cancel()
+            return jsonify({'error': 'The prediction timed out.'}), 503
+        queued_until = future.batch_started
+    else:
+        preds = bundle.predict_fn(np.expand_dims(encoded, axis=0))
+        queued_until = encoded_at
+    if key is not None and cached is None:
+        result_cache.put(key, preds[0])
+    predicted_at = time.perf_counter()
     predicted_idx = np.argmax(preds, axis=1)[0]
-    predicted_label = idx2label.get(predicted_idx, "Unknown")
+    predicted_label = bundle.idx2label.get(predicted_idx, "Unknown")
+    counter = prediction_counters.get(predicted_label)
+    if counter is not None:
+        counter.inc()
     
-    return jsonify({
-        'exercise': exercise_text,
-        'prediction': predicted_label,
-        'probabilities': preds.tolist()
-    })
+    body = {'exercise': exercise_text, 'prediction': predicted_label}
+    if top_k is None:
+        body['probabilities'] = preds.tolist()
+    else:
+        body['top_k'] = top_k_probabilities(preds[0], bundle.idx2label, top_k)
+    response = jsonify(body)
+    finished_at = time.perf_counter()
+
+    durations = {
+        'encode': encoded_at - start,
+        'queue': queued_until - encoded_at,
+        'model': predicted_at - queued_until,
+        'serialize': finished_at - predicted_at,
+        'total': finished_at - start,
+    }
+    for stage, timer in stage_timers.items():
+        timer.observe(durations[stage])
+    response.headers['Server-Timing'] = server_timing(durations)
+    return response
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    try:
+        top_k = parse_top_k()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    ndjson = request.mimetype in ('application/x-ndjson', 'application/jsonl')
+    if not ndjson and not request.is_json:
+        return jsonify({'error': 'Request must be a JSON array or newline-delimited JSON.'}), 400
+
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8')
+    records = iter_ndjson(stream) if ndjson else iter_json_array(stream)
+    # The opening of the body and its first record are parsed before the 200 headers are
+    # sent, so a body that is not a JSON array (or NDJSON) at all gets a 400. Later
+    # errors can only be reported in the stream.
+    end = object()
+    try:
+        first = next(records, end)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid input: {e}'}), 400
+    if first is not end:
+        records = itertools.chain([first], records)
+    # The whole stream is answered by the version active when it started.
+    bundle = model_registry.active
+    if result_cache is not None:
+        batch_predict = lambda X: cached_predict(result_cache, bundle.predict_fn, X, bundle.model_version)
+    else:
+        batch_predict = bundle.predict_fn
+
+    # The response is streamed, so its latency is recorded when the last line is sent.
+    def generate():
+        start = time.perf_counter()
+        gauge = in_flight_gauges['/predict/batch']
+        gauge.inc()
+        try:
+            for result in classify_records(records, batch_predict, bundle.encoder, bundle.idx2label,
+                                           batch_chunk_size, top_k):
+                counter = prediction_counters.get(result.get('prediction'))
+                if counter is not None:
+                    counter.inc()
+                yield json.dumps(result) + '\n'
+        except ValueError as e:
+            yield json.dumps({'error': f'Invalid input: {e}'}) + '\n'
+        finally:
+            gauge.dec()
+            endpoint_timers['/predict/batch'].observe(time.perf_counter() - start)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/similar', methods=['GET', 'POST'])
+def similar():
+    start = time.perf_counter()
+    gauge = in_flight_gauges['/similar']
+    gauge.inc()
+    try:
+        return similar_exercises()
+    finally:
+        gauge.dec()
+        endpoint_timers['/similar'].observe(time.perf_counter() - start)
+
+def similar_exercises():
+    bundle = model_registry.active
+    similarity_index = bundle.similarity_index
+    if similarity_index is None:
+        return jsonify({'error': 'No similarity index is loaded. Build one with similarity.py.'}), 503
+    if request.method == 'POST':
+        if not request.is_json:
+            return jsonify({'error': 'Request must be JSON.'}), 400
+        data = request.get_json()
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request must be a JSON object.'}), 400
+    else:
+        data = request.args
+    exercise_text = data.get('exercise')
+    if not isinstance(exercise_text, str):
+        return jsonify({'error': 'Missing "exercise" field.'}), 400
+    try:
+        k = parse_top_k(data if request.method == 'POST' else None, name='k') or 5
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if k > max_similar_k:
+        return jsonify({'error': f'"k" must be at most {max_similar_k}.'}), 400
+
+    ids, scores = similarity_index.search(query_vectors(bundle.model, bundle.encoder, [exercise_text]), k, similar_nprobe)
+    results = [dict(similarity_index.item(item_id), score=float(score))
+               for item_id, score in zip(ids[0].tolist(), scores[0].tolist()) if item_id >= 0]
+    return jsonify({'exercise': exercise_text, 'results': results})
+
+@app.route('/model/status', methods=['GET'])
+def model_status():
+    return jsonify(model_registry.status())
+
+def admin_error():
+    """
+    Checks the admin token of a rollback or activation request.
+
+    Returns:
+        tuple: An error response and status code, or None if the request is authorized.
+    """
+    if not admin_token:
+        return jsonify({'error': 'Model administration is disabled; set MODEL_ADMIN_TOKEN to enable it.'}), 403
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {admin_token}'):
+        return jsonify({'error': 'Invalid or missing admin token.'}), 401
+    return None
+
+@app.route('/model/rollback', methods=['POST'])
+def model_rollback():
+    error = admin_error()
+    if error is not None:
+        return error
+    try:
+        model_registry.rollback()
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify(model_registry.status())
+
+@app.route('/model/activate', methods=['POST'])
+def model_activate():
+    error = admin_error()
+    if error is not None:
+        return error
+    if model_registry.directory is None:
+        return jsonify({'error': 'No model registry is configured.'}), 409
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not (data.get('version') is None or isinstance(data.get('version'), str)):
+        return jsonify({'error': 'Request must be a JSON object with a "version" string, or null for the latest.'}), 400
+    try:
+        model_registry.activate(data.get('version'))
+    except KeyError:
+        return jsonify({'error': f'Unknown model version "{data["version"]}".'}), 404
+    # The version is loaded and warmed up in the background; poll /model/status.
+    return jsonify(model_registry.status()), 202
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(registry.render(), mimetype=None, content_type=CONTENT_TYPE)
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,210 @@
+import json
+import struct
+import numpy as np
+
+from model import TextCNN
+from quantize import QuantizedArray, PRECISIONS
+
+MAGIC = b"DWTCNN\0\0"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+def model_arrays(model):
+    """
+    Collects the parameters of a model under the names used in the artifact.
+
+    Args:
+        model (TextCNN): The model.
+
+    Returns:
+        dict: A dictionary mapping array names to parameter arrays.
+    """
+    arrays = {"embeddings": model.embeddings}
+    for fs in model.filter_sizes:
+        arrays[f"conv_filters.{fs}"] = model.conv_filters[fs]
+    arrays["fc_weights"] = model.fc_weights
+    arrays["fc_bias"] = model.fc_bias
+    return arrays
+
+def export_model(model, filename="models/cnn_model.bin", precision="float32"):
+    """
+    Writes an inference-only model artifact without pickle.
+
+    The file starts with a magic string, the format version and the length of a JSON
+    manifest. The manifest holds the model configuration and, for each array, its dtype,
+    shape and byte offset. The arrays follow as contiguous, 64-byte aligned blocks, so
+    they can be memory-mapped directly.
+
+    With precision "int8", every weight except the bias is stored as int8 values plus a
+    "<name>.scale" array of per-channel float32 scales (see `QuantizedArray`).
+
+    Args:
+        model (TextCNN): The model to export.
+        filename (str, optional): The artifact path. Default is "models/cnn_model.bin".
+        precision (str, optional): "float64", "float32" or "int8". Default is "float32".
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}'. Expected one of: {', '.join(PRECISIONS)}.")
+
+    arrays, quantized = {}, {}
+    for name, array in model_arrays(model).items():
+        if precision == "int8" and name != "fc_bias":
+            if not isinstance(array, QuantizedArray):
+                array = QuantizedArray.from_float(array, 0 if name == "embeddings" else -1)
+            arrays[name] = np.ascontiguousarray(array.values)
+            arrays[f"{name}.scale"] = np.ascontiguousarray(array.scale)
+            quantized[name] = array.axis
+        else:
+            if isinstance(array, QuantizedArray):
+                array = array.dequantize()
+            dtype = np.float32 if precision == "int8" else np.dtype(precision)
+            arrays[name] = np.ascontiguousarray(array, dtype=dtype)
+    config = {
+        "vocab_size": model.vocab_size,
+        "embedding_dim": model.embedding_dim,
+        "max_len": model.max_len,
+        "num_filters": model.num_filters,
+        "filter_sizes": list(model.filter_sizes),
+        "num_classes": model.num_classes,
+        "learning_rate": model.lr,
+    }
+
+    entries, offset = {}, 0
+    for name, array in arrays.items():
+        entries[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+    header = json.dumps({"format_version": FORMAT_VERSION, "config": config, "precision": precision,
+                         "quantized": quantized, "arrays": entries}).encode("utf-8")
+    prefix_len = len(MAGIC) + struct.calcsize("<IQ") + len(header)
+    data_start = -(-prefix_len // ALIGNMENT) * ALIGNMENT
+
+    with open(filename, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<IQ", FORMAT_VERSION, len(header)))
+        f.write(header)
+        f.write(b"\0" * (data_start - prefix_len))
+        for name, array in arrays.items():
+            f.seek(data_start + entries[name]["offset"])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+
+def read_manifest(filename):
+    """
+    Reads and validates the manifest of a model artifact.
+
+    Args:
+        filename (str): The artifact path.
+
+    Returns:
+        tuple: A tuple containing:
+            - manifest (dict): The decoded manifest.
+            - data_start (int): The byte offset at which the array data begins.
+    """
+    with open(filename, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"'{filename}' is not a TextCNN model artifact.")
+        fields = f.read(struct.calcsize("<IQ"))
+        if len(fields) < struct.calcsize("<IQ"):
+            raise ValueError(f"'{filename}' is truncated: the header is incomplete.")
+        version, header_len = struct.unpack("<IQ", fields)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported model artifact version {version} (expected {FORMAT_VERSION}).")
+        header = f.read(header_len)
+        if len(header) < header_len:
+            raise ValueError(f"'{filename}' is truncated: the manifest is incomplete.")
+        try:
+            manifest = json.loads(header.decode("utf-8"))
+        except ValueError as e:
+            raise ValueError(f"'{filename}' has a corrupt manifest: {e}") from None
+    prefix_len = len(MAGIC) + struct.calcsize("<IQ") + header_len
+    return manifest, -(-prefix_len // ALIGNMENT) * ALIGNMENT
+
+def expected_shapes(config):
+    """
+    Returns the shape every parameter of a model configuration must have.
+
+    Args:
+        config (dict): The model configuration stored in the manifest.
+
+    Returns:
+        dict: A dictionary mapping array names to shapes.
+    """
+    shapes = {"embeddings": (config["vocab_size"], config["embedding_dim"])}
+    for fs in config["filter_sizes"]:
+        shapes[f"conv_filters.{fs}"] = (fs, config["embedding_dim"], config["num_filters"])
+    shapes["fc_weights"] = (config["num_filters"] * len(config["filter_sizes"]), config["num_classes"])
+    shapes["fc_bias"] = (1, config["num_classes"])
+    return shapes
+
+def check_manifest(filename, manifest, data_start, file_size):
+    """
+    Checks that every array of a manifest has the shape its configuration implies and
+    lies within the file, so a truncated or corrupt artifact is rejected up front.
+
+    Args:
+        filename (str): The artifact path, for error messages.
+        manifest (dict): The decoded manifest.
+        data_start (int): The byte offset at which the array data begins.
+        file_size (int): The size of the file in bytes.
+
+    Raises:
+        ValueError: If an array is missing, has the wrong shape or dtype, or ends past the file.
+    """
+    try:
+        shapes = expected_shapes(manifest["config"])
+        entries = manifest["arrays"]
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"'{filename}' has a corrupt manifest: missing {e}.") from None
+    for name, shape in shapes.items():
+        if name not in entries:
+            raise ValueError(f"'{filename}' has no '{name}' array.")
+        if tuple(entries[name]["shape"]) != shape:
+            raise ValueError(f"'{filename}': array '{name}' has shape {tuple(entries[name]['shape'])}, "
+                             f"expected {shape}.")
+    for name, entry in entries.items():
+        try:
+            dtype = np.dtype(entry["dtype"])
+            shape = tuple(int(dim) for dim in entry["shape"])
+            offset = int(entry["offset"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"'{filename}': array '{name}' has a corrupt entry ({e}).") from None
+        if offset < 0 or any(dim < 0 for dim in shape):
+            raise ValueError(f"'{filename}': array '{name}' has a negative offset or dimension.")
+        end = data_start + offset + int(np.prod(shape)) * dtype.itemsize
+        if end > file_size:
+            raise ValueError(f"'{filename}' is truncated: array '{name}' ends at byte {end} "
+                             f"but the file has {file_size}.")
+
+def load_artifact(filename="models/cnn_model.bin", mmap=True):
+    """
+    Loads an inference-only model from an artifact written by `export_model`.
+
+    With mmap enabled, the parameters are read-only views of the file, so processes that
+    load the same artifact share one page-cached copy and loading does not read the arrays.
+
+    Args:
+        filename (str, optional): The artifact path. Default is "models/cnn_model.bin".
+        mmap (bool, optional): Whether to memory-map the arrays instead of reading them. Default is True.
+
+    Returns:
+        TextCNN: The model, usable for `forward` and `predict`.
+
+    Raises:
+        ValueError: If the file is not an artifact, or is truncated or corrupt.
+    """
+    manifest, data_start = read_manifest(filename)
+    if mmap:
+        data = np.memmap(filename, dtype=np.uint8, mode="r")
+    else:
+        with open(filename, "rb") as f:
+            data = np.frombuffer(f.read(), dtype=np.uint8)
+    check_manifest(filename, manifest, data_start, len(data))
+
+    arrays = {}
+    for name, entry in manifest["arrays"].items():
+        arrays[name] = np.ndarray(tuple(entry["shape"]), dtype=np.dtype(entry["dtype"]),
+                                  buffer=data, offset=data_start + entry["offset"])
+    for name, axis in manifest.get("quantized", {}).items():
+        arrays[name] = QuantizedArray(arrays[name], arrays.pop(f"{name}.scale"), axis)
+    return TextCNN.from_arrays(manifest["config"], arrays)
@@ -0,0 +1,115 @@
+"""
+Checks that length-trimmed convolution matches full padding and reports the
+convolution FLOPs and epoch wall time saved by length-bucketed batching on
+train_data.json.
+
+Run from the DataWise.AI directory:
+    python3 -m benchmarks.bench_bucketing
+"""
+import copy
+import json
+import time
+import numpy as np
+
+from data_utils import DataLoader, BucketSampler
+from dataset_cache import load_dataset
+from model import TextCNN, sequence_lengths
+from optimizers import Adam
+
+def full_padding(model):
+    """
+    Returns a copy of the model that convolves every batch over its full padded width.
+
+    Args:
+        model (TextCNN): The model to copy.
+
+    Returns:
+        TextCNN: The copy, with trimming disabled.
+    """
+    full = copy.deepcopy(model)
+    full._trim = lambda X: X
+    return full
+
+def conv_flops(model, X_batches):
+    """
+    Counts the multiply-adds of the convolutions over a sequence of batches.
+
+    Args:
+        model (TextCNN): The model.
+        X_batches (iterable): The batches, already cut to the width that is convolved.
+
+    Returns:
+        int: The number of floating-point operations (2 per multiply-add).
+    """
+    total = 0
+    for X in X_batches:
+        for fs in model.filter_sizes:
+            positions = X.shape[1] - fs + 1
+            total += 2 * X.shape[0] * positions * fs * model.embedding_dim * model.num_filters
+    return total
+
+def epoch_time(model, loader):
+    """
+    Trains a copy of the model for one epoch and returns the wall time.
+
+    Args:
+        model (TextCNN): The model to copy.
+        loader (DataLoader): The batches to train on.
+
+    Returns:
+        float: The epoch time in seconds.
+    """
+    model = copy.deepcopy(model)
+    start = time.perf_counter()
+    for X_batch, y_batch in loader:
+        model.train_on_batch(X_batch, y_batch)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    dataset = load_dataset()
+    X, y = np.asarray(dataset["X_train"]), np.asarray(dataset["y_train"])
+    lengths = sequence_lengths(X)
+    np.random.seed(0)
+    model = TextCNN(vocab_size=len(dataset["word2idx"]), embedding_dim=50, max_len=X.shape[1], num_filters=64,
+                    filter_sizes=[2, 3, 4], num_classes=len(dataset["label2idx"]), optimizer=Adam(0.001))
+
+    full = full_padding(model)
+    batch = np.arange(64)
+    assert np.allclose(model.predict(X[batch]), full.predict(X[batch]))
+    model.forward(X[batch])
+    full.forward(X[batch])
+    grads, full_grads = model.compute_gradients(X[batch], y[batch]), full.compute_gradients(X[batch], y[batch])
+    assert np.array_equal(grads["embeddings"][0], full_grads["embeddings"][0])
+    assert np.allclose(grads["embeddings"][1], full_grads["embeddings"][1])
+    for fs in model.filter_sizes:
+        assert np.allclose(grads["conv_filters"][fs], full_grads["conv_filters"][fs])
+    print("Trimmed forward/backward match full padding.")
+
+    batch_size = 32
+    random_loader = DataLoader(X, y, batch_size=batch_size, seed=0)
+    bucket_loader = DataLoader(X, y, sampler=BucketSampler(lengths, batch_size, seed=0))
+    trimmed = lambda loader: (model._trim(X_batch) for X_batch, _ in loader)
+
+    full_flops = conv_flops(model, (X_batch for X_batch, _ in random_loader))
+    random_flops = conv_flops(model, trimmed(random_loader))
+    bucket_flops = conv_flops(model, trimmed(bucket_loader))
+    full_time = epoch_time(full, random_loader)
+    random_time = epoch_time(model, random_loader)
+    bucket_time = epoch_time(model, bucket_loader)
+
+    print(json.dumps({
+        "avg_sentence_length": float(lengths.mean()),
+        "max_len": int(X.shape[1]),
+        "conv_gflops_per_epoch": {
+            "full_padding": full_flops / 1e9,
+            "trimmed_random_batches": random_flops / 1e9,
+            "trimmed_bucketed_batches": bucket_flops / 1e9,
+        },
+        "epoch_seconds": {
+            "full_padding": full_time,
+            "trimmed_random_batches": random_time,
+            "trimmed_bucketed_batches": bucket_time,
+        },
+        "flops_saved": 1 - bucket_flops / full_flops,
+        "time_saved": 1 - bucket_time / full_time,
+    }, indent=2))
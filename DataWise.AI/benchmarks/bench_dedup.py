@@ -0,0 +1,155 @@
+"""
+Measures exact and near-duplicate detection on a synthetic stream of generated
+questions: throughput and index size of the MinHash/LSH deduplicator, its recall on
+planted duplicates and its false-positive rate on distinct questions, its recall on
+paraphrases of short questions that share long openers (and so share LSH bands with
+many unrelated questions), and the time an exhaustive pairwise comparison would need
+for the same stream.
+
+Run from the DataWise.AI directory:
+    python3 -m benchmarks.bench_dedup [--rows 1000000] [--csv]
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+import numpy as np
+
+from dedup import Deduplicator, dedup_csv, normalize_text
+
+def synthetic_questions(num_rows, duplicate_ratio=0.2, seed=0):
+    """
+    Builds distinct random questions with exact and one-word-edit duplicates mixed in.
+
+    Returns:
+        tuple: (texts, kinds) where kinds[i] is "", "exact" or "near".
+    """
+    rng = np.random.default_rng(seed)
+    vocab = [f"w{i}" for i in range(20000)]
+    openers = ["What is", "Explain", "How does", "Why would you use", "Describe", "Compare"]
+    texts, kinds = [], []
+    lengths = rng.integers(8, 16, size=num_rows)
+    choices = rng.random(num_rows)
+    for i in range(num_rows):
+        if i > 100 and choices[i] < duplicate_ratio:
+            source = texts[int(rng.integers(0, i))]
+            if choices[i] < duplicate_ratio / 2:
+                texts.append(source.upper().rstrip("?") + " ?")
+                kinds.append("exact")
+            else:
+                words = source.rstrip("?").split()
+                words[int(rng.integers(1, len(words)))] = vocab[int(rng.integers(len(vocab)))]
+                texts.append(" ".join(words) + "?")
+                kinds.append("near")
+        else:
+            words = [vocab[j] for j in rng.integers(0, len(vocab), size=lengths[i])]
+            texts.append(f"{openers[i % len(openers)]} {' '.join(words)}?")
+            kinds.append("")
+    return texts, kinds
+
+def shared_opener_paraphrases(num_rows, paraphrase_ratio=0.2, seed=0):
+    """
+    Builds short questions behind a few long shared openers, with one-word-edit
+    paraphrases of earlier original questions mixed in. Paraphrases are never made of
+    paraphrases, which the deduplicator rightly does not chain.
+
+    Returns:
+        tuple: (texts, sources) where sources[i] is the position of the question that
+            texts[i] paraphrases, or -1.
+    """
+    rng = np.random.default_rng(seed)
+    vocab = [f"w{i}" for i in range(20000)]
+    openers = ["What is the difference between", "In SQL, how would you explain the purpose of",
+               "Write a query that returns", "Explain with an example how to use"]
+    texts, sources, bodies, originals = [], [], [], []
+    for i in range(num_rows):
+        if i > 100 and rng.random() < paraphrase_ratio:
+            source = originals[int(rng.integers(len(originals)))]
+            opener, body = bodies[source]
+            body = list(body)
+            body[int(rng.integers(len(body)))] = vocab[int(rng.integers(len(vocab)))]
+            sources.append(source)
+        else:
+            opener = openers[i % len(openers)]
+            body = [vocab[j] for j in rng.integers(0, len(vocab), size=int(rng.integers(5, 9)))]
+            sources.append(-1)
+            originals.append(i)
+        bodies.append((opener, body))
+        texts.append(f"{opener} {' '.join(body)}?")
+    return texts, np.array(sources)
+
+def pairwise_seconds(texts, sample=2000):
+    """
+    Times exhaustive Jaccard comparison of a sample and extrapolates it to all texts.
+    """
+    shingles = []
+    for text in texts[:sample]:
+        words = normalize_text(text).split()
+        shingles.append({(a, b) for a, b in zip(words, words[1:])})
+    start = time.perf_counter()
+    for i in range(len(shingles)):
+        for j in range(i):
+            len(shingles[i] & shingles[j]) / len(shingles[i] | shingles[j])
+    pairs = len(shingles) * (len(shingles) - 1) / 2
+    per_pair = (time.perf_counter() - start) / pairs
+    return per_pair * len(texts) * (len(texts) - 1) / 2
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--batch-size", type=int, default=20000)
+    parser.add_argument("--csv", action="store_true", help="Also time dedup_csv end to end.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    texts, kinds = synthetic_questions(args.rows)
+    print(f"generated {args.rows} questions in {time.perf_counter() - start:.1f}s "
+          f"({kinds.count('exact')} exact and {kinds.count('near')} near duplicates planted)")
+
+    deduplicator = Deduplicator()
+    flagged = np.zeros(args.rows, dtype=bool)
+    start = time.perf_counter()
+    for offset in range(0, args.rows, args.batch_size):
+        duplicate_of, _ = deduplicator.add(texts[offset:offset + args.batch_size])
+        flagged[offset:offset + len(duplicate_of)] = duplicate_of >= 0
+    seconds = time.perf_counter() - start
+    kinds = np.array(kinds)
+    print(f"deduplicator: {seconds:.1f}s ({args.rows / seconds:,.0f} rows/s), "
+          f"index {deduplicator.index_bytes / 2**20:.0f} MiB, "
+          f"{deduplicator.num_exact} exact and {deduplicator.num_near} near duplicates found")
+    for kind in ("exact", "near"):
+        print(f"  recall on {kind} duplicates: {flagged[kinds == kind].mean():.4f}")
+    print(f"  distinct questions flagged: {flagged[kinds == ''].mean():.5f}")
+
+    rows = min(args.rows, 200000)
+    paraphrases, sources = shared_opener_paraphrases(rows)
+    deduplicator = Deduplicator()
+    flagged = np.concatenate([deduplicator.add(paraphrases[offset:offset + args.batch_size])[0] >= 0
+                              for offset in range(0, rows, args.batch_size)])
+    is_paraphrase = sources >= 0
+    same_batch = sources // args.batch_size == np.arange(rows) // args.batch_size
+    print(f"shared-opener paraphrases ({rows} rows, {is_paraphrase.sum()} paraphrases planted):")
+    print(f"  recall: {flagged[is_paraphrase].mean():.4f} "
+          f"({flagged[is_paraphrase & same_batch].mean():.4f} within a batch, "
+          f"{flagged[is_paraphrase & ~same_batch].mean():.4f} across batches)")
+    print(f"  distinct questions flagged: {flagged[~is_paraphrase].mean():.5f}")
+
+    estimate = pairwise_seconds(texts)
+    print(f"pairwise comparison of all {args.rows} rows: ~{estimate / 3600:,.0f} hours (extrapolated from 2000 rows)")
+
+    if args.csv:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "questions.csv")
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["ID", "Category", "Question", "Answer", "Difficulty"])
+                for i, text in enumerate(texts):
+                    writer.writerow([i + 1, "SQL", text, "Answer: stub", "Medium"])
+            del texts
+            start = time.perf_counter()
+            stats = dedup_csv(path, os.path.join(tmp, "deduplicated.csv"))
+            print(f"dedup_csv: {time.perf_counter() - start:.1f}s, {stats}")
+
+if __name__ == "__main__":
+    main()
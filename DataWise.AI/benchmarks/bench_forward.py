@@ -0,0 +1,67 @@
+"""
+Compares the vectorized TextCNN.forward against the original per-window loop.
+
+Run from the DataWise.AI directory:
+    python3 -m benchmarks.bench_forward
+"""
+import time
+import numpy as np
+
+from activations import relu, softmax
+from model import TextCNN
+
+def loop_forward(model, X):
+    """
+    Reference forward pass that convolves one window position at a time.
+
+    Args:
+        model (TextCNN): The model whose parameters are used.
+        X (np.ndarray): The input batch of text sequences (shape: [batch_size, max_len]).
+
+    Returns:
+        np.ndarray: The probabilities for each class (shape: [batch_size, num_classes]).
+    """
+    embedded = model.embeddings[X]
+    pooled_outputs = []
+    for fs in model.filter_sizes:
+        conv_out = []
+        for i in range(model.max_len - fs + 1):
+            window = embedded[:, i:i+fs, :]
+            conv_out.append(np.tensordot(window, model.conv_filters[fs], axes=([1,2],[0,1])))
+        pooled_outputs.append(np.max(relu(np.stack(conv_out, axis=1)), axis=1))
+    fc_input = np.concatenate(pooled_outputs, axis=1)
+    return softmax(np.dot(fc_input, model.fc_weights) + model.fc_bias)
+
+def time_call(fn, repeats):
+    """
+    Returns the best wall time of several calls to fn.
+
+    Args:
+        fn (callable): The function to time.
+        repeats (int): The number of calls.
+
+    Returns:
+        float: The fastest call in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    model = TextCNN(vocab_size=10000, embedding_dim=50, max_len=42, num_filters=64,
+                    filter_sizes=[2, 3, 4], num_classes=10)
+
+    print(f"{'batch':>6} {'loop (ms)':>10} {'vectorized (ms)':>16} {'speedup':>8}")
+    for batch_size in [1, 32, 1024]:
+        # Token ids start at 1 so every sentence fills max_len, like the unmasked reference.
+        X = rng.integers(1, model.vocab_size, size=(batch_size, model.max_len))
+        assert np.allclose(loop_forward(model, X), model.forward(X))
+
+        repeats = 3 if batch_size >= 1024 else 20
+        loop_time = time_call(lambda: loop_forward(model, X), repeats)
+        fast_time = time_call(lambda: model.forward(X), repeats)
+        print(f"{batch_size:>6} {loop_time * 1e3:>10.2f} {fast_time * 1e3:>16.2f} {loop_time / fast_time:>7.1f}x")
@@ -0,0 +1,71 @@
+"""
+Runs the question generator against the local stub API: compares sequential and
+concurrent generation, then checks that a run interrupted mid-way resumes without
+redoing or losing batches.
+
+Run from the DataWise.AI directory:
+    python3 -m benchmarks.bench_generator
+"""
+import asyncio
+import csv
+import os
+import tempfile
+import threading
+import time
+
+from questions_generator import ChatCompletionsClient, CsvJournal, run
+from benchmarks.stub_llm_server import make_server
+
+CATEGORIES = {"SQL": 200, "DevOps": 200, "Containers and Cloud": 100, "AI (Data Science)": 100}
+BATCH_SIZE = 25
+
+def generate(server, filename, concurrency, categories=CATEGORIES):
+    client = ChatCompletionsClient(f"http://127.0.0.1:{server.server_address[1]}/v1", timeout=10)
+    journal = CsvJournal(filename)
+    start = time.perf_counter()
+    try:
+        appended = asyncio.run(run(client, journal, categories, BATCH_SIZE, concurrency, rate=200, burst=concurrency))
+    finally:
+        journal.close()
+    return appended, time.perf_counter() - start
+
+def read_rows(filename):
+    with open(filename, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+def main():
+    # Replies cover at most 10 records, so each batch takes several round trips, and
+    # 10% of requests are rate limited.
+    server = make_server(latency=0.05, error_rate=0.1, max_rows=10)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    total = sum(CATEGORIES.values())
+    with tempfile.TemporaryDirectory() as tmp:
+        for concurrency in (1, 4, 8):
+            filename = os.path.join(tmp, f"questions_{concurrency}.csv")
+            appended, seconds = generate(server, filename, concurrency)
+            print(f"concurrency={concurrency}: {appended} questions in {seconds:.2f}s "
+                  f"({appended / seconds:.0f}/s)")
+            assert appended == total == len(read_rows(filename))
+
+        # Simulate a crash: finish only part of the work, leave a torn last line, resume.
+        filename = os.path.join(tmp, "resume.csv")
+        partial = {category: count // 2 for category, count in CATEGORIES.items()}
+        generate(server, filename, 4, partial)
+        with open(filename, "a", encoding="utf-8") as f:
+            f.write("999,SQL,A torn")
+        requests_before = server.requests
+        appended, _ = generate(server, filename, 4)
+        rows = read_rows(filename)
+        counts = {category: sum(row["Category"] == category for row in rows) for category in CATEGORIES}
+        assert counts == CATEGORIES, counts
+        assert [int(row["ID"]) for row in rows] == list(range(1, total + 1))
+        print(f"resume: {appended} questions appended in {server.requests - requests_before} requests, "
+              f"final counts {counts}")
+        requests_before = server.requests
+        assert generate(server, filename, 4)[0] == 0 and server.requests == requests_before
+        print("resume of a complete file sends no requests")
+    print(f"stub served {server.requests} requests, {server.errors} rate limited")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Reports the activation memory retained by a training forward pass and the peak
+memory of a training and an evaluation forward pass over a large batch.
+
+Run from the DataWise.AI directory:
+    python3 -m benchmarks.bench_memory
+"""
+import tracemalloc
+import numpy as np
+
+from model import TextCNN
+
+def retained_bytes(model):
+    """
+    Sums the size of the activations a training forward pass leaves on the model.
+
+    Args:
+        model (TextCNN): The model, after a forward pass.
+
+    Returns:
+        int: The number of bytes held for the backward pass.
+    """
+    arrays = [model.inputs, model.fc_input, model.logits, model.probs]
+    arrays += list(model.max_positions.values()) + model.pooled_outputs
+    return sum(array.nbytes for array in arrays)
+
+def full_activation_bytes(model, X):
+    """
+    Computes the bytes the previous implementation kept: the embedded batch and every conv output.
+
+    Args:
+        model (TextCNN): The model.
+        X (np.ndarray): The input batch.
+
+    Returns:
+        int: The number of bytes.
+    """
+    inputs = model._trim(X)
+    count = inputs.size * model.embedding_dim
+    count += sum(len(X) * (inputs.shape[1] - fs + 1) * model.num_filters for fs in model.filter_sizes)
+    return count * 8
+
+def peak_bytes(fn):
+    """
+    Measures the peak traced allocation of a call.
+
+    Args:
+        fn (callable): The function to measure.
+
+    Returns:
+        int: The peak in bytes.
+    """
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    model = TextCNN(vocab_size=5000, embedding_dim=50, max_len=42, num_filters=64,
+                    filter_sizes=[2, 3, 4], num_classes=10)
+    X = rng.integers(1, 5000, size=(4096, 42))
+    mb = 1024 * 1024
+
+    train_peak = peak_bytes(lambda: model.forward(X))
+    print(f"Retained after forward: {retained_bytes(model) / mb:.1f} MB "
+          f"(conv outputs + embeddings would be {full_activation_bytes(model, X) / mb:.1f} MB)")
+    print(f"Peak, training forward:   {train_peak / mb:.1f} MB")
+    print(f"Peak, evaluation forward: {peak_bytes(lambda: model.forward(X, training=False)) / mb:.1f} MB")
@@ -0,0 +1,52 @@
+"""
+Measures the per-request cost of the /predict instrumentation: the in-flight
+gauge, the stage and endpoint histograms, the label counter and the
+Server-Timing header.
+
+Run from the DataWise.AI directory:
+    python3 -m benchmarks.bench_metrics
+"""
+import time
+
+from metrics import Registry, Counter, Gauge, Histogram, server_timing
+
+def instrumented_request(gauge, stage_timers, endpoint_timer, counter):
+    """
+    Records one request the way app.predict does, without any of its real work.
+    """
+    start = time.perf_counter()
+    gauge.inc()
+    encoded_at = queued_until = predicted_at = time.perf_counter()
+    counter.inc()
+    finished_at = time.perf_counter()
+    durations = {
+        "encode": encoded_at - start,
+        "queue": queued_until - encoded_at,
+        "model": predicted_at - queued_until,
+        "serialize": finished_at - predicted_at,
+        "total": finished_at - start,
+    }
+    for stage, timer in stage_timers.items():
+        timer.observe(durations[stage])
+    server_timing(durations)
+    gauge.dec()
+    endpoint_timer.observe(time.perf_counter() - start)
+
+if __name__ == "__main__":
+    registry = Registry()
+    stages = Histogram("stage_seconds", "Stage latency.", ["stage"], registry=registry)
+    stage_timers = {stage: stages.labels(stage) for stage in ("encode", "queue", "model", "serialize")}
+    endpoint_timer = Histogram("request_seconds", "Request latency.", ["endpoint"], registry=registry).labels("/predict")
+    counter = Counter("predictions_total", "Predictions.", ["label"], registry=registry).labels("BFS")
+    gauge = Gauge("in_flight", "In-flight requests.", ["endpoint"], registry=registry).labels("/predict")
+
+    requests = 100000
+    start = time.perf_counter()
+    for _ in range(requests):
+        instrumented_request(gauge, stage_timers, endpoint_timer, counter)
+    elapsed = time.perf_counter() - start
+    print(f"Instrumentation overhead: {elapsed / requests * 1e6:.2f} us per request")
+
+    start = time.perf_counter()
+    text = registry.render()
+    print(f"Rendering /metrics: {(time.perf_counter() - start) * 1000:.2f} ms, {len(text)} bytes")
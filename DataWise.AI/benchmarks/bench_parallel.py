@@ -0,0 +1,69 @@
+"""
+Measures data-parallel training throughput and final validation accuracy for
+several worker counts (0 means plain single-process training).
+
+Run from the DataWise.AI directory:
+    python3 -m benchmarks.bench_parallel --workers 0 1 2 4 8 --epochs 2
+"""
+import argparse
+import json
+import time
+import numpy as np
+
+from data_utils import DataLoader
+from dataset_cache import load_dataset
+from model import TextCNN
+from optimizers import Adam
+from parallel import DataParallelTrainer
+
+def train(dataset, num_workers, epochs, batch_size, learning_rate, seed=0):
+    """
+    Trains a fresh model and reports its throughput and validation accuracy.
+
+    Args:
+        dataset (dict): The encoded dataset returned by `load_dataset`.
+        num_workers (int): The number of data-parallel workers (0 trains in-process).
+        epochs (int): The number of epochs.
+        batch_size (int): The global batch size.
+        learning_rate (float): The Adam learning rate.
+        seed (int, optional): The seed for initialization and shuffling. Defaults to 0.
+
+    Returns:
+        dict: Samples per second, wall time and final validation accuracy.
+    """
+    np.random.seed(seed)
+    model = TextCNN(vocab_size=len(dataset["word2idx"]), embedding_dim=50, max_len=dataset["X_train"].shape[1],
+                    num_filters=64, filter_sizes=[2, 3, 4], num_classes=len(dataset["label2idx"]),
+                    learning_rate=learning_rate, optimizer=Adam(learning_rate))
+    trainer = DataParallelTrainer(model, num_workers) if num_workers else model
+    loader = DataLoader(dataset["X_train"], dataset["y_train"], batch_size=batch_size, seed=seed)
+
+    start = time.perf_counter()
+    try:
+        for _ in range(epochs):
+            for X_batch, y_batch in loader:
+                trainer.train_on_batch(X_batch, y_batch)
+    finally:
+        if num_workers:
+            trainer.close()
+    elapsed = time.perf_counter() - start
+
+    accuracy = np.mean(np.argmax(model.predict(dataset["X_val"]), axis=1) == dataset["y_val"])
+    return {
+        "workers": num_workers,
+        "samples_per_sec": epochs * len(dataset["X_train"]) / elapsed,
+        "seconds": elapsed,
+        "val_accuracy": float(accuracy),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4, 8])
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--learning-rate", type=float, default=0.003)
+    args = parser.parse_args()
+
+    dataset = load_dataset()
+    results = [train(dataset, w, args.epochs, args.batch_size, args.learning_rate) for w in args.workers]
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,87 @@
+"""
+Compares the old helper.py + checker.py flow (load every row into a list, write it, read
+the file again to count difficulties) with the single-pass question_pipeline on a
+synthetic CSV: wall time, and peak Python heap measured with tracemalloc in a second run.
+
+Run from the DataWise.AI directory:
+    python3 -m benchmarks.bench_pipeline [--rows 500000] [--workers 2]
+"""
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+
+from question_pipeline import default_steps, run_pipeline
+from questions_generator import FIELDNAMES, categories
+
+def write_questions(path, num_rows, seed=0):
+    rng = random.Random(seed)
+    names = list(categories)
+    difficulties = ["Easy", "Medium", "Hard", "Extremely Hard", "medium", "Moderate", ""]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDNAMES)
+        for i in range(num_rows):
+            category = names[i % len(names)] if rng.random() > 0.01 else "Unknown"
+            question = f"What is concept {i} in {category}?" if rng.random() > 0.005 else " "
+            writer.writerow([i + 1, category, question, f"Answer: It is concept {i}.", rng.choice(difficulties)])
+
+def legacy(input_path, output_path):
+    valid_difficulties = {"Easy", "Medium", "Hard", "Extremely Hard"}
+    updated_rows = []
+    with open(input_path, "r", newline="", encoding="utf-8") as infile:
+        reader = csv.DictReader(infile)
+        fieldnames = reader.fieldnames
+        for row in reader:
+            if row["Difficulty"] not in valid_difficulties:
+                row["Difficulty"] = "Medium"
+            updated_rows.append(row)
+    with open(output_path, "w", newline="", encoding="utf-8") as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(updated_rows)
+    counts = Counter()
+    with open(output_path, "r", newline="", encoding="utf-8") as csvfile:
+        for row in csv.DictReader(csvfile):
+            counts[row["Difficulty"]] += 1
+    return counts
+
+def measure(name, fn):
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{name:<28} {seconds:7.2f}s   peak heap {peak / 2**20:8.1f} MiB")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, "new_interview_questions.csv")
+        output_path = os.path.join(tmp, "interview_questions.csv")
+        write_questions(input_path, args.rows)
+        print(f"{args.rows} rows, {os.path.getsize(input_path) / 2**20:.0f} MiB")
+
+        measure("helper.py + checker.py", lambda: legacy(input_path, output_path))
+        steps = default_steps(categories)
+        stats = measure("pipeline", lambda: run_pipeline(input_path, output_path, steps))
+        if args.workers:
+            parallel = measure(f"pipeline, {args.workers} workers",
+                               lambda: run_pipeline(input_path, output_path, steps, num_workers=args.workers))
+            assert parallel == stats
+        print(f"wrote {stats['rows_written']} rows, dropped {stats['dropped']}")
+        print(f"difficulty {stats['difficulty']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Hot-reloads the served model under load: publishes a first version to a temporary
+registry, starts the app on it, and keeps /predict busy from several threads while a
+second version (the same model exported as int8) is published, a broken version is
+published, and the service is rolled back. Reports the request latency around each
+event and the number of failed requests.
+
+Run from the DataWise.AI directory (needs models/cnn_model.bin):
+    python3 -m benchmarks.bench_reload [--threads 8] [--seconds 2]
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+
+from artifact import export_model, load_artifact
+from data_utils import load_data
+from model_registry import publish
+
+class Load:
+    """
+    Sends /predict requests from several threads and records every latency and failure.
+    """
+    def __init__(self, client, texts, threads):
+        self.client = client
+        self.texts = texts
+        self.latencies = []
+        self.failures = 0
+        self._stop = threading.Event()
+        self._threads = [threading.Thread(target=self._run, args=(i,)) for i in range(threads)]
+
+    def _run(self, seed):
+        rng = np.random.default_rng(seed)
+        while not self._stop.is_set():
+            text = self.texts[int(rng.integers(len(self.texts)))]
+            start = time.perf_counter()
+            response = self.client.post("/predict", json={"exercise": text})
+            seconds = time.perf_counter() - start
+            if response.status_code != 200:
+                self.failures += 1
+            self.latencies.append((start, seconds))
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+def report(name, latencies, start, end):
+    window = np.array([seconds for at, seconds in latencies if start <= at < end]) * 1000
+    if not len(window):
+        print(f"  {name:<28} no requests")
+        return
+    print(f"  {name:<28} {len(window):6d} requests   p50 {np.percentile(window, 50):6.2f} ms   "
+          f"p99 {np.percentile(window, 99):6.2f} ms   max {window.max():7.2f} ms")
+
+def wait_for(predicate, timeout=30):
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("The registry did not pick up the change.")
+        time.sleep(0.01)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    texts = [item["Exercise"] for item in load_data("val_data.json")[:500]]
+    with tempfile.TemporaryDirectory() as tmp:
+        registry_dir = os.path.join(tmp, "registry")
+        publish(registry_dir, "v1", "models/cnn_model.bin")
+
+        os.environ.update(MODEL_REGISTRY=registry_dir, MODEL_POLL_SECONDS="0.1", MODEL_ADMIN_TOKEN="bench",
+                          RESULT_CACHE_SIZE="0")
+        import app
+        registry = app.model_registry
+        client = app.app.test_client()
+        print(f"serving {registry.active.name}, warm-up took {1000 * registry.active.warmup_seconds:.1f} ms")
+
+        load = Load(client, texts, args.threads)
+        load.start()
+        events = [("steady", time.perf_counter())]
+        time.sleep(args.seconds)
+
+        int8_path = os.path.join(tmp, "cnn_model_int8.bin")
+        export_model(load_artifact("models/cnn_model.bin"), int8_path, "int8")
+        events.append(("publish v2 (int8) + swap", time.perf_counter()))
+        publish(registry_dir, "v2", int8_path)
+        wait_for(lambda: registry.active.name == "v2")
+        swapped = time.perf_counter()
+        time.sleep(args.seconds)
+
+        broken = os.path.join(tmp, "broken_labels.json")
+        with open(broken, "w") as f:
+            json.dump({"only": 0, "two": 1}, f)
+        events.append(("publish v3 (broken labels)", time.perf_counter()))
+        publish(registry_dir, "v3", "models/cnn_model.bin", labels_path=broken, check=False)
+        wait_for(lambda: registry.failures > 0)
+        time.sleep(args.seconds)
+
+        events.append(("rollback to v1", time.perf_counter()))
+        response = client.post("/model/rollback", headers={"Authorization": "Bearer bench"})
+        assert response.status_code == 200 and registry.active.name == "v1", response.get_json()
+        time.sleep(args.seconds)
+        events.append(("end", time.perf_counter()))
+        load.stop()
+
+        print(f"{args.threads} threads, {len(load.latencies)} requests, {load.failures} failed")
+        for (name, at), (_, until) in zip(events, events[1:]):
+            report(name, load.latencies, at, until)
+        print(f"v2 was swapped in {1000 * (swapped - events[1][1]):.0f} ms after publishing started")
+        status = client.get("/model/status").get_json()
+        print(f"status: active {status['active']['version']}, previous {status['previous']}, "
+              f"pinned {status['pinned']}, reloads {status['reloads']}, failures {status['failures']}")
+        print(f"last error: {status['last_error']['error']}")
+        registry.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Recall and latency of the similar-exercise index: exact blocked search against IVF
+search at several nprobe values, on the exercises.json features and on a larger
+synthetic corpus made of perturbed copies of them.
+
+Run from the DataWise.AI directory (needs models/cnn_model.bin):
+    python3 -m benchmarks.bench_similar [--rows 500000] [--k 10] [--queries 200]
+"""
+import argparse
+import time
+import numpy as np
+
+from artifact import load_artifact
+from data_utils import load_data
+from similarity import SimilarityIndex, normalize_rows, query_vectors, top_k_blocked, train_ivf
+from tokenizer import Encoder
+
+def in_memory_index(features, nlist):
+    """
+    Builds a SimilarityIndex over in-memory features, the way build_index lays them out.
+    """
+    if nlist:
+        centroids, assignments = train_ivf(features, nlist)
+        ids = np.argsort(assignments, kind="stable")
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(assignments, minlength=nlist))))
+    else:
+        centroids = offsets = None
+        ids = np.arange(len(features))
+    manifest = {"count": len(features), "dim": features.shape[1], "nlist": nlist, "nprobe": 0}
+    empty = np.zeros(0, dtype=np.uint8)
+    return SimilarityIndex(None, manifest, np.ascontiguousarray(features[ids]), ids, empty, empty, empty,
+                           centroids, offsets)
+
+def run(name, features, queries, k, nprobes):
+    print(f"\n{name}: {len(features)} vectors, {len(queries)} queries, k={k}")
+    start = time.perf_counter()
+    truth = [top_k_blocked(features, q[None], k)[0][0] for q in queries]
+    exact_ms = (time.perf_counter() - start) / len(queries) * 1000
+    print(f"  {'exact (blocked)':<22} {exact_ms:8.3f} ms/query   recall 1.000")
+
+    nlist = max(int(np.sqrt(len(features))), 1)
+    start = time.perf_counter()
+    index = in_memory_index(features, nlist)
+    print(f"  IVF with {nlist} lists trained in {time.perf_counter() - start:.1f}s")
+    for nprobe in nprobes:
+        if nprobe >= nlist:
+            break
+        start = time.perf_counter()
+        found = [index.search(q[None], k, nprobe)[0][0] for q in queries]
+        ms = (time.perf_counter() - start) / len(queries) * 1000
+        recall = np.mean([len(np.intersect1d(f, t)) / len(t) for f, t in zip(found, truth)])
+        print(f"  {'IVF nprobe=' + str(nprobe):<22} {ms:8.3f} ms/query   recall {recall:.3f}   "
+              f"speedup {exact_ms / ms:5.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.3)
+    args = parser.parse_args()
+
+    model = load_artifact("models/cnn_model.bin")
+    encoder = Encoder.load("word2idx.json", model.max_len)
+    corpus = query_vectors(model, encoder, [item["Exercise"] for item in load_data("exercises.json")])
+    queries = query_vectors(model, encoder, [item["Exercise"] for item in load_data("val_data.json")[:args.queries]])
+    nprobes = (1, 2, 4, 8, 16, 32, 64)
+    run("exercises.json", corpus, queries, args.k, nprobes)
+
+    rng = np.random.default_rng(0)
+    base = corpus[rng.integers(0, len(corpus), size=args.rows)]
+    scale = args.noise * np.abs(base).mean()
+    synthetic = normalize_rows(base + rng.normal(0, scale, size=base.shape).astype(np.float32))
+    run(f"synthetic (noise {args.noise})", synthetic, queries, args.k, nprobes)
+
+if __name__ == "__main__":
+    main()
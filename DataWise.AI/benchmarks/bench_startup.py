@@ -0,0 +1,65 @@
+"""
+Compares the load time of the pickle-free artifact with the pickle path used by
+app.py. The round trip itself is tested in tests/test_artifact.py.
+
+Run from the DataWise.AI directory:
+    python3 -m benchmarks.bench_startup
+"""
+import os
+import pickle
+import tempfile
+import time
+import numpy as np
+
+from artifact import export_model, load_artifact
+from model import TextCNN
+
+def best_time(fn, repeats=5):
+    """
+    Returns the best wall time of several calls to fn.
+
+    Args:
+        fn (callable): The function to time.
+        repeats (int, optional): The number of calls. Defaults to 5.
+
+    Returns:
+        float: The fastest call in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def load_pickle(filename):
+    """
+    Loads a pickled model the way app.py does.
+
+    Args:
+        filename (str): The pickle path.
+
+    Returns:
+        TextCNN: The model.
+    """
+    with open(filename, "rb") as f:
+        return pickle.load(f)
+
+if __name__ == "__main__":
+    np.random.seed(0)
+    model = TextCNN(vocab_size=5314, embedding_dim=50, max_len=42, num_filters=64,
+                    filter_sizes=[2, 3, 4], num_classes=10)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pickle_path = os.path.join(tmp, "cnn_model_fixed.pkl")
+        artifact_path = os.path.join(tmp, "cnn_model.bin")
+        with open(pickle_path, "wb") as f:
+            pickle.dump(model, f)
+        export_model(model, artifact_path)
+
+        print(f"Pickle:          {os.path.getsize(pickle_path) / 1e6:6.2f} MB, "
+              f"load {best_time(lambda: load_pickle(pickle_path)) * 1e3:7.3f} ms")
+        print(f"Artifact:        {os.path.getsize(artifact_path) / 1e6:6.2f} MB, "
+              f"load {best_time(lambda: load_artifact(artifact_path, mmap=False)) * 1e3:7.3f} ms (read)")
+        print(f"Artifact (mmap): {os.path.getsize(artifact_path) / 1e6:6.2f} MB, "
+              f"load {best_time(lambda: load_artifact(artifact_path)) * 1e3:7.3f} ms")
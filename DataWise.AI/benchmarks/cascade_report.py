@@ -0,0 +1,94 @@
+"""
+Reports how the cascade (fast bag-of-embeddings head, then the full CNN) compares
+with the CNN alone on val_data.json: fall-through rate, accuracy change and the
+average latency per exercise, at several confidence thresholds.
+
+Train first (train.py writes models/cnn_model.bin and models/fast_head.npz), then
+run from the DataWise.AI directory:
+    python3 -m benchmarks.cascade_report --thresholds 0.2 0.3 0.5 0.7
+"""
+import argparse
+import json
+import time
+import numpy as np
+
+from artifact import load_artifact
+from cascade import Cascade, load_fast_head
+from dataset_cache import load_dataset
+
+def per_sample_ms(predict_fn, X):
+    """
+    Classifies the sentences one at a time, as /predict does, and returns the mean latency.
+
+    Args:
+        predict_fn (callable): A batched prediction function.
+        X (np.ndarray): The encoded sentences.
+
+    Returns:
+        float: The average milliseconds per sentence.
+    """
+    start = time.perf_counter()
+    for i in range(len(X)):
+        predict_fn(X[i:i + 1])
+    return (time.perf_counter() - start) * 1000 / len(X)
+
+def batched_ms(predict_fn, X, batch_size=256):
+    """
+    Classifies the sentences in batches and returns the mean latency per sentence.
+
+    Args:
+        predict_fn (callable): A batched prediction function.
+        X (np.ndarray): The encoded sentences.
+        batch_size (int, optional): The batch size. Default is 256.
+
+    Returns:
+        float: The average milliseconds per sentence.
+    """
+    start = time.perf_counter()
+    for i in range(0, len(X), batch_size):
+        predict_fn(X[i:i + batch_size])
+    return (time.perf_counter() - start) * 1000 / len(X)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the cascade with the full CNN on the validation set.")
+    parser.add_argument("--model", default="models/cnn_model.bin")
+    parser.add_argument("--head", default="models/fast_head.npz")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.1, 0.2, 0.3, 0.5, 0.7])
+    args = parser.parse_args()
+
+    dataset = load_dataset()
+    X, y = np.asarray(dataset["X_val"]), np.asarray(dataset["y_val"])
+    model = load_artifact(args.model)
+    head = load_fast_head(args.head)
+
+    cnn_accuracy = float(np.mean(np.argmax(model.predict(X), axis=1) == y))
+    fast_accuracy = float(np.mean(np.argmax(head.predict(model, X), axis=1) == y))
+    cnn_single, cnn_batched = per_sample_ms(model.predict, X), batched_ms(model.predict, X)
+
+    rows = []
+    for threshold in args.thresholds:
+        cascade = Cascade(model, head, threshold)
+        probs, fast = cascade.predict_routed(X)
+        accuracy = float(np.mean(np.argmax(probs, axis=1) == y))
+        single, batched = per_sample_ms(cascade.predict, X), batched_ms(cascade.predict, X)
+        rows.append({
+            "threshold": threshold,
+            "fall_through_rate": float(1 - fast.mean()),
+            "accuracy": accuracy,
+            "accuracy_change": accuracy - cnn_accuracy,
+            "single_ms": single,
+            "single_saving": 1 - single / cnn_single,
+            "batched_ms": batched,
+            "batched_saving": 1 - batched / cnn_batched,
+        })
+
+    print(json.dumps({
+        "num_samples": int(len(X)),
+        "cnn": {"accuracy": cnn_accuracy, "single_ms": cnn_single, "batched_ms": cnn_batched},
+        "fast_head_accuracy": fast_accuracy,
+        "head_threshold": head.threshold,
+        "cascade": rows,
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
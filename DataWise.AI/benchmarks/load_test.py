@@ -0,0 +1,86 @@
+"""
+Load-tests the /predict endpoint and reports latency percentiles and throughput.
+
+Start the service, then run from the DataWise.AI directory:
+    python3 -m benchmarks.load_test --url http://127.0.0.1:5000/predict --concurrency 32
+
+Compare the micro-batching server against the one-request-per-forward handler by
+starting the service once normally and once with MICRO_BATCHING=0.
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.request
+import numpy as np
+
+from data_utils import load_data
+
+def run_client(url, texts, deadline, latencies, errors, offset):
+    """
+    Sends requests in a loop until the deadline and records each latency.
+
+    Args:
+        url (str): The /predict URL.
+        texts (list): The exercise texts to send, cycled through.
+        deadline (float): The perf_counter time at which to stop.
+        latencies (list): Receives the latency of each successful request, in seconds.
+        errors (list): Receives one entry per failed request.
+        offset (int): The index of the first text to send.
+    """
+    i = offset
+    while time.perf_counter() < deadline:
+        body = json.dumps({"exercise": texts[i % len(texts)]}).encode("utf-8")
+        req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req) as response:
+                response.read()
+            latencies.append(time.perf_counter() - start)
+        except Exception as e:
+            errors.append(e)
+        i += 1
+
+def load_test(url, texts, concurrency, duration):
+    """
+    Runs concurrent clients against the endpoint for a fixed duration.
+
+    Args:
+        url (str): The /predict URL.
+        texts (list): The exercise texts to send.
+        concurrency (int): The number of concurrent clients.
+        duration (float): The test duration, in seconds.
+
+    Returns:
+        dict: The number of requests and errors, p50/p99 latency in milliseconds and requests per second.
+    """
+    latencies, errors = [], []
+    start = time.perf_counter()
+    deadline = start + duration
+    clients = [threading.Thread(target=run_client, args=(url, texts, deadline, latencies, errors, c * 97))
+               for c in range(concurrency)]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000.0
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "p50_ms": float(np.percentile(latencies_ms, 50)) if len(latencies) else None,
+        "p99_ms": float(np.percentile(latencies_ms, 99)) if len(latencies) else None,
+        "requests_per_sec": len(latencies) / elapsed,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:5000/predict")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--data", default="val_data.json")
+    args = parser.parse_args()
+
+    texts = [item["Exercise"] for item in load_data(args.data)]
+    print(json.dumps(load_test(args.url, texts, args.concurrency, args.duration), indent=2))
@@ -0,0 +1,86 @@
+"""
+Compares float32 and int8 inference against the float64 model on val_data.json:
+argmax agreement, accuracy, parameter memory and batch latency.
+
+Run from the DataWise.AI directory after training:
+    python3 -m benchmarks.precision_report --model models/cnn_model.npy
+"""
+import argparse
+import copy
+import json
+import time
+import numpy as np
+
+from data_utils import load_data, encode_sentences, encode_labels
+from model import load_model
+from quantize import PRECISIONS
+
+def parameter_bytes(model):
+    """
+    Returns the memory used by the parameters of a model.
+
+    Args:
+        model (TextCNN): The model.
+
+    Returns:
+        int: The number of bytes, including quantization scales.
+    """
+    arrays = [model.embeddings, model.fc_weights, model.fc_bias, *model.conv_filters.values()]
+    return sum(array.nbytes for array in arrays)
+
+def batch_latency(model, X, batch_size, repeats=20):
+    """
+    Returns the best time of `model.predict` on one batch.
+
+    Args:
+        model (TextCNN): The model.
+        X (np.ndarray): The encoded inputs to draw the batch from.
+        batch_size (int): The batch size.
+        repeats (int, optional): The number of timed calls. Defaults to 20.
+
+    Returns:
+        float: The fastest call in milliseconds.
+    """
+    batch = X[:batch_size]
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.predict(batch)
+        best = min(best, time.perf_counter() - start)
+    return best * 1e3
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="models/cnn_model.npy")
+    parser.add_argument("--data", default="val_data.json")
+    parser.add_argument("--word2idx", default="word2idx.json")
+    parser.add_argument("--label2idx", default="label2idx.json")
+    args = parser.parse_args()
+
+    with open(args.word2idx, "r") as f:
+        word2idx = json.load(f)
+    with open(args.label2idx, "r") as f:
+        label2idx = json.load(f)
+    data = load_data(args.data)
+    base = load_model(args.model)
+    base.set_precision("float64")
+    X = encode_sentences([item["Exercise"] for item in data], word2idx, base.max_len)
+    y = encode_labels(data, label2idx)
+
+    reference_probs = base.predict(X)
+    reference = np.argmax(reference_probs, axis=1)
+    report = {}
+    for precision in PRECISIONS:
+        model = copy.deepcopy(base)
+        model.set_precision(precision)
+        probs = model.predict(X)
+        preds = np.argmax(probs, axis=1)
+        report[precision] = {
+            "argmax_agreement": float(np.mean(preds == reference)),
+            "accuracy": float(np.mean(preds == y)),
+            "max_abs_prob_diff": float(np.max(np.abs(probs - reference_probs))),
+            "parameter_mb": parameter_bytes(model) / 1e6,
+            "latency_ms_batch_1": batch_latency(model, X, 1),
+            "latency_ms_batch_256": batch_latency(model, X, 256),
+        }
+    print(json.dumps(report, indent=2))
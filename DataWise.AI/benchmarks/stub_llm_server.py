@@ -0,0 +1,94 @@
+"""
+A local stand-in for an OpenAI-compatible /chat/completions endpoint, for exercising
+questions_generator.py without an API key.
+
+Replies contain the requested number of " | "-delimited question records (capped by
+--max-rows to imitate short replies), arrive after --latency seconds and fail with
+HTTP 429 at --error-rate.
+
+Run from the DataWise.AI directory:
+    python3 -m benchmarks.stub_llm_server --port 8001
+    python3 questions_generator.py --base-url http://127.0.0.1:8001/v1 --rate 20
+"""
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROMPT_PATTERN = re.compile(r'generate (\d+) unique interview questions for the category "(.*?)"')
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers chat completion requests with fake question records.
+    """
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        with server.lock:
+            server.requests += 1
+        time.sleep(server.latency)
+        if random.random() < server.error_rate:
+            with server.lock:
+                server.errors += 1
+            self._reply(429, {"error": {"message": "Rate limit reached."}})
+            return
+        match = PROMPT_PATTERN.search(body["messages"][-1]["content"])
+        count, category = (int(match.group(1)), match.group(2)) if match else (1, "Unknown")
+        lines = []
+        for i in range(min(count, server.max_rows)):
+            n = next(server.counter)
+            lines.append(f"{i + 1} | {category} | What is concept {n}? | Answer: Concept {n} is a stub. | Medium")
+        self._reply(200, {"choices": [{"message": {"role": "assistant", "content": "\n".join(lines)}}]})
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def make_server(host="127.0.0.1", port=0, latency=0.05, error_rate=0.0, max_rows=1000):
+    """
+    Creates a stub server; call `serve_forever` (e.g. in a thread) to start it.
+
+    Args:
+        host (str, optional): The address to bind. Defaults to "127.0.0.1".
+        port (int, optional): The port to bind, 0 for any free port. Defaults to 0.
+        latency (float, optional): Seconds each reply takes. Defaults to 0.05.
+        error_rate (float, optional): The fraction of requests answered with HTTP 429. Defaults to 0.
+        max_rows (int, optional): The maximum number of records per reply. Defaults to 1000.
+
+    Returns:
+        ThreadingHTTPServer: The server, with `requests` and `errors` counters.
+    """
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.error_rate = error_rate
+    server.max_rows = max_rows
+    server.requests = 0
+    server.errors = 0
+    server.counter = itertools.count(1)
+    server.lock = threading.Lock()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake OpenAI-compatible chat completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--max-rows", type=int, default=1000)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency, args.error_rate, args.max_rows)
+    print(f"Stub LLM API listening on http://{args.host}:{server.server_address[1]}/v1")
+    server.serve_forever()
@@ -0,0 +1,261 @@
+"""
+Reproducible benchmark suite: times forward, backward, sentence encoding,
+dataset preparation and the /predict handlers at several batch and vocabulary
+sizes, records a per-stage profile of a training step and writes everything to
+JSON. Two runs can then be compared.
+
+Run from the DataWise.AI directory:
+    python3 -m benchmarks.suite -o benchmarks/results/baseline.json
+    python3 -m benchmarks.suite -o benchmarks/results/change.json
+    python3 -m benchmarks.suite --compare benchmarks/results/baseline.json benchmarks/results/change.json
+
+Every performance change should be measured against a baseline run taken on the
+same machine before the change.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import numpy as np
+
+from data_utils import load_data, build_vocab, encode_sentence, encode_sentences, prepare_dataset
+from model import TextCNN
+from optimizers import Adam
+
+BATCH_SIZES = [1, 32, 256]
+VOCAB_SIZES = [1000, 10000, 100000]
+MAX_LEN = 42
+
+def vocabulary(data, vocab_size):
+    """
+    Builds a vocabulary of exactly vocab_size entries from the dataset.
+
+    Rare words are dropped (they encode as padding) when the dataset has more words than
+    vocab_size, and synthetic words are added when it has fewer, so the embedding matrix
+    has the requested size while the sentences stay real.
+
+    Args:
+        data (list): The dataset items.
+        vocab_size (int): The number of entries, including "<PAD>".
+
+    Returns:
+        dict: A dictionary mapping words to indices.
+    """
+    word2idx = {word: idx for word, idx in build_vocab(data).items() if idx < vocab_size}
+    for idx in range(len(word2idx), vocab_size):
+        word2idx[f"<synthetic{idx}>"] = idx
+    return word2idx
+
+def measure(fn, repeats, min_seconds=0.2):
+    """
+    Times repeated calls of fn after one warm-up call.
+
+    Args:
+        fn (callable): The function to time.
+        repeats (int): The minimum number of timed calls.
+        min_seconds (float, optional): Keep calling until this much time has been spent. Default is 0.2.
+
+    Returns:
+        dict: The "calls", "median_ms", "min_ms" and "p90_ms" of the timed calls.
+    """
+    fn()
+    times, spent = [], 0.0
+    while len(times) < repeats or spent < min_seconds:
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        times.append(elapsed)
+        spent += elapsed
+    times = np.array(times) * 1000
+    return {
+        "calls": len(times),
+        "median_ms": float(np.median(times)),
+        "min_ms": float(times.min()),
+        "p90_ms": float(np.percentile(times, 90)),
+    }
+
+def environment():
+    """
+    Describes the machine and code a run was taken on.
+
+    Returns:
+        dict: Python, numpy, platform, CPU count, git commit and timestamp.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def bench_model(model, X, y, repeats):
+    """
+    Times the model entry points on one batch and profiles one training step.
+
+    Args:
+        model (TextCNN): The model.
+        X (np.ndarray): The encoded batch.
+        y (np.ndarray): The integer labels.
+        repeats (int): The minimum number of timed calls.
+
+    Returns:
+        dict: Timings of "forward", "backward", "train_step" and "predict", and the stage
+            "profile" of a training step.
+    """
+    results = {"forward": measure(lambda: model.forward(X), repeats)}
+    model.forward(X)
+    results["backward"] = measure(lambda: model.backward(X, y), repeats)
+    results["train_step"] = measure(lambda: model.train_on_batch(X, y), repeats)
+    results["predict"] = measure(lambda: model.predict(X), repeats)
+    with model.profile(trace_memory=False) as profiler:
+        for _ in range(repeats):
+            model.train_on_batch(X, y)
+    stages = profiler.report()
+    with model.profile() as profiler:
+        model.train_on_batch(X, y)
+    for name, record in profiler.report().items():
+        stages[name]["allocated_bytes"] = record["allocated_bytes"]
+        stages[name]["peak_bytes"] = record["peak_bytes"]
+    results["profile"] = stages
+    return results
+
+def bench_handlers(model, word2idx, texts, batch_sizes, repeats):
+    """
+    Times the /predict and /predict/batch Flask handlers through the test client.
+
+    The app module is imported lazily (it loads the deployed model on import) and a
+    bundle with the benchmark model is swapped in through its model registry.
+
+    Args:
+        model (TextCNN): The model to serve.
+        word2idx (dict): Its vocabulary.
+        texts (list): Exercise texts to send.
+        batch_sizes (list): The batch sizes; 1 uses /predict, larger ones /predict/batch.
+        repeats (int): The minimum number of timed calls.
+
+    Returns:
+        dict: Timings keyed by "predict_handler/<batch_size>".
+    """
+    import app
+    from inference import MicroBatcher
+    from model_registry import ModelBundle
+    from tokenizer import Encoder
+
+    batcher = MicroBatcher(model.predict, app.max_batch_size, app.max_batch_wait_ms) if app.micro_batching else None
+    app.model_registry.swap(ModelBundle("benchmark", "benchmark", "", "", model, Encoder(word2idx, MAX_LEN),
+                                        app.model_registry.active.label2idx, model.predict, batcher=batcher))
+    client = app.app.test_client()
+
+    results = {}
+    for batch_size in batch_sizes:
+        if batch_size == 1:
+            call = lambda: client.post("/predict", json={"exercise": texts[0]}).get_json()
+        else:
+            body = [{"exercise": text} for text in texts[:batch_size]]
+            call = lambda: client.post("/predict/batch", json=body).get_data()
+        results[f"predict_handler/{batch_size}"] = measure(call, repeats)
+    return results
+
+def run(batch_sizes, vocab_sizes, repeats, handlers=True):
+    """
+    Runs the whole suite.
+
+    Args:
+        batch_sizes (list): The batch sizes to benchmark.
+        vocab_sizes (list): The vocabulary sizes to benchmark.
+        repeats (int): The minimum number of timed calls per case.
+        handlers (bool, optional): Whether to benchmark the Flask handlers. Default is True.
+
+    Returns:
+        dict: The "environment", the "settings" and the "results", keyed by
+            "<case>/vocab=<vocab_size>/batch=<batch_size>".
+    """
+    data = load_data("train_data.json")
+    labels = sorted({item["Label"] for item in data})
+    label2idx = {label: idx for idx, label in enumerate(labels)}
+    results = {}
+
+    for vocab_size in vocab_sizes:
+        word2idx = vocabulary(data, vocab_size)
+        np.random.seed(0)
+        model = TextCNN(vocab_size=vocab_size, embedding_dim=50, max_len=MAX_LEN, num_filters=64,
+                        filter_sizes=[2, 3, 4], num_classes=len(labels), optimizer=Adam(0.001))
+        for batch_size in batch_sizes:
+            items = data[:batch_size]
+            texts = [item["Exercise"] for item in items]
+            key = f"vocab={vocab_size}/batch={batch_size}"
+            results[f"encode_sentence/{key}"] = measure(
+                lambda: [encode_sentence(text, word2idx, MAX_LEN) for text in texts], repeats)
+            results[f"encode_sentences/{key}"] = measure(lambda: encode_sentences(texts, word2idx, MAX_LEN), repeats)
+            results[f"prepare_dataset/{key}"] = measure(lambda: prepare_dataset(items, word2idx, label2idx, MAX_LEN), repeats)
+
+            X, y, _ = prepare_dataset(items, word2idx, label2idx, MAX_LEN)
+            for case, result in bench_model(model, X, y, repeats).items():
+                results[f"{case}/{key}"] = result
+        if handlers:
+            texts = [item["Exercise"] for item in data[:max(batch_sizes)]]
+            for case, result in bench_handlers(model, word2idx, texts, batch_sizes, repeats).items():
+                results[f"{case}/vocab={vocab_size}"] = result
+
+    return {
+        "environment": environment(),
+        "settings": {"batch_sizes": batch_sizes, "vocab_sizes": vocab_sizes, "repeats": repeats, "max_len": MAX_LEN},
+        "results": results,
+    }
+
+def compare(base, new, threshold=0.1):
+    """
+    Prints the median time of every case in two runs and flags significant changes.
+
+    Args:
+        base (dict): The baseline run.
+        new (dict): The run to compare against the baseline.
+        threshold (float, optional): The relative change reported as faster/slower. Default is 0.1.
+    """
+    if base["environment"]["platform"] != new["environment"]["platform"]:
+        print("Warning: the runs were taken on different platforms.")
+    print(f"{'case':<48} {'base (ms)':>10} {'new (ms)':>10} {'ratio':>7}")
+    for case, result in new["results"].items():
+        if case.startswith("profile/") or case not in base["results"]:
+            continue
+        before, after = base["results"][case]["median_ms"], result["median_ms"]
+        ratio = after / before if before else float("inf")
+        flag = "  slower" if ratio > 1 + threshold else "  faster" if ratio < 1 - threshold else ""
+        print(f"{case:<48} {before:>10.3f} {after:>10.3f} {ratio:>6.2f}x{flag}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the DataWise.AI benchmark suite or compare two runs.")
+    parser.add_argument("-o", "--output", help="Where to write the JSON results. Defaults to benchmarks/results/<timestamp>.json.")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=BATCH_SIZES)
+    parser.add_argument("--vocab-sizes", type=int, nargs="+", default=VOCAB_SIZES)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--no-handlers", action="store_true", help="Skip the Flask handler benchmarks.")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="Compare two result files instead of running.")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.compare:
+        runs = []
+        for filename in args.compare:
+            with open(filename, "r") as f:
+                runs.append(json.load(f))
+        compare(*runs, threshold=args.threshold)
+        return
+
+    report = run(args.batch_sizes, args.vocab_sizes, args.repeats, handlers=not args.no_handlers)
+    output = args.output or os.path.join("benchmarks", "results", time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(report['results'])} results to {output}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import numpy as np
+
+from activations import softmax, log_softmax, nll_loss
+from optimizers import Adam
+
+def mean_embeddings(model, X, chunk_size=4096):
+    """
+    Averages the embeddings of the words of each sentence, ignoring padding.
+
+    Args:
+        model (TextCNN): The model whose embeddings are used.
+        X (np.ndarray): The encoded sentences (shape: [num_samples, max_len]).
+        chunk_size (int, optional): The number of sentences embedded at a time. Default is 4096.
+
+    Returns:
+        np.ndarray: The mean embedding of each sentence (shape: [num_samples, embedding_dim]),
+            zero for empty sentences.
+    """
+    features = []
+    for start in range(0, len(X), chunk_size):
+        chunk = np.asarray(X[start:start + chunk_size])
+        mask = chunk != 0
+        summed = np.einsum("bld,bl->bd", model._embed(chunk), mask.astype(np.float32))
+        features.append(summed / np.maximum(mask.sum(axis=1, keepdims=True), 1))
+    if not features:
+        return np.zeros((0, model.embedding_dim))
+    return np.concatenate(features)
+
+def softmax_margin(probs):
+    """
+    Computes the gap between the two largest probabilities of each row.
+
+    Args:
+        probs (np.ndarray): Class probabilities (shape: [batch_size, num_classes]).
+
+    Returns:
+        np.ndarray: The margins (shape: [batch_size]).
+    """
+    top2 = np.partition(probs, probs.shape[1] - 2, axis=1)[:, -2:]
+    return top2[:, 1] - top2[:, 0]
+
+class FastHead:
+    """
+    A linear classifier over the mean word embedding of a sentence.
+
+    It reuses the embeddings of a trained TextCNN and only owns a small weight matrix, so
+    a prediction costs one embedding gather and one (embedding_dim x num_classes) product.
+
+    Attributes:
+        weights (np.ndarray): The weights (shape: [embedding_dim, num_classes]).
+        bias (np.ndarray): The bias (shape: [1, num_classes]).
+        threshold (float): The softmax margin at or above which the head's answer is trusted.
+    """
+    def __init__(self, embedding_dim, num_classes, threshold=0.3):
+        """
+        Initializes the head with small random weights.
+
+        Args:
+            embedding_dim (int): The dimension of the word embeddings.
+            num_classes (int): The number of output classes.
+            threshold (float, optional): The confidence threshold on the softmax margin. Default is 0.3.
+        """
+        self.weights = np.random.randn(embedding_dim, num_classes) * np.sqrt(1.0 / embedding_dim)
+        self.bias = np.zeros((1, num_classes))
+        self.threshold = threshold
+
+    def predict_features(self, features):
+        """
+        Computes class probabilities from mean embeddings.
+
+        Args:
+            features (np.ndarray): Mean embeddings (shape: [batch_size, embedding_dim]).
+
+        Returns:
+            np.ndarray: The probabilities for each class (shape: [batch_size, num_classes]).
+        """
+        return softmax(np.dot(features, self.weights.astype(features.dtype)) + self.bias)
+
+    def predict(self, model, X):
+        """
+        Computes class probabilities for encoded sentences.
+
+        Args:
+            model (TextCNN): The model whose embeddings the head was trained on.
+            X (np.ndarray): The encoded sentences (shape: [batch_size, max_len]).
+
+        Returns:
+            np.ndarray: The probabilities for each class (shape: [batch_size, num_classes]).
+        """
+        return self.predict_features(mean_embeddings(model, X))
+
+def train_fast_head(model, X, y, epochs=20, batch_size=256, learning_rate=0.01, threshold=0.3, seed=0):
+    """
+    Trains a fast head on the frozen embeddings of a trained model.
+
+    The mean embeddings are computed once, so each epoch only trains a softmax regression.
+
+    Args:
+        model (TextCNN): The trained model.
+        X (np.ndarray): The encoded training sentences (shape: [num_samples, max_len]).
+        y (np.ndarray): The integer labels (shape: [num_samples]).
+        epochs (int, optional): The number of passes over the data. Default is 20.
+        batch_size (int, optional): The number of samples per update. Default is 256.
+        learning_rate (float, optional): The Adam learning rate. Default is 0.01.
+        threshold (float, optional): The confidence threshold stored on the head. Default is 0.3.
+        seed (int, optional): The seed of the initialization and shuffling. Default is 0.
+
+    Returns:
+        tuple: A tuple containing:
+            - head (FastHead): The trained head.
+            - loss (float): The average loss of the last epoch.
+    """
+    rng = np.random.default_rng(seed)
+    features = mean_embeddings(model, X).astype(np.float64)
+    y = np.asarray(y)
+    head = FastHead(features.shape[1], model.num_classes, threshold)
+    head.weights = rng.standard_normal(head.weights.shape) * np.sqrt(1.0 / features.shape[1])
+    optimizer = Adam(learning_rate)
+
+    loss = 0.0
+    for _ in range(epochs):
+        order = rng.permutation(len(features))
+        total = 0.0
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            logits = np.dot(features[idx], head.weights) + head.bias
+            total += nll_loss(log_softmax(logits), y[idx]) * len(idx)
+            d_logits = softmax(logits)
+            d_logits[np.arange(len(idx)), y[idx]] -= 1
+            d_logits /= len(idx)
+            optimizer.update("weights", head.weights, np.dot(features[idx].T, d_logits))
+            optimizer.update("bias", head.bias, np.sum(d_logits, axis=0, keepdims=True))
+        loss = total / max(len(order), 1)
+    return head, loss
+
+def save_fast_head(head, filename="models/fast_head.npz"):
+    """
+    Saves a fast head without pickling.
+
+    Args:
+        head (FastHead): The head.
+        filename (str, optional): The output path. Default is "models/fast_head.npz".
+    """
+    np.savez(filename, weights=head.weights, bias=head.bias, threshold=np.array(head.threshold))
+
+def load_fast_head(filename="models/fast_head.npz"):
+    """
+    Loads a fast head saved by `save_fast_head`.
+
+    Args:
+        filename (str, optional): The path. Default is "models/fast_head.npz".
+
+    Returns:
+        FastHead: The head.
+    """
+    with np.load(filename, allow_pickle=False) as arrays:
+        head = FastHead.__new__(FastHead)
+        head.weights = arrays["weights"]
+        head.bias = arrays["bias"]
+        head.threshold = float(arrays["threshold"])
+    return head
+
+class Cascade:
+    """
+    Answers with the fast head when it is confident and falls through to the full CNN otherwise.
+
+    Like `TextCNN.predict`, `predict` only reads parameters, so it can serve as the
+    prediction function of a `MicroBatcher`.
+
+    Attributes:
+        model (TextCNN): The full model.
+        head (FastHead): The fast head trained on the model's embeddings.
+        threshold (float): The softmax margin at or above which the fast answer is used.
+    """
+    def __init__(self, model, head, threshold=None):
+        """
+        Initializes the cascade.
+
+        Args:
+            model (TextCNN): The full model.
+            head (FastHead): The fast head.
+            threshold (float, optional): The confidence threshold. Defaults to the head's own.
+        """
+        self.model = model
+        self.head = head
+        self.threshold = head.threshold if threshold is None else threshold
+
+    def predict_routed(self, X):
+        """
+        Computes class probabilities and reports which inputs the fast head answered.
+
+        Args:
+            X (np.ndarray): The encoded sentences (shape: [batch_size, max_len]).
+
+        Returns:
+            tuple: A tuple containing:
+                - probs (np.ndarray): The probabilities for each class (shape: [batch_size, num_classes]).
+                - fast (np.ndarray): True for the rows answered by the fast head (shape: [batch_size]).
+        """
+        probs = self.head.predict(self.model, X)
+        fast = softmax_margin(probs) >= self.threshold
+        if not fast.all():
+            slow = ~fast
+            probs = probs.astype(np.result_type(probs.dtype, self.model.fc_bias.dtype))
+            probs[slow] = self.model.predict(X[slow])
+        return probs, fast
+
+    def predict(self, X):
+        """
+        Computes class probabilities through the cascade.
+
+        Args:
+            X (np.ndarray): The encoded sentences (shape: [batch_size, max_len]).
+
+        Returns:
+            np.ndarray: The probabilities for each class (shape: [batch_size, num_classes]).
+        """
+        return self.predict_routed(X)[0]
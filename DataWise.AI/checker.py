@@ -1,16 +1,4 @@
-import csv
-from collections import Counter
+from question_pipeline import print_summary, run_pipeline
 
-def list_difficulty_counts(csv_filename):
-    difficulty_counts = Counter()
-    with open(csv_filename, "r", newline='', encoding="utf-8") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            difficulty_counts[row["Difficulty"]] += 1
-    return difficulty_counts
-
-csv_filename = "new_interview_questions.csv"
-counts = list_difficulty_counts(csv_filename)
-print("Difficulty counts:")
-for difficulty, count in counts.items():
-    print(f"{difficulty}: {count}")
+# Kept for existing workflows; `python3 question_pipeline.py --check` does the same.
+print_summary(run_pipeline("new_interview_questions.csv", steps=[], renumber=False))
@@ -0,0 +1,47 @@
+import argparse
+import json
+import pickle
+import sys
+
+from data_utils import iter_json_array, iter_ndjson
+from inference import classify_records
+from artifact import load_artifact
+from tokenizer import Encoder
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify the exercises in a JSON or JSONL file offline.")
+    parser.add_argument("input", help="A JSON array, a {\"data\": [...]} dataset file, or a .jsonl/.ndjson file.")
+    parser.add_argument("-o", "--output", help="Where to write the NDJSON results. Defaults to stdout.")
+    parser.add_argument("--model", default="models/cnn_model.bin",
+                        help="A model artifact (.bin) or a pickled model (.pkl).")
+    parser.add_argument("--word2idx", default="word2idx.json")
+    parser.add_argument("--label2idx", default="label2idx.json")
+    parser.add_argument("--max-len", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    if args.model.endswith(".pkl"):
+        with open(args.model, "rb") as f:
+            model = pickle.load(f)
+    else:
+        model = load_artifact(args.model)
+    encoder = Encoder.load(args.word2idx, args.max_len)
+    with open(args.label2idx, "r") as f:
+        idx2label = {v: k for k, v in json.load(f).items()}
+
+    ndjson = args.input.endswith((".jsonl", ".ndjson"))
+    with open(args.input, "r", encoding="utf-8") as infile:
+        out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+        try:
+            records = iter_ndjson(infile) if ndjson else iter_json_array(infile)
+            count = 0
+            for result in classify_records(records, model.predict, encoder, idx2label, args.chunk_size):
+                out.write(json.dumps(result) + "\n")
+                count += 1
+        finally:
+            if out is not sys.stdout:
+                out.close()
+    print(f"Classified {count} records.", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
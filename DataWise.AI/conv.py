@@ -0,0 +1,78 @@
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+def unfold(x, size):
+    """
+    Builds every sliding window of a batch of sequences as a zero-copy strided view.
+
+    Args:
+        x (np.ndarray): The input batch (shape: [batch_size, seq_len, dim]).
+        size (int): The window (filter) size.
+
+    Returns:
+        np.ndarray: A read-only view of the windows, flattened per position
+            (shape: [batch_size, seq_len - size + 1, size * dim]).
+    """
+    x = np.ascontiguousarray(x)
+    batch_size, seq_len, dim = x.shape
+    positions = seq_len - size + 1
+    stride_b, stride_l, stride_d = x.strides
+    windows = as_strided(x, shape=(batch_size, positions, size, dim),
+                         strides=(stride_b, stride_l, stride_l, stride_d), writeable=False)
+    return windows.reshape(batch_size, positions, size * dim)
+
+def conv1d(x, weight):
+    """
+    Applies a 1D convolution over the sequence axis as a single matrix multiplication.
+
+    Args:
+        x (np.ndarray): The input batch (shape: [batch_size, seq_len, dim]).
+        weight (np.ndarray): The filter bank (shape: [size, dim, num_filters]).
+
+    Returns:
+        np.ndarray: The convolution output (shape: [batch_size, seq_len - size + 1, num_filters]).
+    """
+    size, dim, num_filters = weight.shape
+    return np.matmul(unfold(x, size), weight.reshape(size * dim, num_filters))
+
+def fold(cols, size, seq_len):
+    """
+    Accumulates per-window gradients back onto the sequence they were unfolded from (col2im).
+
+    Args:
+        cols (np.ndarray): Gradients with respect to the unfolded windows
+            (shape: [batch_size, positions, size * dim]).
+        size (int): The window (filter) size.
+        seq_len (int): The length of the original sequences.
+
+    Returns:
+        np.ndarray: The gradients with respect to the input (shape: [batch_size, seq_len, dim]).
+    """
+    batch_size, positions, _ = cols.shape
+    cols = cols.reshape(batch_size, positions, size, -1)
+    out = np.zeros((batch_size, seq_len, cols.shape[3]), dtype=cols.dtype)
+    for k in range(size):
+        out[:, k:k+positions, :] += cols[:, :, k, :]
+    return out
+
+def conv1d_backward(x, weight, d_out):
+    """
+    Computes the gradients of conv1d with respect to its input and its filter bank.
+
+    Args:
+        x (np.ndarray): The input batch used in the forward pass (shape: [batch_size, seq_len, dim]).
+        weight (np.ndarray): The filter bank (shape: [size, dim, num_filters]).
+        d_out (np.ndarray): The gradient of the convolution output
+            (shape: [batch_size, seq_len - size + 1, num_filters]).
+
+    Returns:
+        tuple: A tuple containing:
+            - d_x (np.ndarray): The gradient with respect to x.
+            - d_weight (np.ndarray): The gradient with respect to weight.
+    """
+    size, dim, num_filters = weight.shape
+    cols = unfold(x, size)
+    d_weight = np.tensordot(cols, d_out, axes=([0, 1], [0, 1])).reshape(size, dim, num_filters)
+    d_cols = np.matmul(d_out, weight.reshape(size * dim, num_filters).T)
+    d_x = fold(d_cols, size, x.shape[1])
+    return d_x, d_weight
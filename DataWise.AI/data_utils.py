@@ -1,22 +1,165 @@
 import json
+import os
 import numpy as np
 import random
+import queue
+import threading
 from collections import Counter
 
+JSONL_EXTENSIONS = (".jsonl", ".ndjson")
+
 def load_data(filename):
     """
-    Loads the dataset from a JSON file.
+    Loads the dataset from a JSON file, a JSONL file or a directory of JSONL shards.
 
     Args:
-        filename (str): The path to the JSON file containing the dataset.
+        filename (str): The path to the {"data": [...]} JSON file, a .jsonl/.ndjson file or
+            a directory of shards written by splitter.py.
 
     Returns:
-        list: The list of data items from the JSON file.
+        list: The list of data items.
     """
+    if os.path.isdir(filename) or filename.endswith(JSONL_EXTENSIONS):
+        return list(iter_records(filename))
     with open(filename, 'r') as f:
         data = json.load(f)
     return data['data']
 
+def dataset_files(path):
+    """
+    Lists the files that make up a dataset.
+
+    Args:
+        path (str): A dataset file, or a directory of .jsonl/.ndjson shards.
+
+    Returns:
+        list: The path itself, or the shards of the directory in name order.
+    """
+    if not os.path.isdir(path):
+        return [path]
+    return [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(JSONL_EXTENSIONS)]
+
+def iter_records(path):
+    """
+    Streams the data items of a dataset without loading it into memory.
+
+    Args:
+        path (str): A {"data": [...]} JSON file, a .jsonl/.ndjson file or a directory of JSONL shards.
+
+    Yields:
+        dict: Each data item.
+    """
+    for filename in dataset_files(path):
+        with open(filename, 'r', encoding='utf-8') as f:
+            yield from (iter_ndjson(f) if filename.endswith(JSONL_EXTENSIONS) else iter_json_array(f))
+
+def iter_json_array(f, chunk_size=1 << 16):
+    """
+    Incrementally parses the items of a JSON array without loading the whole document.
+
+    The array is either the top-level value or the "data" member of a top-level object
+    (the {"data": [...]} layout of the dataset files). Members before "data" are decoded
+    and skipped, so brackets inside their strings are not mistaken for the array.
+
+    Args:
+        f (io.TextIOBase): A text stream containing the JSON document.
+        chunk_size (int, optional): The number of characters read at a time. Defaults to 65536.
+
+    Yields:
+        object: Each decoded item of the array.
+
+    Raises:
+        ValueError: If the document is not such an array, or is malformed or truncated.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+
+    def fill():
+        # Drops the consumed part of the buffer and appends the next chunk.
+        nonlocal buffer, pos, eof
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + chunk, 0
+
+    def peek():
+        # Skips whitespace and returns the next character, or "" at the end of the stream.
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n\ufeff":
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if eof:
+                return ""
+            fill()
+
+    def value():
+        nonlocal pos
+        while True:
+            try:
+                if pos == len(buffer):
+                    raise json.JSONDecodeError("Need more data", buffer, pos)
+                item, end = decoder.raw_decode(buffer, pos)
+                if end == len(buffer) and not eof:
+                    raise json.JSONDecodeError("Value may be truncated", buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise ValueError("Unterminated or malformed JSON array.")
+                fill()
+                continue
+            pos = end
+            return item
+
+    first = peek()
+    if first == "{":
+        pos += 1
+        while True:
+            if peek() == "}":
+                raise ValueError('The JSON object has no "data" array.')
+            if peek() != '"':
+                raise ValueError("Malformed JSON object.")
+            key = value()
+            if peek() != ":":
+                raise ValueError("Malformed JSON object.")
+            pos += 1
+            if key == "data" and peek() == "[":
+                break
+            value()
+            if peek() == ",":
+                pos += 1
+            elif peek() != "}":
+                raise ValueError("Malformed JSON object.")
+    elif first != "[":
+        raise ValueError("No JSON array found in the input.")
+    pos += 1
+
+    if peek() == "]":
+        return
+    while True:
+        peek()
+        yield value()
+        separator = peek()
+        if separator == "]":
+            return
+        if separator != ",":
+            raise ValueError("Unterminated or malformed JSON array.")
+        pos += 1
+
+def iter_ndjson(f):
+    """
+    Parses newline-delimited JSON one line at a time, skipping blank lines.
+
+    Args:
+        f (io.TextIOBase): A text stream with one JSON value per line.
+
+    Yields:
+        object: Each decoded line.
+    """
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
 def tokenize(sentence):
     """
     Tokenizes a sentence by converting it to lowercase and splitting it into words.
@@ -69,6 +212,37 @@ def encode_sentence(sentence, word2idx, max_len):
         seq = seq[:max_len]
     return np.array(seq)
 
+def encode_sentences(sentences, word2idx, max_len, out=None):
+    """
+    Encodes a batch of sentences into a single padded integer array.
+
+    Produces the same rows as `encode_sentence`, but fills one preallocated array with a
+    single scatter instead of building and padding a list per sentence.
+
+    Args:
+        sentences (list): The sentences to be encoded.
+        word2idx (dict): A dictionary mapping words to indices.
+        max_len (int): The maximum length of the encoded sequences.
+        out (np.ndarray, optional): A preallocated int32 array of shape (len(sentences), max_len) to fill.
+
+    Returns:
+        np.ndarray: The encoded sentences (shape: [len(sentences), max_len], dtype: int32).
+    """
+    token_lists = [tokenize(sentence)[:max_len] for sentence in sentences]
+    lengths = np.fromiter((len(tokens) for tokens in token_lists), dtype=np.int64, count=len(token_lists))
+    get = word2idx.get
+    ids = np.fromiter((get(token, 0) for tokens in token_lists for token in tokens), dtype=np.int32, count=int(lengths.sum()))
+
+    if out is None:
+        X = np.zeros((len(token_lists), max_len), dtype=np.int32)
+    else:
+        X = out
+        X.fill(0)
+    rows = np.repeat(np.arange(len(token_lists)), lengths)
+    cols = np.arange(len(ids)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    X[rows, cols] = ids
+    return X
+
 def encode_labels(data, label2idx):
     """
     Encodes the labels of the dataset into integer indices based on a label-to-index mapping.
@@ -116,7 +290,7 @@ def prepare_dataset(data, word2idx, label2idx, max_len):
             - y (np.ndarray): The integer-encoded labels.
             - y_onehot (np.ndarray): The one-hot encoded labels.
     """
-    X = np.array([encode_sentence(item["Exercise"], word2idx, max_len) for item in data])
+    X = encode_sentences([item["Exercise"] for item in data], word2idx, max_len)
     y = encode_labels(data, label2idx)
     y_onehot = one_hot(y, len(label2idx))
     return X, y, y_onehot
@@ -139,3 +313,147 @@ def train_val_split(data, val_ratio=0.2, seed=42):
     random.shuffle(data)
     split_index = int(len(data) * (1 - val_ratio))
     return data[:split_index], data[split_index:]
+
+class BucketSampler:
+    """
+    Yields index batches of sentences with similar lengths.
+
+    Every epoch the samples are shuffled and split into pools of `pool_batches` batches.
+    Each pool is sorted by length and cut into batches, and the order of all batches is
+    shuffled, so batches stay random while sentences within a batch have similar lengths
+    (which lets `TextCNN.forward` skip most of the padding).
+
+    Attributes:
+        lengths (np.ndarray): The real length of each sample.
+        batch_size (int): The number of samples per batch.
+        pool_batches (int): The number of batches sorted together.
+        shuffle (bool): Whether to randomize pools and batch order every epoch.
+    """
+    def __init__(self, lengths, batch_size=32, pool_batches=100, shuffle=True, seed=None):
+        """
+        Initializes the sampler.
+
+        Args:
+            lengths (np.ndarray): The real length of each sample, e.g. from `model.sequence_lengths`.
+            batch_size (int, optional): The number of samples per batch. Defaults to 32.
+            pool_batches (int, optional): The number of batches sorted together. Defaults to 100.
+            shuffle (bool, optional): Whether to shuffle every epoch. Defaults to True.
+            seed (int, optional): The seed of the shuffling generator. Defaults to None.
+        """
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.pool_batches = pool_batches
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        pool = self.batch_size * self.pool_batches
+        full_pools, rest = divmod(len(self.lengths), pool)
+        return full_pools * self.pool_batches + (rest + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        order = self.rng.permutation(len(self.lengths)) if self.shuffle else np.arange(len(self.lengths))
+        pool = self.batch_size * self.pool_batches
+        batches = []
+        for start in range(0, len(order), pool):
+            chunk = order[start:start + pool]
+            chunk = chunk[np.argsort(self.lengths[chunk], kind="stable")]
+            batches.extend(chunk[i:i + self.batch_size] for i in range(0, len(chunk), self.batch_size))
+        if self.shuffle:
+            batches = [batches[i] for i in self.rng.permutation(len(batches))]
+        return iter(batches)
+
+class DataLoader:
+    """
+    Iterates over mini-batches of a dataset in a random order with background prefetching.
+
+    Each epoch draws a fresh index permutation (or the batches of a sampler such as
+    `BucketSampler`) and gathers only the rows of the current batch, so the full dataset
+    is never copied or reordered. With prefetching enabled the next batches are gathered
+    on a background thread while the current one is in use.
+
+    Attributes:
+        X (np.ndarray): The encoded sentences (may be memory-mapped).
+        y (np.ndarray): The integer labels.
+        batch_size (int): The number of samples per batch.
+        shuffle (bool): Whether to visit the samples in a new random order every epoch.
+        prefetch (int): The number of batches prepared ahead of time (0 disables the thread).
+        sampler (iterable): Yields the index array of each batch; overrides batch_size and shuffle.
+    """
+    def __init__(self, X, y, batch_size=32, shuffle=True, prefetch=2, seed=None, sampler=None):
+        """
+        Initializes the loader.
+
+        Args:
+            X (np.ndarray): The encoded sentences (shape: [num_samples, max_len]).
+            y (np.ndarray): The integer labels (shape: [num_samples]).
+            batch_size (int, optional): The number of samples per batch. Defaults to 32.
+            shuffle (bool, optional): Whether to shuffle every epoch. Defaults to True.
+            prefetch (int, optional): The number of batches prepared ahead of time. Defaults to 2.
+            seed (int, optional): The seed of the shuffling generator. Defaults to None.
+            sampler (iterable, optional): Yields the index array of each batch, e.g. a `BucketSampler`.
+        """
+        self.X = X
+        self.y = y
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.prefetch = prefetch
+        self.sampler = sampler
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        if self.sampler is not None:
+            return len(self.sampler)
+        return (len(self.X) + self.batch_size - 1) // self.batch_size
+
+    def _index_batches(self):
+        if self.sampler is not None:
+            return iter(self.sampler)
+        order = self.rng.permutation(len(self.X)) if self.shuffle else np.arange(len(self.X))
+        return (order[start:start + self.batch_size] for start in range(0, len(order), self.batch_size))
+
+    def _batches(self, index_batches):
+        for idx in index_batches:
+            yield np.take(self.X, idx, axis=0), np.take(self.y, idx).astype(np.int32, copy=False)
+
+    def __iter__(self):
+        index_batches = self._index_batches()
+        if not self.prefetch:
+            yield from self._batches(index_batches)
+            return
+
+        ready = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        end = object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    ready.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                for batch in self._batches(index_batches):
+                    if not put(batch):
+                        return
+                put(end)
+            except BaseException as e:
+                put(e)
+
+        worker = threading.Thread(target=produce, name="data-loader", daemon=True)
+        worker.start()
+        try:
+            while True:
+                item = ready.get()
+                if item is end:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            worker.join()
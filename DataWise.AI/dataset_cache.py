@@ -0,0 +1,153 @@
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+
+import data_utils
+from data_utils import load_data, dataset_files, build_vocab, encode_sentences, encode_labels
+from tokenizer import save_vocab, read_vocab
+
+CACHE_VERSION = 1
+
+def file_digest(filename, chunk_size=1 << 20):
+    """
+    Computes the SHA-256 digest of a file's contents.
+
+    Args:
+        filename (str): The file to hash.
+        chunk_size (int, optional): The number of bytes read at a time. Defaults to 1 MiB.
+
+    Returns:
+        str: The hexadecimal digest.
+    """
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def cache_key(train_filename, val_filename, max_len, min_freq):
+    """
+    Derives the cache key of an encoded dataset.
+
+    The key covers the contents of both datasets (every shard of a shard directory), the encoding settings and the
+    source code of the tokenizer and encoders, so editing any of them invalidates the cache.
+
+    Args:
+        train_filename (str): The training data JSON file.
+        val_filename (str): The validation data JSON file.
+        max_len (int): The length of the encoded sentences.
+        min_freq (int): The minimum word frequency for the vocabulary.
+
+    Returns:
+        str: The cache key.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps({"version": CACHE_VERSION, "max_len": max_len, "min_freq": min_freq}).encode("utf-8"))
+    for fn in (data_utils.tokenize, data_utils.build_vocab, data_utils.encode_sentences, data_utils.encode_labels):
+        digest.update(inspect.getsource(fn).encode("utf-8"))
+    for filename in dataset_files(train_filename) + [None] + dataset_files(val_filename):
+        digest.update(file_digest(filename).encode("ascii") if filename else b"|")
+    return digest.hexdigest()[:16]
+
+def source_prefix(train_filename, val_filename):
+    """
+    Identifies the pair of input paths a cache entry was built from.
+
+    Entry names start with this prefix, so a new entry only replaces older entries for
+    the same inputs and leaves the entries of other datasets alone.
+
+    Args:
+        train_filename (str): The training data JSON file or shard directory.
+        val_filename (str): The validation data JSON file or shard directory.
+
+    Returns:
+        str: The prefix.
+    """
+    paths = json.dumps([os.path.abspath(train_filename), os.path.abspath(val_filename)])
+    return hashlib.sha256(paths.encode("utf-8")).hexdigest()[:8]
+
+def build_dataset(train_filename, val_filename, max_len, min_freq=1):
+    """
+    Parses, tokenizes and encodes the training and validation data.
+
+    Args:
+        train_filename (str): The training data JSON file.
+        val_filename (str): The validation data JSON file.
+        max_len (int): The length of the encoded sentences.
+        min_freq (int, optional): The minimum word frequency for the vocabulary. Defaults to 1.
+
+    Returns:
+        dict: "X_train", "y_train", "X_val", "y_val", "word2idx" and "label2idx".
+    """
+    train_data = load_data(train_filename)
+    val_data = load_data(val_filename)
+    word2idx = build_vocab(train_data, min_freq)
+    labels_set = sorted({item["Label"] for item in train_data})
+    label2idx = {label: idx for idx, label in enumerate(labels_set)}
+    return {
+        "X_train": encode_sentences([item["Exercise"] for item in train_data], word2idx, max_len),
+        "y_train": encode_labels(train_data, label2idx).astype(np.int32),
+        "X_val": encode_sentences([item["Exercise"] for item in val_data], word2idx, max_len),
+        "y_val": encode_labels(val_data, label2idx).astype(np.int32),
+        "word2idx": word2idx,
+        "label2idx": label2idx,
+    }
+
+def load_dataset(train_filename="train_data.json", val_filename="val_data.json", max_len=42,
+                 min_freq=1, cache_dir="cache"):
+    """
+    Loads the encoded dataset from the cache, building and caching it on a miss.
+
+    Cached arrays are memory-mapped, so a hit skips JSON parsing and tokenization entirely.
+    When a new entry is written, older entries for the same input paths (older data or
+    settings) are removed. Entries of other datasets and the temporary directories of
+    entries still being written by other processes are left alone.
+
+    Args:
+        train_filename (str, optional): The training data JSON file or shard directory. Defaults to "train_data.json".
+        val_filename (str, optional): The validation data JSON file or shard directory. Defaults to "val_data.json".
+        max_len (int, optional): The length of the encoded sentences. Defaults to 42.
+        min_freq (int, optional): The minimum word frequency for the vocabulary. Defaults to 1.
+        cache_dir (str, optional): The cache directory. Defaults to "cache".
+
+    Returns:
+        dict: "X_train", "y_train", "X_val", "y_val" (read-only memory-mapped arrays),
+            "word2idx", "label2idx" and "cache_hit".
+    """
+    prefix = source_prefix(train_filename, val_filename)
+    key = f"{prefix}-{cache_key(train_filename, val_filename, max_len, min_freq)}"
+    entry_dir = os.path.join(cache_dir, key)
+    array_names = ("X_train", "y_train", "X_val", "y_val")
+
+    if not os.path.isdir(entry_dir):
+        dataset = build_dataset(train_filename, val_filename, max_len, min_freq)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=cache_dir, prefix=".tmp-")
+        try:
+            for name in array_names:
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), dataset[name])
+            save_vocab(dataset["word2idx"], os.path.join(tmp_dir, "word2idx.bin"))
+            with open(os.path.join(tmp_dir, "label2idx.json"), "w") as f:
+                json.dump(dataset["label2idx"], f)
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.isdir(entry_dir):
+                raise
+        for name in os.listdir(cache_dir):
+            if name != key and name.startswith(prefix + "-"):
+                shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+        cache_hit = False
+    else:
+        cache_hit = True
+
+    dataset = {name: np.load(os.path.join(entry_dir, f"{name}.npy"), mmap_mode="r") for name in array_names}
+    dataset["word2idx"] = read_vocab(os.path.join(entry_dir, "word2idx.bin"))
+    with open(os.path.join(entry_dir, "label2idx.json"), "r") as f:
+        dataset["label2idx"] = json.load(f)
+    dataset["cache_hit"] = cache_hit
+    return dataset
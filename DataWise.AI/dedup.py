@@ -0,0 +1,454 @@
+import argparse
+import csv
+import hashlib
+import itertools
+import os
+import re
+import unicodedata
+import zlib
+import numpy as np
+
+# MinHash permutations are multiply-shift hashes, (a * x + b) >> 32 in wrapping uint64
+# arithmetic, which avoids a modulo per shingle and permutation.
+_SHIFT = np.uint64(32)
+_MASK32 = np.uint64(0xFFFFFFFF)
+_MIX = np.uint64(0x9E3779B1)
+_MAX_HASH = np.uint32(0xFFFFFFFF)
+
+_NON_WORD = re.compile(r"[\W_]+")
+_NON_WORD_OR_NEWLINE = re.compile(r"[^\w\n]+|_+")
+_ASCII_NON_WORD = str.maketrans({chr(c): " " for c in range(128) if not chr(c).isalnum() and chr(c) != "\n"})
+
+def normalize_text(text):
+    """
+    Normalizes a text for duplicate detection: Unicode NFKC, case folding, punctuation
+    removed and whitespace collapsed.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        str: The normalized text, words separated by single spaces.
+    """
+    return " ".join(_NON_WORD.sub(" ", unicodedata.normalize("NFKC", text).casefold()).split())
+
+def _normalize_batch(texts):
+    # One pass over the whole batch instead of one per text; texts that contain a newline
+    # themselves fall back to `normalize_text`. ASCII needs neither NFKC nor the regex.
+    joined = "\n".join(texts)
+    if joined.isascii():
+        joined = joined.lower().translate(_ASCII_NON_WORD)
+    else:
+        joined = _NON_WORD_OR_NEWLINE.sub(" ", unicodedata.normalize("NFKC", joined).casefold())
+    lines = joined.split("\n")
+    if len(lines) != len(texts):
+        return [normalize_text(text) for text in texts]
+    return [" ".join(line.split()) for line in lines]
+
+class _SortedIndex:
+    """
+    A sorted array of keys with one value each, grown by merging batches.
+
+    Lookups are vectorized binary searches and a merge costs one pass over the arrays, so
+    the index holds millions of entries in a few bytes each instead of a Python dict.
+    """
+    def __init__(self, key_dtype, value_dtype):
+        self.keys = np.zeros(0, dtype=key_dtype)
+        self.values = np.zeros(0, dtype=value_dtype)
+
+    def lookup(self, keys):
+        """
+        Returns the value of the earliest added entry of each key, or -1. Sorted keys
+        are found several times faster than shuffled ones.
+        """
+        pos = np.searchsorted(self.keys, keys, side="left")
+        found = pos < len(self.keys)
+        found[found] = self.keys[pos[found]] == keys[found]
+        values = np.full(len(keys), -1, dtype=np.int64)
+        values[found] = self.values[pos[found]]
+        return values
+
+    def lookup_recent(self, keys, limit):
+        """
+        Returns up to `limit` of the most recently added entries of each key, as (query
+        index, value) pairs grouped by query. Sorted keys are found several times faster
+        than shuffled ones.
+        """
+        left = np.searchsorted(self.keys, keys, side="left")
+        right = np.searchsorted(self.keys, keys, side="right")
+        counts = np.minimum(right - left, limit)
+        queries = np.repeat(np.arange(len(keys)), counts)
+        offsets = np.arange(len(queries)) - np.repeat(np.cumsum(counts) - counts, counts)
+        return queries, self.values[np.repeat(right - counts, counts) + offsets].astype(np.int64)
+
+    def add(self, keys, values, presorted=False):
+        """
+        Merges entries, keeping equal keys in insertion order.
+        """
+        if not presorted:
+            order = np.argsort(keys, kind="stable")
+            keys, values = keys[order], values[order]
+        pos = np.searchsorted(self.keys, keys, side="right")
+        self.keys = np.insert(self.keys, pos, keys)
+        self.values = np.insert(self.values, pos, values.astype(self.values.dtype))
+
+    @property
+    def nbytes(self):
+        return self.keys.nbytes + self.values.nbytes
+
+class Deduplicator:
+    """
+    Streaming exact and near-duplicate detection.
+
+    Exact duplicates are found by hashing the normalized text. Near duplicates are found
+    with MinHash signatures over word shingles and LSH banding: a text becomes a candidate
+    duplicate of an earlier one when all rows of any band of their signatures agree, and
+    the candidate is confirmed when the estimated Jaccard similarity reaches `threshold`.
+    Each text is compared with at most `max_candidates` texts per band (the most recent
+    ones sharing the band) instead of every earlier text. Texts that share a long opener
+    often share some bands with many unrelated texts, so checking only one text per band
+    would miss their duplicates.
+
+    Texts are processed in batches. Only the index is kept: an 8-byte hash per distinct
+    text, a 4-byte key per band and the low `bits` bits of each MinHash value per kept
+    text, so memory grows with the number of unique texts but never holds the texts. A
+    text is only dropped as a near duplicate of a kept text it is similar to itself, so
+    duplicates never chain through a text that was dropped.
+
+    Attributes:
+        num_perm (int): The number of MinHash permutations.
+        bands (int): The number of LSH bands; num_perm must be a multiple of it.
+        threshold (float): The estimated Jaccard similarity at which texts are near duplicates.
+        shingle_size (int): The number of words per shingle.
+        bits (int): The number of bits of each MinHash value stored for verification (8 or 16).
+        max_candidates (int): The number of texts sharing a band that each text is compared with.
+        num_rows (int): The number of texts seen.
+        num_exact (int): The number of exact duplicates found.
+        num_near (int): The number of near duplicates found.
+    """
+    def __init__(self, num_perm=64, bands=16, threshold=0.6, shingle_size=2, bits=8, seed=1, max_candidates=8):
+        """
+        Initializes an empty index.
+
+        Args:
+            num_perm (int, optional): The number of MinHash permutations. Defaults to 64.
+            bands (int, optional): The number of LSH bands. Defaults to 16.
+            threshold (float, optional): The near-duplicate Jaccard threshold. Defaults to 0.6.
+            shingle_size (int, optional): The number of words per shingle. Defaults to 2.
+            bits (int, optional): The stored bits per MinHash value, 8 or 16. Defaults to 8.
+            seed (int, optional): The seed of the MinHash permutations. Defaults to 1.
+            max_candidates (int, optional): The number of texts sharing a band that each text
+                is compared with. Defaults to 8.
+        """
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands}).")
+        if bits not in (8, 16):
+            raise ValueError(f"bits must be 8 or 16, got {bits}.")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.bits = bits
+        self.max_candidates = max_candidates
+        self.num_rows = 0
+        self.num_exact = 0
+        self.num_near = 0
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(0, 2**64, size=(num_perm, 1), dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**64, size=(num_perm, 1), dtype=np.uint64)
+        self._word_hashes = {}
+        self._exact = _SortedIndex(np.uint64, np.int64)
+        self._band_index = [_SortedIndex(np.uint32, np.uint32) for _ in range(bands)]
+        self._sig_dtype = np.uint8 if bits == 8 else np.uint16
+        self._signatures = np.zeros((1024, num_perm), dtype=self._sig_dtype)
+        self._row_ids = np.zeros(1024, dtype=np.int64)
+        self._num_kept = 0
+
+    def _hash_words(self, words):
+        cache = self._word_hashes
+        missing = set(words).difference(cache)
+        # Bounded so an endless stream of new words cannot grow the cache without limit.
+        if len(cache) + len(missing) > 1 << 20:
+            cache.clear()
+            missing = set(words)
+        for word in missing:
+            cache[word] = zlib.crc32(word.encode("utf-8"))
+        return np.fromiter(map(cache.__getitem__, words), dtype=np.uint64, count=len(words))
+
+    def signatures(self, texts):
+        """
+        Computes MinHash signatures and normalized-text hashes.
+
+        Args:
+            texts (list): The texts.
+
+        Returns:
+            tuple: A tuple containing:
+                - signatures (np.ndarray): The MinHash values (shape: [len(texts), num_perm], uint32).
+                - text_hashes (np.ndarray): The hashes of the normalized texts (shape: [len(texts)], uint64).
+        """
+        n, k = len(texts), self.shingle_size
+        text_hashes = np.empty(n, dtype=np.uint64)
+        lengths = np.empty(n, dtype=np.int64)
+        words_per_text = []
+        for i, normalized in enumerate(_normalize_batch(texts)):
+            text_hashes[i] = int.from_bytes(hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest(), "little")
+            words = normalized.split()
+            # An empty word marks both ends of a text, so the first and last words get
+            # shingles of their own and short texts that differ in one word do not look
+            # alike; texts still shorter than a shingle are padded to one.
+            if words:
+                words = ["", *words, ""]
+                if len(words) < k:
+                    words += [""] * (k - len(words))
+            lengths[i] = len(words)
+            words_per_text.append(words)
+
+        # Shingle hashes fold k consecutive word hashes; shingles crossing a text boundary
+        # are dropped.
+        flat = self._hash_words(list(itertools.chain.from_iterable(words_per_text)))
+        ends = np.cumsum(lengths)
+        num_positions = max(len(flat) - k + 1, 0)
+        shingles = flat[:num_positions].copy()
+        for j in range(1, k):
+            shingles = (shingles * _MIX + flat[j:num_positions + j]) & _MASK32
+        owner = np.repeat(np.arange(n), lengths)[:num_positions]
+        valid = np.arange(num_positions) + k <= ends[owner]
+        shingles, owner = shingles[valid], owner[valid]
+
+        signatures = np.full((n, self.num_perm), _MAX_HASH, dtype=np.uint32)
+        if len(shingles):
+            counts = np.bincount(owner, minlength=n)
+            has_shingles = counts > 0
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[has_shingles]
+            # Permutations are applied a few at a time, in place, to bound the temporary array.
+            permuted = np.empty((16, len(shingles)), dtype=np.uint64)
+            for p in range(0, self.num_perm, 16):
+                block = permuted[:len(self._a[p:p + 16])]
+                np.multiply(self._a[p:p + 16], shingles, out=block)
+                block += self._b[p:p + 16]
+                block >>= _SHIFT
+                signatures[has_shingles, p:p + 16] = np.minimum.reduceat(block, starts, axis=1).T
+        return signatures, text_hashes
+
+    def _band_keys(self, signatures):
+        rows = self.num_perm // self.bands
+        banded = signatures.reshape(len(signatures), self.bands, rows).astype(np.uint64)
+        keys = banded[:, :, 0]
+        for r in range(1, rows):
+            keys = (keys * _MIX + banded[:, :, r]) & _MASK32
+        return keys.astype(np.uint32)
+
+    def _similarity(self, stored, signatures):
+        matches = np.mean(stored == signatures, axis=-1)
+        chance = 2.0 ** -self.bits
+        return (matches - chance) / (1 - chance)
+
+    def add(self, texts):
+        """
+        Checks a batch of texts against every earlier text and each other, then indexes the new ones.
+
+        Args:
+            texts (list): The texts, in stream order.
+
+        Returns:
+            tuple: A tuple containing:
+                - duplicate_of (np.ndarray): For each text, the stream position of the earlier
+                  text it duplicates, or -1 if it is new (shape: [len(texts)], int64).
+                - exact (np.ndarray): True for exact duplicates (shape: [len(texts)]).
+        """
+        n = len(texts)
+        base = self.num_rows
+        positions = np.arange(base, base + n)
+        signatures, text_hashes = self.signatures(texts)
+        stored = (signatures & np.uint32((1 << self.bits) - 1)).astype(self._sig_dtype)
+        band_keys = self._band_keys(signatures)
+
+        # Exact duplicates: of an earlier batch, or of the first equal text in this one.
+        duplicate_of = self._exact.lookup(text_hashes)
+        _, first, inverse = np.unique(text_hashes, return_index=True, return_inverse=True)
+        first_in_batch = first[inverse.reshape(-1)]
+        in_batch = (duplicate_of < 0) & (first_in_batch != np.arange(n))
+        duplicate_of[in_batch] = positions[first_in_batch[in_batch]]
+        exact = duplicate_of >= 0
+
+        # Each band is sorted once; the order serves the index lookups, the grouping
+        # within the batch and the merge into the index.
+        orders = [np.argsort(band_keys[:, band], kind="stable") for band in range(self.bands)]
+
+        # Near duplicates of earlier batches: the earliest confirmed band candidate.
+        no_match = np.iinfo(np.int64).max
+        best = np.full(n, no_match, dtype=np.int64)
+        for band, index in enumerate(self._band_index):
+            order = orders[band]
+            queries, slots = index.lookup_recent(band_keys[order, band], self.max_candidates)
+            rows = order[queries]
+            hit = ~exact[rows]
+            rows, slots = rows[hit], slots[hit]
+            if len(rows):
+                similar = self._similarity(self._signatures[slots], stored[rows]) >= self.threshold
+                np.minimum.at(best, rows[similar], self._row_ids[slots[similar]])
+        found = best != no_match
+        duplicate_of[found] = best[found]
+
+        # Near duplicates within the batch: the earliest kept text among the max_candidates
+        # preceding ones sharing a band that is confirmed similar. Texts are resolved in
+        # stream order, and a text that was itself dropped is never a match, so duplicates
+        # do not chain (A ~ B and B ~ C does not drop C unless C ~ A).
+        pair_rows, pair_earlier = [], []
+        for band in range(self.bands):
+            order = orders[band]
+            sorted_keys = band_keys[order, band]
+            group_start = np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1]))
+            rank = np.arange(n) - np.maximum.accumulate(np.where(group_start, np.arange(n), 0))
+            for distance in range(1, self.max_candidates + 1):
+                at = np.where(rank >= distance)[0]
+                if not len(at):
+                    break
+                rows, earlier = order[at], order[at - distance]
+                hit = (duplicate_of[rows] < 0) & (duplicate_of[earlier] < 0)
+                rows, earlier = rows[hit], earlier[hit]
+                if len(rows):
+                    similar = self._similarity(stored[earlier], stored[rows]) >= self.threshold
+                    pair_rows.append(rows[similar])
+                    pair_earlier.append(earlier[similar])
+        if pair_rows:
+            rows, earlier = np.concatenate(pair_rows), np.concatenate(pair_earlier)
+            pairs = np.lexsort((earlier, rows))
+            for i, j in zip(rows[pairs].tolist(), earlier[pairs].tolist()):
+                if duplicate_of[i] < 0 and duplicate_of[j] < 0:
+                    duplicate_of[i] = base + j
+
+        # Index the new texts: every distinct normalized text, and the signatures of kept texts.
+        new_text = ~exact
+        self._exact.add(text_hashes[new_text],
+                        np.where(duplicate_of[new_text] >= 0, duplicate_of[new_text], positions[new_text]))
+        is_kept = duplicate_of < 0
+        kept = np.where(is_kept)[0]
+        slot_of = np.empty(n, dtype=np.int64)
+        slot_of[kept] = np.arange(self._num_kept, self._num_kept + len(kept))
+        self._reserve(self._num_kept + len(kept))
+        self._signatures[slot_of[kept]] = stored[kept]
+        self._row_ids[slot_of[kept]] = positions[kept]
+        for band, index in enumerate(self._band_index):
+            order = orders[band][is_kept[orders[band]]]
+            index.add(band_keys[order, band], slot_of[order], presorted=True)
+        self._num_kept += len(kept)
+
+        self.num_rows += n
+        self.num_exact += int(exact.sum())
+        self.num_near += int((duplicate_of >= 0).sum() - exact.sum())
+        return duplicate_of, exact
+
+    def _reserve(self, size):
+        if size > len(self._row_ids):
+            capacity = max(size, 2 * len(self._row_ids))
+            signatures = np.zeros((capacity, self.num_perm), dtype=self._sig_dtype)
+            signatures[:self._num_kept] = self._signatures[:self._num_kept]
+            row_ids = np.zeros(capacity, dtype=np.int64)
+            row_ids[:self._num_kept] = self._row_ids[:self._num_kept]
+            self._signatures, self._row_ids = signatures, row_ids
+
+    @property
+    def index_bytes(self):
+        """
+        int: The memory held by the index, in bytes.
+        """
+        return (self._exact.nbytes + sum(index.nbytes for index in self._band_index)
+                + self._signatures.nbytes + self._row_ids.nbytes)
+
+def dedup_rows(rows, columns=("Question",), batch_size=20000, deduplicator=None, **options):
+    """
+    Streams rows through a `Deduplicator`, a batch at a time.
+
+    Args:
+        rows (iterable): Dictionaries, e.g. from `csv.DictReader`.
+        columns (tuple, optional): The columns whose text is compared. Defaults to ("Question",).
+        batch_size (int, optional): The number of rows checked at a time. Defaults to 20000.
+        deduplicator (Deduplicator, optional): The index to use; a new one is created from
+            `options` if omitted.
+        **options: Keyword arguments for `Deduplicator`.
+
+    Yields:
+        tuple: (row, duplicate_of, kind) for every row, in order, where duplicate_of is the
+            stream position of the earlier row it duplicates (-1 if none) and kind is
+            "exact", "near" or "".
+    """
+    deduplicator = deduplicator or Deduplicator(**options)
+    batch = []
+
+    def flush():
+        duplicate_of, exact = deduplicator.add([" ".join(row[column] or "" for column in columns) for row in batch])
+        for row, original, is_exact in zip(batch, duplicate_of.tolist(), exact.tolist()):
+            yield row, original, "exact" if is_exact else "near" if original >= 0 else ""
+        batch.clear()
+
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield from flush()
+    if batch:
+        yield from flush()
+
+def dedup_csv(input_path, output_path, columns=("Question",), report_path=None, batch_size=20000, **options):
+    """
+    Writes the rows of a CSV without exact and near duplicates, keeping the first occurrence.
+
+    The input is read once and the output is written under a temporary name and renamed
+    when complete, so output_path may equal input_path.
+
+    Args:
+        input_path (str): The input CSV.
+        output_path (str): The deduplicated CSV.
+        columns (tuple, optional): The columns whose text is compared. Defaults to ("Question",).
+        report_path (str, optional): A CSV listing every dropped row ("Row", "DuplicateOf",
+            "Kind", plus the compared columns). Defaults to none.
+        batch_size (int, optional): The number of rows checked at a time. Defaults to 20000.
+        **options: Keyword arguments for `Deduplicator`.
+
+    Returns:
+        dict: The number of rows read ("rows"), kept ("kept"), and dropped as exact ("exact")
+            and near ("near") duplicates.
+    """
+    deduplicator = Deduplicator(**options)
+    tmp_path = output_path + ".tmp"
+    report = None
+    try:
+        with open(input_path, newline="", encoding="utf-8") as infile, \
+                open(tmp_path, "w", newline="", encoding="utf-8") as outfile:
+            reader = csv.DictReader(infile)
+            writer = csv.DictWriter(outfile, fieldnames=reader.fieldnames)
+            writer.writeheader()
+            if report_path:
+                report = open(report_path, "w", newline="", encoding="utf-8")
+                report_writer = csv.writer(report)
+                report_writer.writerow(["Row", "DuplicateOf", "Kind", *columns])
+            for position, (row, original, kind) in enumerate(
+                    dedup_rows(reader, columns, batch_size, deduplicator)):
+                if original < 0:
+                    writer.writerow(row)
+                elif report is not None:
+                    report_writer.writerow([position, original, kind, *(row[column] for column in columns)])
+        os.replace(tmp_path, output_path)
+    finally:
+        if report is not None:
+            report.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return {"rows": deduplicator.num_rows, "kept": deduplicator.num_rows - deduplicator.num_exact - deduplicator.num_near,
+            "exact": deduplicator.num_exact, "near": deduplicator.num_near}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove exact and near-duplicate rows from a CSV.")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--columns", nargs="+", default=["Question"])
+    parser.add_argument("--report", help="Write the dropped rows to this CSV.")
+    parser.add_argument("--threshold", type=float, default=0.6)
+    parser.add_argument("--shingle-size", type=int, default=2)
+    args = parser.parse_args()
+
+    stats = dedup_csv(args.input, args.output, tuple(args.columns), args.report,
+                      threshold=args.threshold, shingle_size=args.shingle_size)
+    print(f"{stats['rows']} rows: kept {stats['kept']}, dropped {stats['exact']} exact "
+          f"and {stats['near']} near duplicates.")
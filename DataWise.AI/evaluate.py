@@ -0,0 +1,236 @@
+import argparse
+import json
+import multiprocessing as mp
+import pickle
+import sys
+import time
+from itertools import islice
+import numpy as np
+
+from artifact import load_artifact
+from data_utils import iter_json_array, iter_ndjson
+from inference import exercise_text
+from tokenizer import Encoder
+
+# The model and arrays evaluated by forked pool workers; set before the pool is created
+# so the workers inherit them instead of receiving pickled copies.
+_shared = None
+
+def label_names(label2idx):
+    """
+    Lists the labels in class index order.
+
+    Args:
+        label2idx (dict): A dictionary mapping labels to indices.
+
+    Returns:
+        list: The label of each class index.
+    """
+    return [label for label, _ in sorted(label2idx.items(), key=lambda item: item[1])]
+
+def confusion_matrix(y_true, y_pred, num_classes):
+    """
+    Counts the (true label, predicted label) pairs of a batch.
+
+    Args:
+        y_true (np.ndarray): The integer true labels (shape: [num_samples]).
+        y_pred (np.ndarray): The integer predicted labels (shape: [num_samples]).
+        num_classes (int): The number of classes.
+
+    Returns:
+        np.ndarray: The confusion matrix, rows are true labels and columns predictions
+            (shape: [num_classes, num_classes]).
+    """
+    pairs = np.asarray(y_true, dtype=np.int64) * num_classes + np.asarray(y_pred, dtype=np.int64)
+    return np.bincount(pairs, minlength=num_classes * num_classes).reshape(num_classes, num_classes)
+
+def classification_report(confusion, labels):
+    """
+    Computes accuracy and per-class precision, recall and F1 from a confusion matrix.
+
+    Args:
+        confusion (np.ndarray): The confusion matrix (shape: [num_classes, num_classes]).
+        labels (list): The label of each class index.
+
+    Returns:
+        dict: A dictionary containing "num_samples", "accuracy", "macro_avg", "per_class"
+            and "confusion_matrix".
+    """
+    true_positives = np.diag(confusion).astype(float)
+    support = confusion.sum(axis=1)
+    predicted = confusion.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(predicted > 0, true_positives / predicted, 0.0)
+        recall = np.where(support > 0, true_positives / support, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+
+    num_samples = int(confusion.sum())
+    return {
+        "num_samples": num_samples,
+        "accuracy": float(true_positives.sum() / num_samples) if num_samples else 0.0,
+        "macro_avg": {
+            "precision": float(precision.mean()),
+            "recall": float(recall.mean()),
+            "f1": float(f1.mean()),
+        },
+        "per_class": {
+            label: {
+                "precision": float(precision[i]),
+                "recall": float(recall[i]),
+                "f1": float(f1[i]),
+                "support": int(support[i]),
+            }
+            for i, label in enumerate(labels)
+        },
+        "confusion_matrix": confusion.tolist(),
+    }
+
+def accumulate(predict_fn, batches, num_classes):
+    """
+    Runs a model over a stream of batches and accumulates the confusion matrix.
+
+    Only one batch is predicted at a time, so peak memory depends on the batch size and
+    not on the number of batches.
+
+    Args:
+        predict_fn (callable): A batched prediction function, e.g. `TextCNN.predict`.
+        batches (iterable): (X, y) pairs of encoded sentences and integer labels.
+        num_classes (int): The number of classes.
+
+    Returns:
+        np.ndarray: The confusion matrix (shape: [num_classes, num_classes]).
+    """
+    confusion = np.zeros((num_classes, num_classes), dtype=np.int64)
+    for X, y in batches:
+        confusion += confusion_matrix(y, np.argmax(predict_fn(X), axis=1), num_classes)
+    return confusion
+
+def _evaluate_range(bounds):
+    model, X, y, chunk_size = _shared
+    start, stop = bounds
+    batches = ((X[i:i + chunk_size], y[i:i + chunk_size]) for i in range(start, stop, chunk_size))
+    return accumulate(model.predict, batches, model.num_classes)
+
+def evaluate(model, X, y, labels, chunk_size=1024, num_workers=0):
+    """
+    Evaluates a model in fixed-size chunks and reports per-class metrics and throughput.
+
+    With num_workers > 0 the chunks are spread over a pool of forked processes that share
+    the model and the arrays (memory-mapped arrays from `dataset_cache.load_dataset` stay
+    on disk) and return partial confusion matrices that are summed.
+
+    Args:
+        model (TextCNN): The model to evaluate.
+        X (np.ndarray): The encoded sentences (shape: [num_samples, max_len]).
+        y (np.ndarray): The integer labels (shape: [num_samples]).
+        labels (list): The label of each class index.
+        chunk_size (int, optional): The number of samples per forward pass. Default is 1024.
+        num_workers (int, optional): The number of worker processes, 0 to evaluate in this process. Default is 0.
+
+    Returns:
+        dict: The `classification_report`, plus "seconds", "samples_per_sec", "chunk_size"
+            and "num_workers".
+    """
+    global _shared
+    start = time.perf_counter()
+    if num_workers > 0:
+        if "fork" not in mp.get_all_start_methods():
+            raise RuntimeError("Evaluating with num_workers > 0 requires the 'fork' start method.")
+        _shared = (model, X, y, chunk_size)
+        try:
+            bounds = [(i, min(i + chunk_size, len(X))) for i in range(0, len(X), chunk_size)]
+            with mp.get_context("fork").Pool(num_workers) as pool:
+                confusion = sum(pool.imap_unordered(_evaluate_range, bounds),
+                                np.zeros((len(labels), len(labels)), dtype=np.int64))
+        finally:
+            _shared = None
+    else:
+        batches = ((X[i:i + chunk_size], y[i:i + chunk_size]) for i in range(0, len(X), chunk_size))
+        confusion = accumulate(model.predict, batches, len(labels))
+    seconds = time.perf_counter() - start
+
+    report = classification_report(confusion, labels)
+    report["seconds"] = seconds
+    report["samples_per_sec"] = report["num_samples"] / seconds if seconds > 0 else 0.0
+    report["chunk_size"] = chunk_size
+    report["num_workers"] = num_workers
+    return report
+
+def labeled_batches(records, encoder, label2idx, chunk_size):
+    """
+    Encodes a stream of dataset records into (X, y) chunks.
+
+    Args:
+        records (iterable): Objects with an "Exercise" (or "exercise") and a "Label" field.
+        encoder (Encoder): The encoder for the model's vocabulary.
+        label2idx (dict): A dictionary mapping labels to indices.
+        chunk_size (int): The number of records per chunk.
+
+    Yields:
+        tuple: The encoded sentences and their integer labels.
+
+    Raises:
+        ValueError: If a record has no "Label" field or a label the model does not know.
+    """
+    records = iter(records)
+    position = 0
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        labels = np.empty(len(chunk), dtype=np.int64)
+        for i, record in enumerate(chunk):
+            label = record.get("Label") if isinstance(record, dict) else None
+            if not isinstance(label, str) or label not in label2idx:
+                raise ValueError(f"Record {position + i} has label {label!r}, which is not one of the "
+                                 f"model's labels ({', '.join(map(str, label2idx))}): {record!r}")
+            labels[i] = label2idx[label]
+        position += len(chunk)
+        yield encoder.encode_batch([exercise_text(record) or "" for record in chunk]), labels
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate a model on a labeled JSON or JSONL dataset.")
+    parser.add_argument("input", nargs="?", default="val_data.json",
+                        help="A {\"data\": [...]} dataset file, a JSON array or a .jsonl/.ndjson file.")
+    parser.add_argument("-o", "--output", help="Where to write the JSON report. Defaults to stdout.")
+    parser.add_argument("--model", default="models/cnn_model.bin",
+                        help="A model artifact (.bin) or a pickled model (.pkl).")
+    parser.add_argument("--word2idx", default="word2idx.json")
+    parser.add_argument("--label2idx", default="label2idx.json")
+    parser.add_argument("--max-len", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    if args.model.endswith(".pkl"):
+        with open(args.model, "rb") as f:
+            model = pickle.load(f)
+    else:
+        model = load_artifact(args.model)
+    encoder = Encoder.load(args.word2idx, args.max_len)
+    with open(args.label2idx, "r") as f:
+        label2idx = json.load(f)
+    labels = label_names(label2idx)
+
+    ndjson = args.input.endswith((".jsonl", ".ndjson"))
+    start = time.perf_counter()
+    with open(args.input, "r", encoding="utf-8") as infile:
+        records = iter_ndjson(infile) if ndjson else iter_json_array(infile)
+        confusion = accumulate(model.predict, labeled_batches(records, encoder, label2idx, args.chunk_size),
+                               len(labels))
+    seconds = time.perf_counter() - start
+
+    report = classification_report(confusion, labels)
+    report["seconds"] = seconds
+    report["samples_per_sec"] = report["num_samples"] / seconds if seconds > 0 else 0.0
+    report["chunk_size"] = args.chunk_size
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        json.dump(report, out, indent=2)
+        out.write("\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+if __name__ == "__main__":
+    main()
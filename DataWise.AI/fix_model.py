@@ -1,6 +1,7 @@
 import sys
 import pickle
 from model import TextCNN, load_model
+from artifact import export_model
 
 sys.modules['__main__'].TextCNN = TextCNN
 
@@ -10,3 +11,6 @@ with open("models/cnn_model_fixed.pkl", "wb") as f:
     pickle.dump(model, f)
 
 print("Model re‑saved to cnn_model_fixed.pkl")
+
+export_model(model, "models/cnn_model.bin")
+print("Model exported to cnn_model.bin")
@@ -1,17 +1,6 @@
-import csv
+from question_pipeline import default_steps, print_summary, run_pipeline
+from questions_generator import categories
 
-valid_difficulties = {"Easy", "Medium", "Hard", "Extremely Hard"}
-updated_rows = []
-
-with open("new_interview_questions.csv", "r", newline='', encoding="utf-8") as infile:
-    reader = csv.DictReader(infile)
-    fieldnames = reader.fieldnames
-    for row in reader:
-        if row["Difficulty"] not in valid_difficulties:
-            row["Difficulty"] = "Medium"
-        updated_rows.append(row)
-
-with open("interview_questions.csv", "w", newline='', encoding="utf-8") as outfile:
-    writer = csv.DictWriter(outfile, fieldnames=fieldnames)
-    writer.writeheader()
-    writer.writerows(updated_rows)
+# Kept for existing workflows; `python3 question_pipeline.py --dedup` does the same.
+stats = run_pipeline("new_interview_questions.csv", "interview_questions.csv", default_steps(categories), dedup=True)
+print_summary(stats)
@@ -0,0 +1,242 @@
+import os
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from itertools import islice
+import numpy as np
+
+# Batchers whose locks are replaced in forked children, since a lock held by another thread
+# at fork time would never be released there.
+_batchers = weakref.WeakSet()
+
+def _reset_after_fork():
+    for batcher in list(_batchers):
+        batcher._lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+class MicroBatcher:
+    """
+    Groups concurrent single-sample predictions into batched model calls.
+
+    Callers submit one encoded sentence at a time. A background worker takes the first
+    waiting request, keeps gathering requests until either `max_batch_size` are collected
+    or `max_wait_ms` has passed, runs one batched prediction and hands each row of the
+    result back to its caller.
+
+    The worker thread is started by the first submission in each process, so a batcher
+    created before a fork (e.g. by an app module preloaded by gunicorn) gets a fresh
+    queue and worker in every forked process instead of waiting on the parent's thread.
+
+    Attributes:
+        predict_fn (callable): Maps an input batch (shape: [batch_size, max_len]) to predictions.
+        max_batch_size (int): The maximum number of requests per batch.
+        max_wait_ms (float): The maximum time to wait for a batch to fill up, in milliseconds.
+    """
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=2.0):
+        """
+        Initializes the batcher. The worker thread starts on the first submission.
+
+        Args:
+            predict_fn (callable): A reentrant batched prediction function, e.g. `TextCNN.predict`.
+            max_batch_size (int, optional): The maximum number of requests per batch. Default is 32.
+            max_wait_ms (float, optional): The maximum time to wait for a batch to fill up. Default is 2.0.
+        """
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue = None
+        self._worker = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._closed = False
+        _batchers.add(self)
+
+    def _start(self):
+        # Called with the lock held; threads do not survive fork, so each process starts its own.
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, args=(self._queue,), name="micro-batcher", daemon=True)
+        self._worker.start()
+        self._pid = os.getpid()
+
+    def submit(self, x):
+        """
+        Queues one input for prediction.
+
+        Args:
+            x (np.ndarray): A single encoded sentence (shape: [max_len]).
+
+        Returns:
+            Future: A future that resolves to the prediction for x. Its `batch_started`
+                attribute is set to the `time.perf_counter()` at which its batch started
+                running, so callers can split their wait into queue and model time.
+        """
+        future = Future()
+        with self._lock:
+            if not self._closed:
+                if self._pid != os.getpid():
+                    self._start()
+                self._queue.put((x, future))
+                return future
+        # Closed batchers still answer late callers, one input at a time.
+        future.set_running_or_notify_cancel()
+        future.batch_started = time.perf_counter()
+        try:
+            future.set_result(self.predict_fn(np.expand_dims(x, axis=0))[0])
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def close(self):
+        """
+        Stops the worker thread once the inputs queued so far have been answered.
+
+        Inputs submitted after closing are predicted in the caller's thread, so a caller
+        holding on to a closed batcher still gets its answer.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._pid == os.getpid():
+                self._queue.put(None)
+
+    def predict(self, x, timeout=None):
+        """
+        Queues one input and waits for its prediction.
+
+        Args:
+            x (np.ndarray): A single encoded sentence (shape: [max_len]).
+            timeout (float, optional): The maximum time to wait, in seconds. Defaults to no limit.
+
+        Returns:
+            np.ndarray: The prediction for x.
+        """
+        return self.submit(x).result(timeout)
+
+    def pending(self):
+        """
+        Returns the number of inputs waiting to be gathered into a batch.
+
+        Returns:
+            int: The approximate queue length.
+        """
+        return self._queue.qsize() if self._pid == os.getpid() else 0
+
+    def _gather(self, inputs):
+        # Returns the gathered items and whether the close sentinel was reached.
+        item = inputs.get()
+        if item is None:
+            return [], True
+        items = [item]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+        while len(items) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = inputs.get(timeout=remaining) if remaining > 0 else inputs.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return items, True
+            items.append(item)
+        return items, False
+
+    def _run(self, inputs):
+        closed = False
+        while not closed:
+            items, closed = self._gather(inputs)
+            items = [(x, future) for x, future in items if future.set_running_or_notify_cancel()]
+            if not items:
+                continue
+            started = time.perf_counter()
+            for _, future in items:
+                future.batch_started = started
+            try:
+                preds = self.predict_fn(np.stack([x for x, _ in items]))
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+            for (_, future), pred in zip(items, preds):
+                future.set_result(pred)
+
+def exercise_text(record):
+    """
+    Extracts the exercise text from an input record.
+
+    Args:
+        record (object): A string, or an object with an "exercise" (or dataset-style "Exercise") field.
+
+    Returns:
+        str: The exercise text, or None if the record has none.
+    """
+    if isinstance(record, str):
+        return record
+    if isinstance(record, dict):
+        text = record.get("exercise", record.get("Exercise"))
+        if isinstance(text, str):
+            return text
+    return None
+
+def top_k_probabilities(probs, idx2label, k):
+    """
+    Lists the k most probable labels of one prediction.
+
+    Args:
+        probs (np.ndarray): The class probabilities (shape: [num_classes]).
+        idx2label (dict): A dictionary mapping class indices to labels.
+        k (int): The number of labels to return.
+
+    Returns:
+        list: Up to k {"label", "probability"} dictionaries, most probable first.
+    """
+    k = min(k, len(probs))
+    top = np.argpartition(probs, len(probs) - k)[len(probs) - k:]
+    top = top[np.argsort(probs[top])[::-1]]
+    return [{"label": idx2label.get(int(i), "Unknown"), "probability": float(probs[i])} for i in top]
+
+def classify_records(records, predict_fn, encoder, idx2label, chunk_size=256, top_k=None):
+    """
+    Classifies a stream of records in fixed-size chunks.
+
+    Only one chunk of records is held in memory at a time, so arbitrarily long streams can
+    be classified with flat memory usage.
+
+    Args:
+        records (iterable): Strings or objects with an "exercise" field.
+        predict_fn (callable): A batched prediction function, e.g. `TextCNN.predict`.
+        encoder (Encoder): The encoder for the model's vocabulary.
+        idx2label (dict): A dictionary mapping class indices to labels.
+        chunk_size (int, optional): The number of records per forward pass. Default is 256.
+        top_k (int, optional): Return only the k most probable labels under "top_k" instead
+            of the full "probabilities" vector. Defaults to the full vector.
+
+    Yields:
+        dict: For each record, in order, its fields plus "prediction" and "probabilities"
+            (or "top_k"), or an "error" entry if the record has no exercise text.
+    """
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        texts = [exercise_text(record) for record in chunk]
+        valid = [i for i, text in enumerate(texts) if text is not None]
+        probs = predict_fn(encoder.encode_batch([texts[i] for i in valid])) if valid else None
+        results = dict(zip(valid, range(len(valid))))
+
+        for i, record in enumerate(chunk):
+            if i not in results:
+                yield {"error": 'Missing "exercise" field.', "record": record}
+                continue
+            row = probs[results[i]]
+            result = dict(record) if isinstance(record, dict) else {"exercise": record}
+            result["prediction"] = idx2label.get(int(np.argmax(row)), "Unknown")
+            if top_k is None:
+                result["probabilities"] = row.tolist()
+            else:
+                result["top_k"] = top_k_probabilities(row, idx2label, top_k)
+            yield result
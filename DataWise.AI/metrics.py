@@ -0,0 +1,271 @@
+import bisect
+import threading
+from collections import deque
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, fine-grained below a millisecond where the per-stage
+# timings of a single prediction fall.
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Measurements are appended to a deque, which is atomic, instead of taking a lock, and
+# are folded into the totals when a metric is rendered or this many are pending.
+FOLD_EVERY = 1024
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Registry:
+    """
+    Holds metrics and renders them in the Prometheus text exposition format.
+
+    Attributes:
+        metrics (list): The registered metrics, in registration order.
+    """
+    def __init__(self):
+        """
+        Initializes an empty registry.
+        """
+        self.metrics = []
+
+    def register(self, metric):
+        """
+        Adds a metric to the registry.
+
+        Args:
+            metric (Metric): The metric.
+
+        Returns:
+            Metric: The metric, for chaining.
+        """
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Renders every metric.
+
+        Returns:
+            str: The metrics in the Prometheus text format.
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+class Metric:
+    """
+    Base class of labelled metrics.
+
+    Each distinct combination of label values gets its own child, created on first use.
+    Hot paths should resolve their children once with `labels` and keep them, so a
+    measurement costs one lock-free append.
+
+    Attributes:
+        name (str): The metric name.
+        documentation (str): The help text.
+        labelnames (tuple): The label names.
+    """
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        """
+        Initializes the metric and registers it.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The help text.
+            labelnames (tuple, optional): The label names. Defaults to no labels.
+            registry (Registry, optional): The registry to add the metric to.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values):
+        """
+        Returns the child for the given label values.
+
+        Args:
+            *values: One value per label name.
+
+        Returns:
+            object: The child measurement.
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}.")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self):
+        """
+        Renders the samples of every child.
+
+        Returns:
+            list: Lines in the Prometheus text format.
+        """
+        lines = []
+        for values, child in list(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+class _Value:
+    def __init__(self):
+        self._value = 0
+        self.function = None
+        self._pending = deque()
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        self._pending.append(amount)
+        if len(self._pending) >= FOLD_EVERY:
+            self._fold()
+
+    def dec(self, amount=1):
+        self._pending.append(-amount)
+        if len(self._pending) >= FOLD_EVERY:
+            self._fold()
+
+    def _fold(self):
+        with self._lock:
+            pending, total = self._pending, 0
+            while pending:
+                total += pending.popleft()
+            self._value += total
+
+    @property
+    def value(self):
+        self._fold()
+        return self._value
+
+    def set(self, value):
+        with self._lock:
+            self._pending.clear()
+            self._value = value
+
+    def set_function(self, function):
+        self.function = function
+
+    def render(self, name, labelnames, values):
+        value = self.function() if self.function is not None else self.value
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(value)}"]
+
+class Counter(Metric):
+    """
+    A monotonically increasing count. Children have `inc(amount=1)`.
+    """
+    type = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+class Gauge(Metric):
+    """
+    A value that goes up and down. Children have `inc`, `dec`, `set` and `set_function`,
+    which makes the gauge read its value from a callable when it is rendered.
+    """
+    type = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+class _Buckets:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._pending = deque()
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        self._pending.append(value)
+        if len(self._pending) >= FOLD_EVERY:
+            self._fold()
+
+    def _fold(self):
+        with self._lock:
+            pending, bounds, counts = self._pending, self.bounds, self.counts
+            while pending:
+                value = pending.popleft()
+                counts[bisect.bisect_left(bounds, value)] += 1
+                self.sum += value
+
+    def render(self, name, labelnames, values):
+        self._fold()
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        lines, cumulative = [], 0
+        for bound, count in zip(self.bounds + (float("inf"),), counts):
+            cumulative += count
+            le = (("le", _format_value(bound)),)
+            lines.append(f"{name}_bucket{_format_labels(labelnames, values, le)} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {cumulative}")
+        return lines
+
+class Histogram(Metric):
+    """
+    Counts observations into cumulative buckets. Children have `observe(value)`.
+
+    Attributes:
+        buckets (tuple): The upper bounds of the buckets, in increasing order.
+    """
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, buckets=DEFAULT_BUCKETS):
+        """
+        Initializes the histogram and registers it.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The help text.
+            labelnames (tuple, optional): The label names. Defaults to no labels.
+            registry (Registry, optional): The registry to add the metric to.
+            buckets (tuple, optional): The bucket upper bounds. Defaults to DEFAULT_BUCKETS.
+        """
+        self.buckets = tuple(float(bound) for bound in buckets)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _Buckets(self.buckets)
+
+# Server-Timing format strings, by tuple of stage names.
+_timing_formats = {}
+
+def server_timing(durations):
+    """
+    Formats stage durations as a Server-Timing header value.
+
+    Args:
+        durations (dict): Seconds spent in each stage, by name.
+
+    Returns:
+        str: The header value, with durations in milliseconds.
+    """
+    names = tuple(durations)
+    fmt = _timing_formats.get(names)
+    if fmt is None:
+        fmt = _timing_formats.setdefault(names, ", ".join(f"{name};dur=%.3f" for name in names))
+    return fmt % tuple([seconds * 1000 for seconds in durations.values()])
@@ -1,5 +1,25 @@
+from contextlib import contextmanager
 import numpy as np
-from activations import relu, d_relu, softmax, cross_entropy_loss
+from activations import d_relu, softmax, log_softmax, nll_loss, cross_entropy_loss
+from conv import conv1d, conv1d_backward
+from sparse import segment_sum
+from optimizers import SGD
+from quantize import QuantizedArray, PRECISIONS
+from profiling import Profiler, stage
+
+def sequence_lengths(X):
+    """
+    Computes the real length of each encoded sentence, i.e. up to its last non-padding token.
+
+    Args:
+        X (np.ndarray): The encoded sentences (shape: [num_samples, max_len]).
+
+    Returns:
+        np.ndarray: The length of each sentence (shape: [num_samples]).
+    """
+    nonzero = X != 0
+    last = X.shape[1] - np.argmax(nonzero[:, ::-1], axis=1)
+    return np.where(nonzero.any(axis=1), last, 0)
 
 class TextCNN:
     """
@@ -17,13 +37,16 @@ class TextCNN:
         filter_sizes (list): List of filter sizes for the convolutional layers.
         num_classes (int): Number of output classes.
         lr (float): Learning rate for the optimizer.
+        optimizer (Optimizer): The optimizer that applies parameter updates.
         embeddings (np.ndarray): Word embeddings matrix.
         conv_filters (dict): Convolutional filters for each filter size.
         fc_weights (np.ndarray): Weights for the fully connected layer.
         fc_bias (np.ndarray): Bias for the fully connected layer.
         fc_input_dim (int): Input dimension of the fully connected layer.
+        precision (str): The numeric precision of the parameters: "float64", "float32" or "int8".
+        profiler (Profiler): The profiler recording per-stage time and memory, or None (see `profile`).
     """
-    def __init__(self, vocab_size, embedding_dim, max_len, num_filters, filter_sizes, num_classes, learning_rate=0.01):
+    def __init__(self, vocab_size, embedding_dim, max_len, num_filters, filter_sizes, num_classes, learning_rate=0.01, optimizer=None):
         """
         Initializes the TextCNN model with the provided hyperparameters.
 
@@ -35,6 +58,7 @@ class TextCNN:
             filter_sizes (list): List of filter sizes for convolutional layers.
             num_classes (int): Number of output classes.
             learning_rate (float, optional): The learning rate for the optimizer. Default is 0.01.
+            optimizer (Optimizer, optional): The optimizer to use. Defaults to SGD with learning_rate.
         """
         self.vocab_size = vocab_size
         self.embedding_dim = embedding_dim
@@ -43,6 +67,7 @@ class TextCNN:
         self.filter_sizes = filter_sizes
         self.num_classes = num_classes
         self.lr = learning_rate
+        self.optimizer = optimizer if optimizer is not None else SGD(learning_rate)
 
         self.embeddings = np.random.randn(vocab_size, embedding_dim) * 0.01
 
@@ -53,110 +78,365 @@ class TextCNN:
         self.fc_input_dim = num_filters * len(filter_sizes)
         self.fc_weights = np.random.randn(self.fc_input_dim, num_classes) * np.sqrt(1.0 / self.fc_input_dim)
         self.fc_bias = np.zeros((1, num_classes))
+        self.precision = "float64"
+        self.profiler = None
+
+    @classmethod
+    def from_arrays(cls, config, arrays):
+        """
+        Builds a model around existing parameter arrays without random initialization.
+
+        The arrays are used as given (no copy), so read-only or memory-mapped arrays
+        produce a model that can run inference but not be trained.
 
-    def forward(self, X):
+        Args:
+            config (dict): The constructor arguments (vocab_size, embedding_dim, max_len,
+                num_filters, filter_sizes, num_classes and optionally learning_rate).
+            arrays (dict): The parameters: "embeddings", "fc_weights", "fc_bias" and
+                "conv_filters.<fs>" for each filter size.
+
+        Returns:
+            TextCNN: The model.
+        """
+        model = cls.__new__(cls)
+        model.vocab_size = config["vocab_size"]
+        model.embedding_dim = config["embedding_dim"]
+        model.max_len = config["max_len"]
+        model.num_filters = config["num_filters"]
+        model.filter_sizes = list(config["filter_sizes"])
+        model.num_classes = config["num_classes"]
+        model.lr = config.get("learning_rate", 0.01)
+        model.optimizer = SGD(model.lr)
+
+        model.embeddings = arrays["embeddings"]
+        model.conv_filters = {fs: arrays[f"conv_filters.{fs}"] for fs in model.filter_sizes}
+        model.fc_input_dim = model.num_filters * len(model.filter_sizes)
+        model.fc_weights = arrays["fc_weights"]
+        model.fc_bias = arrays["fc_bias"]
+        model.precision = "int8" if isinstance(model.embeddings, QuantizedArray) else model.embeddings.dtype.name
+        model.profiler = None
+        return model
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if "optimizer" not in state:
+            self.optimizer = SGD(self.lr)
+        if "precision" not in state:
+            self.precision = "float64"
+        if "profiler" not in state:
+            self.profiler = None
+
+    @contextmanager
+    def profile(self, trace_memory=True):
+        """
+        Records per-stage wall time and allocated bytes of every call made inside the block.
+
+        The stages are "embed", "conv.<fs>", "pool.<fs>", "fc" and "softmax" for the forward
+        pass and `predict`, "loss" for `compute_loss`, "backward.fc", "backward.conv.<fs>"
+        and "backward.embeddings" for `compute_gradients` (which re-gathers its embeddings
+        under "embed"), and "update.<parameter>" for `apply_gradients`. Example:
+
+            with model.profile() as profiler:
+                model.train_on_batch(X, y)
+            print(profiler.report())
+
+        Args:
+            trace_memory (bool, optional): Whether to record allocated bytes with tracemalloc. Default is True.
+
+        Yields:
+            Profiler: The profiler holding the recorded stages.
+        """
+        previous = self.profiler
+        profiler = Profiler(trace_memory)
+        self.profiler = profiler
+        try:
+            with profiler:
+                yield profiler
+        finally:
+            self.profiler = previous
+
+    def set_precision(self, precision):
+        """
+        Converts the parameters to another numeric precision for inference.
+
+        "float32" halves memory and bandwidth compared to the default "float64". "int8" stores
+        embeddings (per row), convolutional filters (per filter) and fully connected weights
+        (per class) as int8 with float32 scales and dequantizes them on the fly in float32.
+        Quantized models can run `forward` and `predict` but cannot be trained.
+
+        Args:
+            precision (str): One of "float64", "float32" or "int8".
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}'. Expected one of: {', '.join(PRECISIONS)}.")
+
+        def to_float(array, dtype):
+            if isinstance(array, QuantizedArray):
+                return array.dequantize(dtype)
+            return array.astype(dtype)
+
+        if precision == "int8":
+            def convert(array, axis):
+                if isinstance(array, QuantizedArray):
+                    return array
+                return QuantizedArray.from_float(array, axis)
+            self.embeddings = convert(self.embeddings, 0)
+            self.conv_filters = {fs: convert(w, -1) for fs, w in self.conv_filters.items()}
+            self.fc_weights = convert(self.fc_weights, -1)
+            self.fc_bias = to_float(self.fc_bias, np.float32)
+        else:
+            dtype = np.dtype(precision)
+            self.embeddings = to_float(self.embeddings, dtype)
+            self.conv_filters = {fs: to_float(w, dtype) for fs, w in self.conv_filters.items()}
+            self.fc_weights = to_float(self.fc_weights, dtype)
+            self.fc_bias = to_float(self.fc_bias, dtype)
+        self.precision = precision
+
+    def _embed(self, X):
+        if isinstance(self.embeddings, QuantizedArray):
+            return self.embeddings.take_rows(X)
+        return self.embeddings[X]
+
+    def _conv(self, embedded, fs):
+        weight = self.conv_filters[fs]
+        if isinstance(weight, QuantizedArray):
+            return conv1d(embedded, weight.values.astype(embedded.dtype)) * weight.scale
+        return conv1d(embedded, weight)
+
+    def _trim(self, X):
+        # Every window that starts after a sentence's last token covers only padding, so all
+        # of them have the value of the first one. Keeping the longest sentence plus the
+        # widest filter leaves that first all-padding window in every row that has one, and
+        # the max-pool (value and position) matches the full padded width.
+        span = int(sequence_lengths(X).max(initial=0)) + max(self.filter_sizes)
+        return X[:, :min(span, X.shape[1])]
+
+    def _pool_input(self, embedded, fs):
+        conv_out = self._conv(embedded, fs)
+        np.maximum(conv_out, 0, out=conv_out)
+        return conv_out
+
+    def _logits(self, fc_input):
+        if isinstance(self.fc_weights, QuantizedArray):
+            return np.dot(fc_input, self.fc_weights.values.astype(fc_input.dtype)) * self.fc_weights.scale + self.fc_bias
+        return np.dot(fc_input, self.fc_weights) + self.fc_bias
+
+    def forward(self, X, training=True):
         """
         Performs the forward pass through the network.
 
+        The batch is only convolved up to its longest sentence plus the widest filter. The
+        windows cut off cover only padding and repeat the value of an all-padding window
+        that is kept, so the result and the gradients are the same as for the fully padded batch.
+
+        In training mode only what `compute_gradients` needs is kept: the token ids, the
+        position of the maximum of every (sample, filter) pair and the pooled values. The
+        convolution outputs are discarded as soon as they are pooled. With training=False
+        nothing is stored at all (see `predict`).
+
         Args:
             X (np.ndarray): The input batch of text sequences (shape: [batch_size, max_len]).
+            training (bool, optional): Whether to keep the state needed for the backward pass. Default is True.
 
         Returns:
             np.ndarray: The probabilities for each class (shape: [batch_size, num_classes]).
         """
+        if not training:
+            return self.predict(X)
+
+        profiler = self.profiler
         self.batch_size = X.shape[0]
-        self.embedded = self.embeddings[X]
-        self.conv_outputs = {} 
+        with stage(profiler, "embed"):
+            self.inputs = self._trim(X)
+            embedded = self._embed(self.inputs)
+        self.max_positions = {}
         self.pooled_outputs = []
 
         for fs in self.filter_sizes:
-            filter_w = self.conv_filters[fs]
-            conv_out = []
-
-            for i in range(self.max_len - fs + 1):
-                window = self.embedded[:, i:i+fs, :]  
-                conv_result = np.tensordot(window, filter_w, axes=([1,2],[0,1]))
-                conv_out.append(conv_result)
-            conv_out = np.stack(conv_out, axis=1) 
-            conv_out = relu(conv_out)
-            self.conv_outputs[fs] = conv_out
-
-            pooled = np.max(conv_out, axis=1)  
+            with stage(profiler, f"conv.{fs}"):
+                conv_out = self._pool_input(embedded, fs)
+            with stage(profiler, f"pool.{fs}"):
+                self.max_positions[fs] = np.argmax(conv_out, axis=1)
+                pooled = np.take_along_axis(conv_out, self.max_positions[fs][:, None, :], axis=1)[:, 0, :]
             self.pooled_outputs.append(pooled)
 
+        with stage(profiler, "fc"):
+            self.fc_input = np.concatenate(self.pooled_outputs, axis=1)
+            self.logits = self._logits(self.fc_input)
+        with stage(profiler, "softmax"):
+            self.probs = softmax(self.logits)
+        return self.probs
 
-        self.fc_input = np.concatenate(self.pooled_outputs, axis=1)  
+    def features(self, X):
+        """
+        Computes the pooled feature vectors that feed the fully connected layer.
 
-        logits = np.dot(self.fc_input, self.fc_weights) + self.fc_bias  
-        self.probs = softmax(logits)
-        return self.probs
+        Like `predict`, this method only reads the parameters.
 
-    def backward(self, X, y_onehot):
+        Args:
+            X (np.ndarray): The input batch of text sequences (shape: [batch_size, max_len]).
+
+        Returns:
+            np.ndarray: The concatenated max-pooled convolution outputs (shape: [batch_size, fc_input_dim]).
+        """
+        profiler = self.profiler
+        with stage(profiler, "embed"):
+            X = self._trim(X)
+            embedded = self._embed(X)
+        pooled_outputs = []
+        for fs in self.filter_sizes:
+            with stage(profiler, f"conv.{fs}"):
+                conv_out = self._pool_input(embedded, fs)
+            with stage(profiler, f"pool.{fs}"):
+                pooled_outputs.append(np.max(conv_out, axis=1))
+        return np.concatenate(pooled_outputs, axis=1)
+
+    def predict(self, X):
+        """
+        Computes class probabilities without storing any activations on the model.
+
+        Unlike `forward`, this method only reads the parameters, so it is reentrant and
+        can be called from several threads at once.
+
+        Args:
+            X (np.ndarray): The input batch of text sequences (shape: [batch_size, max_len]).
+
+        Returns:
+            np.ndarray: The probabilities for each class (shape: [batch_size, num_classes]).
+        """
+        fc_input = self.features(X)
+        with stage(self.profiler, "fc"):
+            logits = self._logits(fc_input)
+        with stage(self.profiler, "softmax"):
+            return softmax(logits)
+
+    def backward(self, X, y):
         """
         Performs the backward pass to compute gradients and update model parameters.
 
         Args:
             X (np.ndarray): The input batch of text sequences (shape: [batch_size, max_len]).
-            y_onehot (np.ndarray): One-hot encoded labels (shape: [batch_size, num_classes]).
+            y (np.ndarray): Integer labels (shape: [batch_size]) or one-hot encoded labels
+                (shape: [batch_size, num_classes]).
+        """
+        self.apply_gradients(self.compute_gradients(X, y))
+
+    def compute_gradients(self, X, y):
+        """
+        Computes the gradients of the loss for the last forward pass without updating any parameters.
+
+        Args:
+            X (np.ndarray): The input batch of text sequences (shape: [batch_size, max_len]).
+            y (np.ndarray): Integer labels (shape: [batch_size]) or one-hot encoded labels
+                (shape: [batch_size, num_classes]).
+
+        Returns:
+            dict: A dictionary containing:
+                - "embeddings": A (word_ids, rows) tuple with the gradient of each distinct word in X.
+                - "conv_filters": A dictionary mapping each filter size to its gradient.
+                - "fc_weights": The gradient of the fully connected weights.
+                - "fc_bias": The gradient of the fully connected bias.
         """
-        d_logits = (self.probs - y_onehot) / self.batch_size 
-        dW_fc = np.dot(self.fc_input.T, d_logits)  
-        db_fc = np.sum(d_logits, axis=0, keepdims=True)
-        d_fc_input = np.dot(d_logits, self.fc_weights.T)  
+        if self.precision == "int8":
+            raise ValueError("A quantized (int8) model cannot be trained.")
+        profiler = self.profiler
+        with stage(profiler, "backward.fc"):
+            if y.ndim == 1:
+                d_logits = self.probs.copy()
+                d_logits[np.arange(self.batch_size), y] -= 1
+                d_logits /= self.batch_size
+            else:
+                d_logits = (self.probs - y) / self.batch_size
+            dW_fc = np.dot(self.fc_input.T, d_logits)
+            db_fc = np.sum(d_logits, axis=0, keepdims=True)
+            d_fc_input = np.dot(d_logits, self.fc_weights.T)
 
         d_pooled_splits = np.split(d_fc_input, len(self.filter_sizes), axis=1)
 
-        d_embeddings = np.zeros_like(self.embedded)
-        d_filter_sum = {} 
+        with stage(profiler, "embed"):
+            embedded = self._embed(self.inputs)
+        d_embeddings = None
+        d_filters = {}
 
         for idx, fs in enumerate(self.filter_sizes):
-            conv_out = self.conv_outputs[fs] 
-            d_pool = d_pooled_splits[idx] 
-            d_conv = np.zeros_like(conv_out)
+            with stage(profiler, f"backward.conv.{fs}"):
+                # Only the maximum of each (sample, filter) receives a gradient, and only if it
+                # passed the ReLU, so the sparse d_conv is rebuilt from the recorded positions.
+                d_pooled = d_pooled_splits[idx] * d_relu(self.pooled_outputs[idx])
+                d_conv = np.zeros((self.batch_size, self.inputs.shape[1] - fs + 1, self.num_filters), dtype=d_pooled.dtype)
+                np.put_along_axis(d_conv, self.max_positions[fs][:, None, :], d_pooled[:, None, :], axis=1)
+
+                d_embedded, d_filters[fs] = conv1d_backward(embedded, self.conv_filters[fs], d_conv)
+                if d_embeddings is None:
+                    d_embeddings = d_embedded
+                else:
+                    d_embeddings += d_embedded
+
+        with stage(profiler, "backward.embeddings"):
+            d_rows = segment_sum(self.inputs, d_embeddings)
+
+        return {
+            "embeddings": d_rows,
+            "conv_filters": d_filters,
+            "fc_weights": dW_fc,
+            "fc_bias": db_fc,
+        }
+
+    def apply_gradients(self, grads):
+        """
+        Updates the model parameters in place with the optimizer.
 
-            for b in range(self.batch_size):
-                for f in range(self.num_filters):
-                    max_index = np.argmax(conv_out[b, :, f])
-                    d_conv[b, max_index, f] = d_pool[b, f]
+        Args:
+            grads (dict): Gradients in the format returned by `compute_gradients`.
+        """
+        profiler = self.profiler
+        for fs in self.filter_sizes:
+            with stage(profiler, f"update.conv_filters.{fs}"):
+                self.optimizer.update(f"conv_filters.{fs}", self.conv_filters[fs], grads["conv_filters"][fs])
 
-            d_conv *= d_relu(conv_out)
+        word_ids, d_rows = grads["embeddings"]
+        with stage(profiler, "update.embeddings"):
+            self.optimizer.update_rows("embeddings", self.embeddings, word_ids, d_rows)
 
-            for i in range(self.max_len - fs + 1):
-                window = self.embedded[:, i:i+fs, :]
-                d_conv_slice = d_conv[:, i, :] 
+        with stage(profiler, "update.fc_weights"):
+            self.optimizer.update("fc_weights", self.fc_weights, grads["fc_weights"])
+        with stage(profiler, "update.fc_bias"):
+            self.optimizer.update("fc_bias", self.fc_bias, grads["fc_bias"])
 
-                d_filter = np.tensordot(window, d_conv_slice, axes=([0],[0]))
-                d_filter_sum.setdefault(fs, 0)
-                d_filter_sum[fs] += d_filter
+    def compute_loss(self, X, y):
+        """
+        Runs the forward pass and returns the loss of the batch.
 
-                for b in range(self.batch_size):
-                    d_embeddings[b, i:i+fs, :] += np.tensordot(d_conv_slice[b, :], self.conv_filters[fs], axes=([0], [2]))
-        
-        for fs in self.filter_sizes:
-            self.conv_filters[fs] -= self.lr * d_filter_sum[fs]
+        Integer labels take a fused log-softmax/NLL path, so no one-hot array is allocated.
 
-        for b in range(self.batch_size):
-            for i in range(self.max_len):
-                word_idx = X[b, i]
-                self.embeddings[word_idx] -= self.lr * d_embeddings[b, i, :]
+        Args:
+            X (np.ndarray): The input batch of text sequences (shape: [batch_size, max_len]).
+            y (np.ndarray): Integer labels (shape: [batch_size]) or one-hot encoded labels
+                (shape: [batch_size, num_classes]).
 
-        self.fc_weights -= self.lr * dW_fc
-        self.fc_bias -= self.lr * db_fc
+        Returns:
+            float: The loss computed for the batch.
+        """
+        preds = self.forward(X)
+        with stage(self.profiler, "loss"):
+            if y.ndim == 1:
+                return nll_loss(log_softmax(self.logits), y)
+            return cross_entropy_loss(preds, y)
 
-    def train_on_batch(self, X, y_onehot):
+    def train_on_batch(self, X, y):
         """
         Trains the model on a single batch of data.
 
         Args:
             X (np.ndarray): The input batch of text sequences (shape: [batch_size, max_len]).
-            y_onehot (np.ndarray): One-hot encoded labels (shape: [batch_size, num_classes]).
+            y (np.ndarray): Integer labels (shape: [batch_size]) or one-hot encoded labels
+                (shape: [batch_size, num_classes]).
 
         Returns:
             float: The loss computed for the batch.
         """
-        preds = self.forward(X)
-        loss = cross_entropy_loss(preds, y_onehot)
-        self.backward(X, y_onehot)
+        loss = self.compute_loss(X, y)
+        self.backward(X, y)
         return loss
 
 def save_model(model, filename="models/cnn_model.npy"):
@@ -0,0 +1,635 @@
+import argparse
+import json
+import os
+import pickle
+import re
+import shutil
+import threading
+import time
+import numpy as np
+
+from artifact import load_artifact
+from cascade import Cascade, load_fast_head
+from dataset_cache import file_digest
+from inference import MicroBatcher
+from similarity import SimilarityIndex, query_vectors
+from tokenizer import Encoder
+
+# The files of a model version, in the registry's version directories and in the legacy
+# layout (model files under models/, vocabulary and labels in the working directory).
+MODEL_FILES = ("cnn_model.bin", "cnn_model_fixed.pkl")
+VOCAB_FILE = "word2idx.json"
+LABELS_FILE = "label2idx.json"
+FAST_HEAD_FILE = "fast_head.npz"
+SIMILAR_DIR = "similar"
+WARMUP_FILE = "warmup.json"
+PIN_FILE = "CURRENT"
+
+# Sent through a newly loaded model before it is activated when its version has no warmup.json.
+WARMUP_TEXTS = (
+    "Given a graph, identify all the nodes that can be reached from a given node.",
+    "Find the minimum number of coins needed to make a target amount.",
+    "Search for a target value in a sorted array in logarithmic time.",
+    "Place N queens on a chessboard so that no two queens attack each other.",
+)
+
+class ModelBundle:
+    """
+    Everything that changes together when the served model changes.
+
+    Bundles are not modified once they are activated. Request handlers read the
+    registry's active bundle once and use it for the whole request, so a swap in the
+    middle of a request never mixes one model's predictions with another's labels.
+
+    Attributes:
+        name (str): The version name, e.g. the registry directory name.
+        model_version (str): The name plus the cascade settings; part of result cache keys.
+        digest (str): The first 12 hex digits of the model file's SHA-256 digest.
+        path (str): The model file.
+        model (TextCNN): The model.
+        encoder (Encoder): The encoder for the model's vocabulary.
+        label2idx (dict): A dictionary mapping labels to class indices.
+        idx2label (dict): A dictionary mapping class indices to labels.
+        predict_fn (callable): The batched prediction function.
+        cascade (Cascade): The cascade behind predict_fn, or None.
+        batcher (MicroBatcher): The micro-batcher for predict_fn, or None.
+        similarity_index (SimilarityIndex): The index for /similar, or None.
+        loaded_at (float): The `time.time()` at which loading finished.
+        warmup_seconds (float): The time taken by the warm-up forwards.
+    """
+    def __init__(self, name, model_version, digest, path, model, encoder, label2idx, predict_fn,
+                 cascade=None, batcher=None, similarity_index=None):
+        self.name = name
+        self.model_version = model_version
+        self.digest = digest
+        self.path = path
+        self.model = model
+        self.encoder = encoder
+        self.label2idx = label2idx
+        self.idx2label = {v: k for k, v in label2idx.items()}
+        self.predict_fn = predict_fn
+        self.cascade = cascade
+        self.batcher = batcher
+        self.similarity_index = similarity_index
+        self.loaded_at = time.time()
+        self.warmup_seconds = 0.0
+
+    def close(self):
+        """
+        Stops the bundle's micro-batcher. Requests still holding the bundle keep working.
+        """
+        if self.batcher is not None:
+            self.batcher.close()
+
+    def describe(self):
+        """
+        Returns the JSON-serializable summary reported by the status endpoint.
+        """
+        return {
+            "version": self.name,
+            "model_version": self.model_version,
+            "digest": self.digest,
+            "path": self.path,
+            "precision": getattr(self.model, "precision", "float32"),
+            "labels": len(self.label2idx),
+            "vocab_size": len(self.encoder.word2idx),
+            "cascade": self.cascade is not None,
+            "similarity_index": self.similarity_index is not None,
+            "loaded_at": self.loaded_at,
+            "warmup_seconds": round(self.warmup_seconds, 4),
+        }
+
+def find_model(directory):
+    """
+    Returns the model file of a version directory, preferring the memory-mapped artifact.
+
+    Args:
+        directory (str): The version directory.
+
+    Returns:
+        str: The model path, or None if the directory has no model file.
+    """
+    for filename in MODEL_FILES:
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            return path
+    return None
+
+def _artifact_path(directory, filename, fallback_directory):
+    path = os.path.join(directory, filename)
+    if os.path.exists(path) or fallback_directory is None:
+        return path
+    return os.path.join(fallback_directory, filename)
+
+def warm_up(bundle, texts=WARMUP_TEXTS):
+    """
+    Runs warm-up forwards through a bundle and checks that its parts fit together.
+
+    One single sentence and one full micro-batch go through the prediction function
+    (and the micro-batcher, if any), so the first requests after a swap do not pay for
+    page faults on the memory-mapped parameters or for the encoder's first lookups.
+
+    Args:
+        bundle (ModelBundle): The bundle to warm up.
+        texts (sequence, optional): The sample exercises. Defaults to WARMUP_TEXTS.
+
+    Raises:
+        ValueError: If the predictions have the wrong shape for the label map or are not finite.
+    """
+    start = time.perf_counter()
+    X = bundle.encoder.encode_batch(list(texts))
+    batch_size = bundle.batcher.max_batch_size if bundle.batcher is not None else 32
+    for rows in (X[:1], np.resize(X, (batch_size, X.shape[1]))):
+        probs = bundle.predict_fn(rows)
+        if probs.shape != (len(rows), len(bundle.label2idx)):
+            raise ValueError(f"The model predicts {probs.shape[-1]} classes but the label map has "
+                             f"{len(bundle.label2idx)}.")
+        if not np.isfinite(probs).all():
+            raise ValueError("The model's warm-up predictions are not finite.")
+    bundle.encoder.encode(texts[0])
+    if bundle.batcher is not None:
+        bundle.batcher.predict(X[0], timeout=30)
+    if bundle.similarity_index is not None:
+        bundle.similarity_index.search(query_vectors(bundle.model, bundle.encoder, list(texts[:1])), 1)
+    bundle.warmup_seconds = time.perf_counter() - start
+
+def load_bundle(directory, name=None, fallback_directory=None, max_len=42, cascade=False,
+                cascade_threshold=None, micro_batching=True, max_batch_size=32, max_wait_ms=2.0,
+                similar_index_path=None):
+    """
+    Loads and warms up the model, vocabulary and label map of a version directory.
+
+    Args:
+        directory (str): The version directory.
+        name (str, optional): The version name. Defaults to the model file's digest.
+        fallback_directory (str, optional): Where the vocabulary and label map are read from
+            when the version directory has none. Defaults to none.
+        max_len (int, optional): The length of the encoded sentences. Defaults to 42.
+        cascade (bool, optional): Whether to answer through the fast head, if the version
+            has one. Defaults to False.
+        cascade_threshold (float, optional): The cascade threshold. Defaults to the head's own.
+        micro_batching (bool, optional): Whether to give the bundle a micro-batcher. Defaults to True.
+        max_batch_size (int, optional): The micro-batcher's maximum batch size. Defaults to 32.
+        max_wait_ms (float, optional): The micro-batcher's maximum wait. Defaults to 2.0.
+        similar_index_path (str, optional): The similarity index used when the version
+            directory has none. Defaults to none.
+
+    Returns:
+        ModelBundle: The warmed-up bundle.
+
+    Raises:
+        FileNotFoundError: If the directory has no model file.
+        ValueError: If the files do not fit together or warming up fails.
+    """
+    path = find_model(directory)
+    if path is None:
+        raise FileNotFoundError(f"No model file ({' or '.join(MODEL_FILES)}) in '{directory}'.")
+    if path.endswith(".bin"):
+        model = load_artifact(path)
+    else:
+        with open(path, "rb") as f:
+            model = pickle.load(f)
+    digest = file_digest(path)[:12]
+    name = name or digest
+    encoder = Encoder.load(_artifact_path(directory, VOCAB_FILE, fallback_directory), max_len)
+    with open(_artifact_path(directory, LABELS_FILE, fallback_directory), "r") as f:
+        label2idx = json.load(f)
+
+    model_version = name
+    head = None
+    fast_head_path = os.path.join(directory, FAST_HEAD_FILE)
+    if cascade and os.path.exists(fast_head_path):
+        head = Cascade(model, load_fast_head(fast_head_path), cascade_threshold)
+        model_version = f"{name}+cascade-{file_digest(fast_head_path)[:8]}-{head.threshold:g}"
+    predict_fn = head.predict if head is not None else model.predict
+
+    # An index built with a different model file is not loaded, since its vectors would not be comparable.
+    similarity_index = None
+    index_path = os.path.join(directory, SIMILAR_DIR)
+    if not os.path.exists(os.path.join(index_path, "index.json")):
+        index_path = similar_index_path
+    if index_path and os.path.exists(os.path.join(index_path, "index.json")):
+        similarity_index = SimilarityIndex.load(index_path)
+        if similarity_index.manifest.get("model_version") not in (None, digest):
+            print(f"Ignoring the similarity index in {index_path}: it was built for model "
+                  f"{similarity_index.manifest['model_version']}, not {digest}.")
+            similarity_index = None
+
+    batcher = MicroBatcher(predict_fn, max_batch_size, max_wait_ms) if micro_batching else None
+    bundle = ModelBundle(name, model_version, digest, path, model, encoder, label2idx, predict_fn,
+                         head, batcher, similarity_index)
+    warmup_path = os.path.join(directory, WARMUP_FILE)
+    try:
+        if os.path.exists(warmup_path):
+            with open(warmup_path, "r") as f:
+                warm_up(bundle, json.load(f) or WARMUP_TEXTS)
+        else:
+            warm_up(bundle)
+    except Exception:
+        bundle.close()
+        raise
+    return bundle
+
+def _version_key(name):
+    # Natural order, so that "v10" comes after "v9".
+    return [(0, int(part), "") if part.isdigit() else (1, 0, part) for part in re.split(r"(\d+)", name) if part]
+
+def list_versions(directory):
+    """
+    Lists the published versions of a registry directory, oldest first.
+
+    Directories whose names start with "." (versions still being published) and
+    directories without a model file are skipped.
+
+    Args:
+        directory (str): The registry directory.
+
+    Returns:
+        list: The version names, in natural sort order.
+    """
+    if not os.path.isdir(directory):
+        return []
+    names = [name for name in os.listdir(directory)
+             if not name.startswith(".") and find_model(os.path.join(directory, name))]
+    return sorted(names, key=_version_key)
+
+def read_pin(directory):
+    """
+    Returns the version pinned in a registry directory, or None if the latest version is served.
+    """
+    try:
+        with open(os.path.join(directory, PIN_FILE), "r") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def write_pin(directory, name):
+    """
+    Pins a version (or, with name=None, goes back to serving the latest), atomically.
+    """
+    path = os.path.join(directory, PIN_FILE)
+    if name is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(name + "\n")
+    os.replace(tmp_path, path)
+
+class ModelRegistry:
+    """
+    Serves one model bundle at a time and swaps it without stopping requests.
+
+    The registry directory holds one subdirectory per version, with the model file and
+    optionally its own word2idx.json, label2idx.json, fast_head.npz, similar/ index and
+    warmup.json sample exercises. The version served is the one named in the CURRENT pin
+    file, or the latest one when nothing is pinned. A background thread polls the
+    directory; when the wanted version changes it loads and warms up the new bundle off
+    the request path and then replaces `active` with one attribute assignment, which
+    request handlers read without locking. A version that fails to load is not retried
+    until its directory changes, and the active bundle keeps serving meanwhile.
+
+    The previous bundle stays loaded, so rolling back swaps it in immediately. Rollbacks
+    and activations are written to the pin file, so every worker process watching the
+    same directory converges on the same version.
+
+    Attributes:
+        directory (str): The registry directory, or None to serve a single fixed bundle.
+        loader (callable): Maps (version directory, version name) to a warmed-up ModelBundle.
+        poll_seconds (float): The time between directory checks.
+        active (ModelBundle): The bundle being served.
+        previous (ModelBundle): The bundle served before it, or None.
+        reloads (int): The number of successful swaps after the first load.
+        failures (int): The number of versions that failed to load.
+        last_error (dict): The last load failure, or None.
+    """
+    def __init__(self, directory, loader, poll_seconds=5.0, on_swap=None):
+        """
+        Initializes an empty registry; call `start` (or `swap`) to load a bundle.
+
+        Args:
+            directory (str): The registry directory, or None to serve a single fixed bundle.
+            loader (callable): Maps (version directory, version name) to a warmed-up ModelBundle.
+            poll_seconds (float, optional): The time between directory checks. Defaults to 5.0.
+            on_swap (callable, optional): Called with (old bundle, new bundle) after every swap.
+        """
+        self.directory = directory
+        self.loader = loader
+        self.poll_seconds = poll_seconds
+        self.on_swap = on_swap
+        self.active = None
+        self.previous = None
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_check = None
+        self._failed = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._watcher = None
+        self._watcher_pid = None
+
+    def versions(self):
+        """
+        Returns the published version names, oldest first.
+        """
+        return list_versions(self.directory) if self.directory else []
+
+    def wanted_version(self):
+        """
+        Returns the pinned version, or the latest published one when nothing is pinned.
+        """
+        if not self.directory:
+            return None
+        pinned = read_pin(self.directory)
+        if pinned is not None:
+            return pinned
+        versions = self.versions()
+        return versions[-1] if versions else None
+
+    def swap(self, bundle):
+        """
+        Makes a bundle the active one and keeps the replaced bundle for rollback.
+
+        The bundle that was previous before the swap is closed, unless it is the one
+        being activated.
+
+        Args:
+            bundle (ModelBundle): The new active bundle.
+        """
+        with self._lock:
+            swapped = self._install(bundle)
+        self._finish_swap(bundle, swapped)
+
+    def _install(self, bundle):
+        # Called with _lock held; returns the (replaced, retired) bundles, or None if the
+        # bundle is already active.
+        old, retired = self.active, self.previous
+        if old is bundle:
+            return None
+        self.active = bundle
+        self.previous = old
+        if old is not None:
+            self.reloads += 1
+        return old, retired
+
+    def _finish_swap(self, bundle, swapped):
+        if swapped is None:
+            return
+        old, retired = swapped
+        if retired is not None and retired is not bundle:
+            retired.close()
+        if self.on_swap is not None:
+            self.on_swap(old, bundle)
+
+    def check(self):
+        """
+        Loads and activates the wanted version if it is not the active one.
+
+        Called by the watcher thread; can also be called directly, e.g. before the first
+        request. Loading happens in the calling thread, outside the lock, so the wanted
+        version is read again under the lock before the swap: if a rollback or activation
+        changed it meanwhile, the loaded bundle is closed instead of being swapped in.
+
+        Returns:
+            bool: Whether a new bundle was activated.
+        """
+        self.last_check = time.time()
+        name = self.wanted_version()
+        if name is None or (self.active is not None and name == self.active.name):
+            return False
+        with self._lock:
+            previous = self.previous
+            reuse = previous is not None and name == previous.name
+            swapped = self._install(previous) if reuse and name == self.wanted_version() else None
+        if reuse:
+            self._finish_swap(previous, swapped)
+            return swapped is not None
+        path = os.path.join(self.directory, name)
+        try:
+            stamp = os.stat(path).st_mtime_ns
+        except OSError:
+            stamp = None
+        if name in self._failed and self._failed[name] == stamp:
+            return False
+        try:
+            if stamp is None:
+                raise FileNotFoundError(f"Version '{name}' does not exist in '{self.directory}'.")
+            bundle = self.loader(path, name)
+        except Exception as e:
+            # Stat again: loading may have written into the directory (e.g. word2idx.bin).
+            try:
+                stamp = os.stat(path).st_mtime_ns
+            except OSError:
+                pass
+            self._failed[name] = stamp
+            self.failures += 1
+            self.last_error = {"version": name, "error": f"{type(e).__name__}: {e}", "time": time.time()}
+            print(f"Could not load model version '{name}': {self.last_error['error']}")
+            return False
+        self._failed.pop(name, None)
+        with self._lock:
+            swapped = self._install(bundle) if self.wanted_version() == name else None
+        if swapped is None:
+            bundle.close()
+            return False
+        self._finish_swap(bundle, swapped)
+        return True
+
+    def activate(self, name):
+        """
+        Pins a version and wakes the watcher, which loads it in the background.
+
+        Args:
+            name (str): The version to serve, or None to serve the latest version again.
+
+        Raises:
+            KeyError: If the version is not published.
+        """
+        if name is not None and name not in self.versions():
+            raise KeyError(name)
+        write_pin(self.directory, name)
+        self._wake.set()
+
+    def rollback(self):
+        """
+        Swaps the previous bundle back in immediately and pins its version.
+
+        Returns:
+            ModelBundle: The bundle now active.
+
+        Raises:
+            LookupError: If there is no previous bundle.
+        """
+        # Pinning and swapping under the lock keeps a concurrent `check` from swapping in
+        # (or retiring) another bundle in between.
+        with self._lock:
+            previous = self.previous
+            if previous is None:
+                raise LookupError("There is no previous model version to roll back to.")
+            if self.directory:
+                write_pin(self.directory, previous.name)
+            swapped = self._install(previous)
+        self._finish_swap(previous, swapped)
+        return previous
+
+    def start(self):
+        """
+        Loads the wanted version in the calling thread. Call `watch` to follow later changes.
+
+        Raises:
+            RuntimeError: If no version could be loaded.
+        """
+        self.check()
+        if self.active is None:
+            error = self.last_error["error"] if self.last_error else "no version is published"
+            raise RuntimeError(f"Could not load a model from '{self.directory}': {error}.")
+
+    def watch(self):
+        """
+        Starts the watcher thread in this process, unless it is already running here.
+
+        Threads do not survive fork, so a registry loaded before forking (e.g. by an app
+        module preloaded by gunicorn) has no watcher in the workers. Calling this on every
+        request costs one pid comparison and starts one watcher per worker process.
+        """
+        if self.directory is None or self._watcher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._watcher_pid == os.getpid():
+                return
+            self._watcher = threading.Thread(target=self._watch, name="model-registry", daemon=True)
+            self._watcher.start()
+            self._watcher_pid = os.getpid()
+
+    def stop(self):
+        """
+        Stops the watcher thread.
+        """
+        self._stop.set()
+        self._wake.set()
+        if self._watcher is not None and self._watcher_pid == os.getpid():
+            self._watcher.join()
+
+    def _watch(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Model registry check failed: {type(e).__name__}: {e}")
+
+    def status(self):
+        """
+        Returns the JSON-serializable registry state reported by the status endpoint.
+        """
+        active, previous = self.active, self.previous
+        return {
+            "active": active.describe() if active is not None else None,
+            "previous": previous.name if previous is not None else None,
+            "directory": self.directory,
+            "pinned": read_pin(self.directory) if self.directory else None,
+            "available": self.versions(),
+            "poll_seconds": self.poll_seconds if self.directory else None,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_check": self.last_check,
+        }
+
+def publish(directory, name, model_path, vocab_path=VOCAB_FILE, labels_path=LABELS_FILE,
+            fast_head_path=None, similar_path=None, warmup_path=None, check=True):
+    """
+    Copies a model and its files into a new version directory of a registry.
+
+    The files are copied into a hidden temporary directory, optionally loaded and warmed
+    up there, and the directory is then renamed into place, so watchers never see a
+    partially copied version.
+
+    Args:
+        directory (str): The registry directory.
+        name (str): The new version name.
+        model_path (str): The model file (cnn_model.bin or cnn_model_fixed.pkl).
+        vocab_path (str, optional): The vocabulary. Defaults to "word2idx.json".
+        labels_path (str, optional): The label map. Defaults to "label2idx.json".
+        fast_head_path (str, optional): The cascade fast head. Defaults to none.
+        similar_path (str, optional): The similarity index directory. Defaults to none.
+        warmup_path (str, optional): A JSON list of warm-up exercises. Defaults to none.
+        check (bool, optional): Whether to load and warm up the version before publishing it.
+            Defaults to True.
+
+    Returns:
+        str: The new version directory.
+
+    Raises:
+        FileExistsError: If the version already exists; published versions are immutable.
+    """
+    if name.startswith(".") or os.sep in name or name == PIN_FILE:
+        raise ValueError(f"Invalid version name '{name}'.")
+    target = os.path.join(directory, name)
+    if os.path.exists(target):
+        raise FileExistsError(f"Version '{name}' already exists in '{directory}'.")
+    os.makedirs(directory, exist_ok=True)
+    tmp = os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+    os.makedirs(tmp)
+    try:
+        model_file = MODEL_FILES[0] if model_path.endswith(".bin") else MODEL_FILES[1]
+        shutil.copy2(model_path, os.path.join(tmp, model_file))
+        shutil.copy2(vocab_path, os.path.join(tmp, VOCAB_FILE))
+        shutil.copy2(labels_path, os.path.join(tmp, LABELS_FILE))
+        if fast_head_path:
+            shutil.copy2(fast_head_path, os.path.join(tmp, FAST_HEAD_FILE))
+        if similar_path:
+            shutil.copytree(similar_path, os.path.join(tmp, SIMILAR_DIR))
+        if warmup_path:
+            shutil.copy2(warmup_path, os.path.join(tmp, WARMUP_FILE))
+        if check:
+            load_bundle(tmp, name, micro_batching=False, cascade=bool(fast_head_path)).close()
+        os.rename(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            shutil.rmtree(tmp)
+    return target
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the versioned model directory watched by app.py.")
+    parser.add_argument("--registry", default="models/registry", help="The registry directory.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    publish_parser = commands.add_parser("publish", help="Publish a model as a new version.")
+    publish_parser.add_argument("name")
+    publish_parser.add_argument("--model", default="models/cnn_model.bin")
+    publish_parser.add_argument("--vocab", default=VOCAB_FILE)
+    publish_parser.add_argument("--labels", default=LABELS_FILE)
+    publish_parser.add_argument("--fast-head")
+    publish_parser.add_argument("--similar", help="A similarity index directory built for this model.")
+    publish_parser.add_argument("--warmup", help="A JSON list of warm-up exercises.")
+    publish_parser.add_argument("--no-check", action="store_true", help="Publish without loading the version first.")
+    commands.add_parser("list", help="List the published versions.")
+    pin_parser = commands.add_parser("pin", help="Serve a given version (e.g. to roll back).")
+    pin_parser.add_argument("name")
+    commands.add_parser("unpin", help="Serve the latest version again.")
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        print(publish(args.registry, args.name, args.model, args.vocab, args.labels, args.fast_head,
+                      args.similar, args.warmup, not args.no_check))
+    elif args.command == "list":
+        pinned = read_pin(args.registry)
+        versions = list_versions(args.registry)
+        current = pinned or (versions[-1] if versions else None)
+        for name in versions:
+            print(f"{'*' if name == current else ' '} {name}")
+    elif args.command == "pin":
+        if args.name not in list_versions(args.registry):
+            parser.error(f"version '{args.name}' is not published in '{args.registry}'")
+        write_pin(args.registry, args.name)
+    else:
+        write_pin(args.registry, None)
+
+if __name__ == "__main__":
+    main()
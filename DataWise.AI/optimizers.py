@@ -0,0 +1,264 @@
+import numpy as np
+from sparse import RowState
+
+class Optimizer:
+    """
+    Base class for optimizers that update model parameters in place.
+
+    Parameters are identified by name so that each one keeps its own state. Dense updates
+    go through `update`, and row-sparse updates of large tables (e.g. embeddings) go
+    through `update_rows`, which only touches and only allocates state for the given rows.
+
+    Attributes:
+        lr (float): The learning rate.
+        state (dict): Per-parameter optimizer state, keyed by parameter name.
+    """
+    def __init__(self, learning_rate=0.01):
+        """
+        Initializes the optimizer.
+
+        Args:
+            learning_rate (float, optional): The learning rate. Default is 0.01.
+        """
+        self.lr = learning_rate
+        self.state = {}
+        self._scratch = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_scratch"] = {}
+        return state
+
+    def scratch(self, name, like):
+        """
+        Returns a reusable buffer shaped like the given array.
+
+        Args:
+            name (str): The parameter name the buffer belongs to.
+            like (np.ndarray): The array whose shape and dtype the buffer must match.
+
+        Returns:
+            np.ndarray: A buffer with undefined contents.
+        """
+        buffer = self._scratch.get(name)
+        if buffer is None or buffer.shape != like.shape or buffer.dtype != like.dtype:
+            buffer = np.empty_like(like)
+            self._scratch[name] = buffer
+        return buffer
+
+    def update(self, name, param, grad):
+        """
+        Applies one update to a dense parameter in place.
+
+        Args:
+            name (str): The parameter name.
+            param (np.ndarray): The parameter to update.
+            grad (np.ndarray): The gradient of the loss with respect to param.
+        """
+        raise NotImplementedError
+
+    def update_rows(self, name, param, ids, rows):
+        """
+        Applies one update to the given rows of a parameter table.
+
+        Args:
+            name (str): The parameter name.
+            param (np.ndarray): The parameter table to update.
+            ids (np.ndarray): The distinct row ids that received a gradient.
+            rows (np.ndarray): The gradient for each of those rows (shape: [len(ids), dim]).
+        """
+        raise NotImplementedError
+
+    def row_state(self, name, param, names):
+        """
+        Returns the lazily allocated per-row state of a parameter table.
+
+        Args:
+            name (str): The parameter name.
+            param (np.ndarray): The parameter table.
+            names (tuple): The names of the state arrays to keep per row.
+
+        Returns:
+            RowState: The state table.
+        """
+        if name not in self.state:
+            self.state[name] = RowState(param.shape[0], param.shape[1], names, dtype=param.dtype)
+        return self.state[name]
+
+    def dense_state(self, name, param, names):
+        """
+        Returns the state of a dense parameter, allocating zeroed arrays on first use.
+
+        Args:
+            name (str): The parameter name.
+            param (np.ndarray): The parameter.
+            names (tuple): The names of the state arrays to keep.
+
+        Returns:
+            dict: The state arrays by name, plus the update count under "step".
+        """
+        if name not in self.state:
+            self.state[name] = {key: np.zeros_like(param) for key in names}
+            self.state[name]["step"] = 0
+        return self.state[name]
+
+class SGD(Optimizer):
+    """
+    Plain stochastic gradient descent.
+    """
+    def update(self, name, param, grad):
+        step = self.scratch(name, grad)
+        np.multiply(grad, self.lr, out=step)
+        np.subtract(param, step, out=param)
+
+    def update_rows(self, name, param, ids, rows):
+        param[ids] -= self.lr * rows
+
+class Momentum(Optimizer):
+    """
+    Stochastic gradient descent with (heavy-ball) momentum.
+
+    Attributes:
+        momentum (float): The decay factor of the velocity.
+    """
+    def __init__(self, learning_rate=0.01, momentum=0.9):
+        """
+        Initializes the optimizer.
+
+        Args:
+            learning_rate (float, optional): The learning rate. Default is 0.01.
+            momentum (float, optional): The decay factor of the velocity. Default is 0.9.
+        """
+        super().__init__(learning_rate)
+        self.momentum = momentum
+
+    def update(self, name, param, grad):
+        velocity = self.dense_state(name, param, ("velocity",))["velocity"]
+        velocity *= self.momentum
+        velocity += grad
+        step = self.scratch(name, grad)
+        np.multiply(velocity, self.lr, out=step)
+        np.subtract(param, step, out=param)
+
+    def update_rows(self, name, param, ids, rows):
+        state = self.row_state(name, param, ("velocity",))
+        slots = state.slots(ids)
+        velocity = state.arrays["velocity"][slots] * self.momentum + rows
+        state.arrays["velocity"][slots] = velocity
+        param[ids] -= self.lr * velocity
+
+class AdaGrad(Optimizer):
+    """
+    AdaGrad, which scales each coordinate by the root of its accumulated squared gradients.
+
+    Attributes:
+        eps (float): A small constant for numerical stability.
+    """
+    def __init__(self, learning_rate=0.01, eps=1e-8):
+        """
+        Initializes the optimizer.
+
+        Args:
+            learning_rate (float, optional): The learning rate. Default is 0.01.
+            eps (float, optional): A small constant for numerical stability. Default is 1e-8.
+        """
+        super().__init__(learning_rate)
+        self.eps = eps
+
+    def update(self, name, param, grad):
+        accum = self.dense_state(name, param, ("accum",))["accum"]
+        step = self.scratch(name, grad)
+        np.multiply(grad, grad, out=step)
+        accum += step
+        np.sqrt(accum, out=step)
+        step += self.eps
+        np.divide(grad, step, out=step)
+        step *= self.lr
+        np.subtract(param, step, out=param)
+
+    def update_rows(self, name, param, ids, rows):
+        state = self.row_state(name, param, ("accum",))
+        slots = state.slots(ids)
+        accum = state.arrays["accum"][slots] + rows * rows
+        state.arrays["accum"][slots] = accum
+        param[ids] -= self.lr * rows / (np.sqrt(accum) + self.eps)
+
+class Adam(Optimizer):
+    """
+    Adam, with bias-corrected first and second moment estimates.
+
+    Rows of a table updated through `update_rows` keep their own step count, so rows that
+    appear rarely are bias-corrected by how often they were updated (lazy Adam).
+
+    Attributes:
+        beta1 (float): The decay rate of the first moment.
+        beta2 (float): The decay rate of the second moment.
+        eps (float): A small constant for numerical stability.
+    """
+    def __init__(self, learning_rate=0.001, beta1=0.9, beta2=0.999, eps=1e-8):
+        """
+        Initializes the optimizer.
+
+        Args:
+            learning_rate (float, optional): The learning rate. Default is 0.001.
+            beta1 (float, optional): The decay rate of the first moment. Default is 0.9.
+            beta2 (float, optional): The decay rate of the second moment. Default is 0.999.
+            eps (float, optional): A small constant for numerical stability. Default is 1e-8.
+        """
+        super().__init__(learning_rate)
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.eps = eps
+
+    def update(self, name, param, grad):
+        state = self.dense_state(name, param, ("m", "v"))
+        state["step"] += 1
+        m, v = state["m"], state["v"]
+        step = self.scratch(name, grad)
+
+        m *= self.beta1
+        np.multiply(grad, 1 - self.beta1, out=step)
+        m += step
+        v *= self.beta2
+        np.multiply(grad, grad, out=step)
+        step *= 1 - self.beta2
+        v += step
+
+        lr_t = self.lr * np.sqrt(1 - self.beta2 ** state["step"]) / (1 - self.beta1 ** state["step"])
+        np.sqrt(v, out=step)
+        step += self.eps
+        np.divide(m, step, out=step)
+        step *= lr_t
+        np.subtract(param, step, out=param)
+
+    def update_rows(self, name, param, ids, rows):
+        state = self.row_state(name, param, ("m", "v"))
+        slots = state.slots(ids)
+        state.steps[slots] += 1
+        t = state.steps[slots][:, None]
+
+        m = self.beta1 * state.arrays["m"][slots] + (1 - self.beta1) * rows
+        v = self.beta2 * state.arrays["v"][slots] + (1 - self.beta2) * rows * rows
+        state.arrays["m"][slots] = m
+        state.arrays["v"][slots] = v
+
+        lr_t = self.lr * np.sqrt(1 - self.beta2 ** t) / (1 - self.beta1 ** t)
+        param[ids] -= lr_t * m / (np.sqrt(v) + self.eps)
+
+OPTIMIZERS = {"sgd": SGD, "momentum": Momentum, "adagrad": AdaGrad, "adam": Adam}
+
+def get_optimizer(name, learning_rate, **kwargs):
+    """
+    Creates an optimizer by name.
+
+    Args:
+        name (str): One of "sgd", "momentum", "adagrad" or "adam".
+        learning_rate (float): The learning rate.
+        **kwargs: Extra optimizer-specific hyperparameters.
+
+    Returns:
+        Optimizer: The optimizer.
+    """
+    if name not in OPTIMIZERS:
+        raise ValueError(f"Unknown optimizer '{name}'. Expected one of: {', '.join(OPTIMIZERS)}.")
+    return OPTIMIZERS[name](learning_rate, **kwargs)
@@ -0,0 +1,196 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+from artifact import model_arrays
+
+def param_layout(model):
+    """
+    Computes where each parameter lives in a flat buffer.
+
+    Args:
+        model (TextCNN): The model.
+
+    Returns:
+        list: (name, shape, offset) tuples, with offsets counted in elements.
+    """
+    layout, offset = [], 0
+    for name, array in model_arrays(model).items():
+        layout.append((name, array.shape, offset))
+        offset += int(np.prod(array.shape))
+    return layout
+
+def layout_views(buffer, layout):
+    """
+    Splits a flat buffer into named, parameter-shaped views.
+
+    Args:
+        buffer (np.ndarray): The flat buffer.
+        layout (list): The layout returned by `param_layout`.
+
+    Returns:
+        dict: A dictionary mapping parameter names to views of the buffer.
+    """
+    return {name: buffer[offset:offset + int(np.prod(shape))].reshape(shape) for name, shape, offset in layout}
+
+def bind_params(model, params):
+    """
+    Points the parameters of a model at the given arrays.
+
+    Args:
+        model (TextCNN): The model.
+        params (dict): Arrays named as in `artifact.model_arrays`.
+    """
+    model.embeddings = params["embeddings"]
+    model.conv_filters = {fs: params[f"conv_filters.{fs}"] for fs in model.filter_sizes}
+    model.fc_weights = params["fc_weights"]
+    model.fc_bias = params["fc_bias"]
+
+def _worker_main(conn, model, grad_views):
+    """
+    Runs a replica: computes shard gradients into this worker's slot of the gradient buffer.
+
+    The worker is forked after the model parameters were moved into shared memory, so the
+    replica's parameters are views of the shared buffer and every update applied by the
+    trainer is visible without copying.
+    """
+    written_rows = np.zeros(0, dtype=np.int64)
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        X, y, weight = message
+        loss = model.compute_loss(X, y)
+        shard_grads = model.compute_gradients(X, y)
+
+        grad_views["embeddings"][written_rows] = 0.0
+        word_ids, rows = shard_grads["embeddings"]
+        grad_views["embeddings"][word_ids] = rows * weight
+        written_rows = word_ids
+        for fs in model.filter_sizes:
+            np.multiply(shard_grads["conv_filters"][fs], weight, out=grad_views[f"conv_filters.{fs}"])
+        np.multiply(shard_grads["fc_weights"], weight, out=grad_views["fc_weights"])
+        np.multiply(shard_grads["fc_bias"], weight, out=grad_views["fc_bias"])
+        conn.send(loss * weight)
+    conn.close()
+
+class DataParallelTrainer:
+    """
+    Trains a TextCNN with synchronous data parallelism over a pool of worker processes.
+
+    The model parameters are moved into a shared-memory buffer that every worker's replica
+    views directly. Each global batch is split into one shard per worker; every worker runs
+    forward/backward on its shard and writes its gradient, weighted by its share of the
+    batch, into its own slot of a shared gradient buffer. The trainer then sums the slots
+    and applies one optimizer update in place, which all replicas see immediately.
+
+    Attributes:
+        model (TextCNN): The trained model; its parameters live in shared memory until `close`.
+        num_workers (int): The number of worker processes.
+        dtype (np.dtype): The dtype of the shared parameter and gradient buffers (the model's).
+    """
+    def __init__(self, model, num_workers):
+        """
+        Moves the model parameters into shared memory and starts the workers.
+
+        Args:
+            model (TextCNN): The model to train.
+            num_workers (int): The number of worker processes.
+        """
+        # Workers are forked so that they inherit the shared-memory mappings (and so that
+        # train.py-style scripts without a __main__ guard are not re-executed in them).
+        # This is checked before any shared memory is allocated, so a failure leaks nothing.
+        if "fork" not in mp.get_all_start_methods():
+            raise RuntimeError("DataParallelTrainer requires the 'fork' start method.")
+        self.model = model
+        self.num_workers = num_workers
+        self.layout = param_layout(model)
+        self.size = sum(int(np.prod(shape)) for _, shape, _ in self.layout)
+        # The buffers keep the model's dtype, so a float32 model stays float32 while shared.
+        self.dtype = np.result_type(*model_arrays(model).values())
+
+        itemsize = self.dtype.itemsize
+        self._params_shm = shared_memory.SharedMemory(create=True, size=self.size * itemsize)
+        self._grads_shm = shared_memory.SharedMemory(create=True, size=num_workers * self.size * itemsize)
+        params = np.ndarray((self.size,), dtype=self.dtype, buffer=self._params_shm.buf)
+        shared = layout_views(params, self.layout)
+        for name, array in model_arrays(model).items():
+            shared[name][...] = array
+        bind_params(model, shared)
+
+        grads = np.ndarray((num_workers, self.size), dtype=self.dtype, buffer=self._grads_shm.buf)
+        self._slots = [layout_views(grads[w], self.layout) for w in range(num_workers)]
+        self._totals = {name: np.zeros(shape, dtype=self.dtype)
+                        for name, shape, _ in self.layout if name != "embeddings"}
+
+        context = mp.get_context("fork")
+        self._conns, self._workers = [], []
+        for w in range(num_workers):
+            parent_conn, child_conn = context.Pipe()
+            worker = context.Process(target=_worker_main, args=(child_conn, model, self._slots[w]), daemon=True)
+            worker.start()
+            child_conn.close()
+            self._conns.append(parent_conn)
+            self._workers.append(worker)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def train_on_batch(self, X, y):
+        """
+        Runs one synchronous data-parallel training step.
+
+        Args:
+            X (np.ndarray): The global batch of text sequences (shape: [batch_size, max_len]).
+            y (np.ndarray): Integer labels (shape: [batch_size]) or one-hot encoded labels.
+
+        Returns:
+            float: The loss of the global batch.
+        """
+        shards = [idx for idx in np.array_split(np.arange(len(X)), self.num_workers) if len(idx)]
+        for conn, idx in zip(self._conns, shards):
+            conn.send((X[idx], y[idx], len(idx) / len(X)))
+        loss = sum(conn.recv() for conn in self._conns[:len(shards)])
+
+        slots = self._slots[:len(shards)]
+        grads = {"conv_filters": {}}
+        for name, total in self._totals.items():
+            np.copyto(total, slots[0][name])
+            for slot in slots[1:]:
+                total += slot[name]
+            if name.startswith("conv_filters."):
+                grads["conv_filters"][int(name.split(".", 1)[1])] = total
+            else:
+                grads[name] = total
+
+        word_ids = np.unique(X)
+        rows = slots[0]["embeddings"][word_ids]
+        for slot in slots[1:]:
+            rows += slot["embeddings"][word_ids]
+        grads["embeddings"] = (word_ids, rows)
+
+        self.model.apply_gradients(grads)
+        return loss
+
+    def close(self):
+        """
+        Stops the workers, copies the parameters back into private arrays and frees the shared memory.
+        """
+        if self._params_shm is None:
+            return
+        for conn in self._conns:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for worker in self._workers:
+            worker.join()
+        bind_params(self.model, {name: np.array(array) for name, array in model_arrays(self.model).items()})
+        self._slots, self._totals = None, None
+        for shm in (self._params_shm, self._grads_shm):
+            shm.close()
+            shm.unlink()
+        self._params_shm = self._grads_shm = None
@@ -0,0 +1,122 @@
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+# Returned by `stage` when no profiler is attached, so unprofiled calls cost one branch.
+_NO_STAGE = nullcontext()
+
+class Profiler:
+    """
+    Records the wall time and allocated bytes of named stages.
+
+    Stages are timed with `stage`, usually through `TextCNN.profile`. When memory tracing
+    is on, `tracemalloc` is started for the lifetime of the profiler and each call records
+    how far the traced memory rose above its level at the start of the stage, which counts
+    the temporaries numpy allocated in that stage.
+
+    Attributes:
+        trace_memory (bool): Whether allocated bytes are recorded.
+        stages (dict): For each stage name, its "calls", "seconds", "allocated_bytes"
+            (summed over calls) and "peak_bytes" (the largest single call).
+    """
+    def __init__(self, trace_memory=True):
+        """
+        Initializes an empty profiler.
+
+        Args:
+            trace_memory (bool, optional): Whether to record allocated bytes. Tracing memory
+                slows numpy allocations down, so wall times are best taken without it. Default is True.
+        """
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self._started_tracing = False
+
+    def start(self):
+        """
+        Starts memory tracing if it is enabled and not already running.
+        """
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stop(self):
+        """
+        Stops memory tracing if this profiler started it.
+        """
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times the enclosed block and adds it to the named stage.
+
+        Args:
+            name (str): The stage name, e.g. "conv.3" or "update.embeddings".
+        """
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            record = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0, "allocated_bytes": 0, "peak_bytes": 0})
+            record["calls"] += 1
+            record["seconds"] += seconds
+            if tracing:
+                allocated = max(tracemalloc.get_traced_memory()[1] - base, 0)
+                record["allocated_bytes"] += allocated
+                record["peak_bytes"] = max(record["peak_bytes"], allocated)
+
+    def reset(self):
+        """
+        Clears the recorded stages.
+        """
+        self.stages = {}
+
+    def report(self):
+        """
+        Summarizes the recorded stages.
+
+        Returns:
+            dict: For each stage, in the order it first ran, its calls, total and mean
+                milliseconds, share of the profiled time, allocated and peak bytes.
+        """
+        total = sum(record["seconds"] for record in self.stages.values()) or 1.0
+        return {
+            name: {
+                "calls": record["calls"],
+                "total_ms": record["seconds"] * 1000,
+                "mean_ms": record["seconds"] * 1000 / record["calls"],
+                "share": record["seconds"] / total,
+                "allocated_bytes": record["allocated_bytes"],
+                "peak_bytes": record["peak_bytes"],
+            }
+            for name, record in self.stages.items()
+        }
+
+def stage(profiler, name):
+    """
+    Returns a context manager that profiles a stage, or does nothing without a profiler.
+
+    Args:
+        profiler (Profiler): The attached profiler, or None.
+        name (str): The stage name.
+
+    Returns:
+        contextlib.AbstractContextManager: The stage context.
+    """
+    if profiler is None:
+        return _NO_STAGE
+    return profiler.stage(name)
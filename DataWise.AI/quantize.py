@@ -0,0 +1,89 @@
+import numpy as np
+
+class QuantizedArray:
+    """
+    A symmetric int8 quantization of an array with one float32 scale per channel.
+
+    Each slice along `axis` (a channel) is scaled by its maximum absolute value so that
+    the channel maps onto [-127, 127]. Values are dequantized on the fly by the callers
+    that use them, so only the int8 values and the scales are kept in memory.
+
+    Attributes:
+        values (np.ndarray): The quantized values (dtype: int8).
+        scale (np.ndarray): The per-channel scales (shape: [values.shape[axis]], dtype: float32).
+        axis (int): The channel axis.
+    """
+    def __init__(self, values, scale, axis):
+        """
+        Wraps already quantized values.
+
+        Args:
+            values (np.ndarray): The quantized values (dtype: int8).
+            scale (np.ndarray): The per-channel scales.
+            axis (int): The channel axis.
+        """
+        self.values = values
+        self.scale = scale
+        self.axis = axis % values.ndim
+
+    @classmethod
+    def from_float(cls, array, axis):
+        """
+        Quantizes a floating-point array per channel.
+
+        Args:
+            array (np.ndarray): The array to quantize.
+            axis (int): The channel axis.
+
+        Returns:
+            QuantizedArray: The quantized array.
+        """
+        axis = axis % array.ndim
+        reduce_axes = tuple(i for i in range(array.ndim) if i != axis)
+        max_abs = np.max(np.abs(array), axis=reduce_axes)
+        scale = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+        values = np.clip(np.rint(array / cls._expand(scale, axis, array.ndim)), -127, 127).astype(np.int8)
+        return cls(values, scale, axis)
+
+    @staticmethod
+    def _expand(scale, axis, ndim):
+        shape = [1] * ndim
+        shape[axis] = -1
+        return scale.reshape(shape)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.scale.nbytes
+
+    def dequantize(self, dtype=np.float32):
+        """
+        Reconstructs the floating-point array.
+
+        Args:
+            dtype (np.dtype, optional): The output dtype. Defaults to np.float32.
+
+        Returns:
+            np.ndarray: The dequantized array.
+        """
+        return self.values.astype(dtype) * self._expand(self.scale, self.axis, self.values.ndim).astype(dtype)
+
+    def take_rows(self, indices, dtype=np.float32):
+        """
+        Gathers and dequantizes rows of a table quantized per row (axis 0), e.g. an embedding lookup.
+
+        Args:
+            indices (np.ndarray): The row indices, of any shape.
+            dtype (np.dtype, optional): The output dtype. Defaults to np.float32.
+
+        Returns:
+            np.ndarray: The dequantized rows (shape: [*indices.shape, *values.shape[1:]]).
+        """
+        rows = self.values[indices].astype(dtype)
+        rows *= self.scale[indices].astype(dtype).reshape(indices.shape + (1,) * (self.values.ndim - 1))
+        return rows
+
+PRECISIONS = ("float64", "float32", "int8")
@@ -0,0 +1,298 @@
+import argparse
+import csv
+import json
+import multiprocessing as mp
+import os
+from collections import Counter, deque
+from itertools import islice
+
+from dedup import dedup_rows
+
+VALID_DIFFICULTIES = ("Easy", "Medium", "Hard", "Extremely Hard")
+
+# The steps applied by forked pool workers; set before the pool is created so the workers
+# inherit them instead of receiving pickled copies.
+_shared = None
+
+class StripFields:
+    """
+    Strips surrounding whitespace from every field.
+    """
+    name = "strip"
+
+    def __call__(self, row):
+        return {key: value.strip() if isinstance(value, str) else value for key, value in row.items()}
+
+class RequireFields:
+    """
+    Drops rows with an empty required field.
+
+    Attributes:
+        fields (tuple): The required fields.
+    """
+    name = "required fields"
+
+    def __init__(self, fields=("Question", "Answer")):
+        """
+        Args:
+            fields (tuple, optional): The required fields. Defaults to ("Question", "Answer").
+        """
+        self.fields = tuple(fields)
+
+    def __call__(self, row):
+        return row if all(row.get(field) for field in self.fields) else None
+
+class FixDifficulty:
+    """
+    Replaces difficulties outside the valid set with a default, matching case-insensitively first.
+
+    Attributes:
+        default (str): The difficulty given to rows with an unknown one.
+    """
+    name = "difficulty"
+
+    def __init__(self, default="Medium", valid=VALID_DIFFICULTIES):
+        """
+        Args:
+            default (str, optional): The replacement difficulty. Defaults to "Medium".
+            valid (tuple, optional): The valid difficulties. Defaults to VALID_DIFFICULTIES.
+        """
+        self.default = default
+        self._canonical = {difficulty.casefold(): difficulty for difficulty in valid}
+
+    def __call__(self, row):
+        row["Difficulty"] = self._canonical.get((row.get("Difficulty") or "").strip().casefold(), self.default)
+        return row
+
+class CheckCategory:
+    """
+    Drops rows whose category is not one of the expected ones.
+
+    Attributes:
+        categories (frozenset): The expected categories.
+    """
+    name = "category"
+
+    def __init__(self, categories):
+        """
+        Args:
+            categories (iterable): The expected categories.
+        """
+        self.categories = frozenset(categories)
+
+    def __call__(self, row):
+        return row if row.get("Category") in self.categories else None
+
+def default_steps(categories=None):
+    """
+    Returns the standard cleaning steps for generated questions.
+
+    Args:
+        categories (iterable, optional): The expected categories; rows of other categories
+            are dropped. Defaults to no category check.
+
+    Returns:
+        list: The steps, in the order they are applied.
+    """
+    steps = [StripFields(), RequireFields(), FixDifficulty()]
+    if categories is not None:
+        steps.append(CheckCategory(categories))
+    return steps
+
+def step_name(step):
+    """
+    Returns the name under which a step's dropped rows are counted.
+    """
+    return getattr(step, "name", None) or getattr(step, "__name__", type(step).__name__)
+
+def apply_steps(steps, rows):
+    """
+    Runs rows through the steps.
+
+    Each step takes a row dictionary and returns the (possibly modified) row, or None to
+    drop it; later steps do not see dropped rows.
+
+    Args:
+        steps (list): The validation and normalization steps.
+        rows (list): The rows.
+
+    Returns:
+        tuple: A tuple containing:
+            - rows (list): The rows that passed every step.
+            - dropped (Counter): The number of dropped rows per step name.
+    """
+    kept, dropped = [], Counter()
+    for row in rows:
+        for step in steps:
+            row = step(row)
+            if row is None:
+                break
+        if row is None:
+            dropped[step_name(step)] += 1
+        else:
+            kept.append(row)
+    return kept, dropped
+
+def _apply_shared(rows):
+    return apply_steps(_shared, rows)
+
+def _ordered_map(pool, func, items, window):
+    # Like pool.imap, but only `window` chunks are read ahead, so memory stays bounded when
+    # the workers are slower than the reader.
+    pending = deque()
+    for item in items:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+def _chunks(rows, chunk_size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def run_pipeline(input_path, output_path=None, steps=None, chunk_size=10000, num_workers=0,
+                 renumber=True, dedup=False):
+    """
+    Validates, normalizes and counts a question CSV in a single streaming pass.
+
+    The CSV is read in chunks and each chunk is run through the steps, either in this
+    process or, with num_workers > 0, in a pool of forked processes (chunks come back in
+    order, and only a few are read ahead). Surviving rows are optionally deduplicated with
+    `dedup.dedup_rows` and renumbered, then written to a temporary file that is renamed
+    over output_path once complete, so output_path may equal input_path and is never left
+    half-written. The difficulty and category histograms are counted from the same pass.
+
+    Args:
+        input_path (str): The input CSV.
+        output_path (str, optional): The output CSV. Defaults to none, which only counts.
+        steps (list, optional): The steps applied to each row. Defaults to `default_steps()`.
+        chunk_size (int, optional): The number of rows per chunk. Defaults to 10000.
+        num_workers (int, optional): The number of worker processes, 0 to run the steps in
+            this process. Defaults to 0.
+        renumber (bool, optional): Whether to rewrite the "ID" column as 1, 2, ... in output
+            order. Defaults to True.
+        dedup (bool, optional): Whether to drop exact and near-duplicate questions. Defaults to False.
+
+    Returns:
+        dict: "rows_read", "rows_written", "dropped" (rows dropped per step name, plus
+            "exact duplicate" and "near duplicate"), "difficulty" and "category" (histograms
+            of the written rows).
+    """
+    global _shared
+    steps = default_steps() if steps is None else steps
+    dropped = Counter()
+    difficulty, category = Counter(), Counter()
+    rows_read = rows_written = 0
+    tmp_path = output_path + ".tmp" if output_path else None
+    pool = None
+    try:
+        with open(input_path, newline="", encoding="utf-8") as infile:
+            reader = csv.DictReader(infile)
+            fieldnames = reader.fieldnames or []
+            chunks = _chunks(reader, chunk_size)
+            if num_workers > 0:
+                if "fork" not in mp.get_all_start_methods():
+                    raise RuntimeError("Running the pipeline with num_workers > 0 requires the 'fork' start method.")
+                _shared = steps
+                pool = mp.get_context("fork").Pool(num_workers)
+                results = _ordered_map(pool, _apply_shared, chunks, 2 * num_workers)
+            else:
+                results = (apply_steps(steps, chunk) for chunk in chunks)
+
+            def validated():
+                nonlocal rows_read
+                for rows, chunk_dropped in results:
+                    rows_read += len(rows) + sum(chunk_dropped.values())
+                    dropped.update(chunk_dropped)
+                    yield from rows
+
+            def unique(rows):
+                for row, duplicate_of, kind in dedup_rows(rows):
+                    if duplicate_of < 0:
+                        yield row
+                    else:
+                        dropped[f"{kind} duplicate"] += 1
+
+            rows = unique(validated()) if dedup else validated()
+
+            outfile = open(tmp_path, "w", newline="", encoding="utf-8") if tmp_path else None
+            try:
+                writer = csv.DictWriter(outfile, fieldnames=fieldnames) if outfile else None
+                if writer:
+                    writer.writeheader()
+                for row in rows:
+                    rows_written += 1
+                    if renumber and "ID" in fieldnames:
+                        row["ID"] = str(rows_written)
+                    difficulty[row.get("Difficulty")] += 1
+                    category[row.get("Category")] += 1
+                    if writer:
+                        writer.writerow(row)
+            finally:
+                if outfile:
+                    outfile.close()
+        if tmp_path:
+            os.replace(tmp_path, output_path)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            _shared = None
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return {
+        "rows_read": rows_read,
+        "rows_written": rows_written,
+        "dropped": dict(dropped),
+        "difficulty": dict(difficulty.most_common()),
+        "category": dict(category.most_common()),
+    }
+
+def print_summary(stats):
+    """
+    Prints the row counts and histograms returned by `run_pipeline`.
+    """
+    print(f"Read {stats['rows_read']} rows, wrote {stats['rows_written']}.")
+    for reason, count in stats["dropped"].items():
+        print(f"  Dropped ({reason}): {count}")
+    print("Difficulty counts:")
+    for difficulty, count in stats["difficulty"].items():
+        print(f"{difficulty}: {count}")
+    print("Category counts:")
+    for category, count in stats["category"].items():
+        print(f"{category}: {count}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate, normalize and count generated interview questions in one pass.")
+    parser.add_argument("input", nargs="?", default="new_interview_questions.csv")
+    parser.add_argument("output", nargs="?", default="interview_questions.csv")
+    parser.add_argument("--check", action="store_true",
+                        help="Only count the input's difficulties and categories, without changing or writing anything.")
+    parser.add_argument("--dedup", action="store_true", help="Drop exact and near-duplicate questions.")
+    parser.add_argument("--keep-ids", action="store_true", help="Keep the input IDs instead of renumbering.")
+    parser.add_argument("--any-category", action="store_true",
+                        help="Keep rows whose category is not one of questions_generator.categories.")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes for the row steps.")
+    parser.add_argument("--report", help="Also write the counts as JSON to this path.")
+    args = parser.parse_args()
+
+    if args.check:
+        stats = run_pipeline(args.input, steps=[], chunk_size=args.chunk_size, renumber=False)
+    else:
+        from questions_generator import categories
+        steps = default_steps(None if args.any_category else categories)
+        stats = run_pipeline(args.input, args.output, steps, args.chunk_size, args.workers,
+                             renumber=not args.keep_ids, dedup=args.dedup)
+    print_summary(stats)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(stats, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,16 @@
-import openai
+import argparse
+import asyncio
 import csv
-import time
-import sys
+import io
+import json
 import os
+import random
+import sys
+import time
+import urllib.error
+import urllib.request
 
-openai.api_key = "api_key"
+from dedup import dedup_csv
 
 DESIRED_MODEL = "gpt-4o-mini"
 
@@ -18,35 +24,211 @@ categories = {
 
 BATCH_SIZE = 500
 CSV_FILENAME = "new_interview_questions.csv"
+FIELDNAMES = ["ID", "Category", "Question", "Answer", "Difficulty"]
 
-def get_available_model(desired_model):
+class RetryableError(Exception):
     """
-    Check available models from the OpenAI API and return the desired model
-    if available; otherwise, fallback to "gpt-3.5-turbo".
+    Raised by LLM clients for failures worth retrying (rate limits, server errors, timeouts).
     """
-    try:
-        models = openai.Model.list()
+
+class ChatCompletionsClient:
+    """
+    An LLM client for any OpenAI-compatible /chat/completions endpoint.
+
+    It only needs the standard library, so the generator can run against the OpenAI API,
+    a self-hosted server or the local stub in benchmarks/stub_llm_server.py. Requests run
+    in worker threads so that several can be in flight at once.
+
+    Attributes:
+        base_url (str): The API base URL, e.g. "https://api.openai.com/v1".
+        api_key (str): The bearer token, or None.
+        model (str): The model name.
+        timeout (float): The request timeout in seconds.
+    """
+    def __init__(self, base_url, api_key=None, model=DESIRED_MODEL, timeout=120.0):
+        """
+        Initializes the client.
+
+        Args:
+            base_url (str): The API base URL.
+            api_key (str, optional): The bearer token. Defaults to none.
+            model (str, optional): The model name. Defaults to DESIRED_MODEL.
+            timeout (float, optional): The request timeout in seconds. Defaults to 120.
+        """
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+
+    def _post(self, prompt):
+        body = json.dumps({
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": "You are a helpful assistant."},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.7,
+        }).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        request = urllib.request.Request(f"{self.base_url}/chat/completions", data=body, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                payload = json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code == 429 or e.code >= 500:
+                raise RetryableError(f"HTTP {e.code}") from e
+            raise
+        except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+            raise RetryableError(str(e)) from e
+        return payload["choices"][0]["message"]["content"].strip()
+
+    async def complete(self, prompt):
+        """
+        Sends one prompt and returns the reply text.
+
+        Args:
+            prompt (str): The user prompt.
+
+        Returns:
+            str: The text of the first choice.
+        """
+        return await asyncio.to_thread(self._post, prompt)
+
+class OpenAIClient:
+    """
+    An LLM client using the legacy `openai` package (openai.ChatCompletion).
+
+    Attributes:
+        model (str): The model name.
+    """
+    def __init__(self, api_key, model=DESIRED_MODEL):
+        """
+        Configures the openai package.
+
+        Args:
+            api_key (str): The OpenAI API key.
+            model (str, optional): The model name. Defaults to DESIRED_MODEL.
+        """
+        import openai
+        openai.api_key = api_key
+        self._openai = openai
+        self.model = model
+
+    def select_model(self, desired_model=DESIRED_MODEL, fallback="gpt-3.5-turbo"):
+        """
+        Uses the desired model if the API offers it and falls back otherwise.
+
+        Args:
+            desired_model (str, optional): The preferred model. Defaults to DESIRED_MODEL.
+            fallback (str, optional): The model used if it is missing. Defaults to "gpt-3.5-turbo".
+        """
+        models = self._openai.Model.list()
         available_models = [model["id"] for model in models["data"]]
         if desired_model in available_models:
             print(f"Using desired model: {desired_model}")
-            return desired_model
+            self.model = desired_model
         else:
-            fallback = "gpt-3.5-turbo"
             print(f"Desired model '{desired_model}' not available. Falling back to '{fallback}'.")
-            return fallback
-    except Exception as e:
-        print("Error retrieving available models:", e)
-        sys.exit(1)
+            self.model = fallback
+
+    async def complete(self, prompt):
+        """
+        Sends one prompt and returns the reply text.
+
+        Args:
+            prompt (str): The user prompt.
+
+        Returns:
+            str: The text of the first choice.
+        """
+        try:
+            response = await self._openai.ChatCompletion.acreate(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": "You are a helpful assistant."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.7,
+            )
+        except (self._openai.error.RateLimitError, self._openai.error.APIError,
+                self._openai.error.Timeout, self._openai.error.ServiceUnavailableError) as e:
+            raise RetryableError(str(e)) from e
+        return response.choices[0].message.content.strip()
+
+class TokenBucket:
+    """
+    An asyncio token-bucket rate limiter.
+
+    Tokens refill continuously at `rate` per second up to `capacity`; every request takes
+    one, so short bursts of up to `capacity` requests go out immediately and the long-run
+    rate never exceeds `rate`.
+
+    Attributes:
+        rate (float): The refill rate, in tokens per second.
+        capacity (float): The maximum number of stored tokens.
+    """
+    def __init__(self, rate, capacity=1.0):
+        """
+        Initializes a full bucket.
+
+        Args:
+            rate (float): The refill rate, in tokens per second.
+            capacity (float, optional): The maximum number of stored tokens. Defaults to 1.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens=1.0):
+        """
+        Waits until the given number of tokens is available and takes them.
+
+        Args:
+            tokens (float, optional): The number of tokens to take. Defaults to 1.
+        """
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+async def with_backoff(call, max_attempts=6, base_delay=1.0, max_delay=60.0):
+    """
+    Awaits call(), retrying retryable failures with exponential backoff and full jitter.
+
+    Args:
+        call (callable): Returns a new awaitable on every call.
+        max_attempts (int, optional): The maximum number of attempts. Defaults to 6.
+        base_delay (float, optional): The delay cap after the first failure, in seconds. Defaults to 1.
+        max_delay (float, optional): The largest delay cap, in seconds. Defaults to 60.
 
-MODEL_TO_USE = get_available_model(DESIRED_MODEL)
+    Returns:
+        object: The result of the first successful attempt.
+    """
+    for attempt in range(max_attempts):
+        try:
+            return await call()
+        except RetryableError as e:
+            if attempt == max_attempts - 1:
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            print(f"Retryable error ({e}); retrying in {delay:.1f}s.")
+            await asyncio.sleep(delay)
 
-def get_questions_for_category(category, num_questions):
+def build_prompt(category, num_questions):
     """
-    Call the OpenAI API to generate a pipe-delimited formatted string containing
-    num_questions interview questions for the given category.
+    Builds the prompt asking for num_questions pipe-delimited interview questions.
     Expected output columns: ID | Category | Question | Answer | Difficulty (no header).
     """
-    prompt = (
+    return (
         f"You are a helpful assistant that generates interview questions. Please generate {num_questions} unique interview questions for the category \"{category}\". "
         "For each question, output a single record using the delimiter \" | \" (a pipe surrounded by spaces) to separate the fields. The fields must be in the following order: ID, Category, Question, Answer, Difficulty. "
         "Requirements:\n"
@@ -58,23 +240,6 @@ def get_questions_for_category(category, num_questions):
         "Output the records exactly as specified."
     )
 
-    try:
-        response = openai.ChatCompletion.create(
-            model=MODEL_TO_USE,
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-        )
-    except Exception as e:
-        print("API call failed:", e)
-        sys.exit(1)
-
-    text = response.choices[0].message.content.strip()
-    print("Received output from API.")
-    return text
-
 def parse_csv_output(output_text):
     """
     Parse the pipe-delimited output text and return a list of rows.
@@ -88,98 +253,220 @@ def parse_csv_output(output_text):
             rows.append(parts[:5])
     return rows
 
-def save_progress(questions, csv_filename=CSV_FILENAME):
+class CsvJournal:
     """
-    Save the current list of questions to a CSV file.
-    Overwrites the file with the entire progress.
+    An append-only CSV of generated questions that survives crashes.
+
+    Each batch is appended with a single write and fsynced, so saving costs O(batch)
+    instead of rewriting the whole file, and a restart resumes from whatever reached the
+    disk. A line cut short by a crash is dropped when the journal is reopened. IDs are
+    assigned in append order.
+
+    Attributes:
+        filename (str): The CSV path.
+        progress (dict): The number of saved questions per category.
+        next_id (int): The ID of the next appended question.
     """
-    with open(csv_filename, mode="w", newline="", encoding="utf-8") as csvfile:
-        fieldnames = ["ID", "Category", "Question", "Answer", "Difficulty"]
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for question in questions:
-            writer.writerow(question)
-    print(f"Progress saved: {len(questions)} questions written to {csv_filename}")
+    def __init__(self, filename=CSV_FILENAME):
+        """
+        Opens the journal, reading the progress of an earlier run.
+
+        Args:
+            filename (str, optional): The CSV path. Defaults to CSV_FILENAME.
+        """
+        self.filename = filename
+        self.progress = {}
+        count = 0
+        if os.path.exists(filename):
+            with open(filename, mode="rb+") as f:
+                self._drop_partial_line(f)
+            # One streaming pass recovers the progress; the file is never held in memory.
+            with open(filename, mode="r", newline="", encoding="utf-8") as csvfile:
+                for row in csv.DictReader(csvfile):
+                    count += 1
+                    self.progress[row["Category"]] = self.progress.get(row["Category"], 0) + 1
+        self.next_id = count + 1
+        new_file = not os.path.exists(filename) or os.path.getsize(filename) == 0
+        self._file = open(filename, mode="a", newline="", encoding="utf-8")
+        if new_file:
+            self._file.write(self._format([], header=True))
+            self._sync()
+
+    @staticmethod
+    def _drop_partial_line(f, chunk_size=1 << 16):
+        # Only the tail is read: the last newline is searched backwards a chunk at a time,
+        # so reopening costs O(chunk) however large the journal has grown.
+        end = f.seek(0, os.SEEK_END)
+        if not end:
+            return
+        f.seek(end - 1)
+        if f.read(1) == b"\n":
+            return
+        position = end
+        while position > 0:
+            start = max(0, position - chunk_size)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline >= 0:
+                f.truncate(start + newline + 1)
+                return
+            position = start
+        f.truncate(0)
+
+    def _format(self, records, header=False):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=FIELDNAMES)
+        if header:
+            writer.writeheader()
+        writer.writerows(records)
+        return buffer.getvalue()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
 
-def load_existing_progress(csv_filename=CSV_FILENAME):
+    def append(self, category, rows):
+        """
+        Appends a batch of parsed rows and forces it to disk.
+
+        Args:
+            category (str): The category of the batch.
+            rows (list): Rows as returned by `parse_csv_output`.
+        """
+        records = []
+        for row in rows:
+            records.append({
+                "ID": str(self.next_id),
+                "Category": category,
+                "Question": row[2],
+                "Answer": row[3],
+                "Difficulty": row[4]
+            })
+            self.next_id += 1
+        self._file.write(self._format(records))
+        self._sync()
+        self.progress[category] = self.progress.get(category, 0) + len(rows)
+
+    def close(self):
+        """
+        Closes the journal file.
+        """
+        self._file.close()
+
+async def generate_batch(client, limiter, category, batch_size, max_attempts=5):
     """
-    Load existing questions from CSV and return them along with a dictionary mapping
-    each category to the number of questions already generated.
+    Requests questions for one category batch until it is full or attempts run out.
+
+    Args:
+        client (object): An LLM client with an async `complete(prompt)` method.
+        limiter (TokenBucket): The shared rate limiter.
+        category (str): The category.
+        batch_size (int): The number of questions in the batch.
+        max_attempts (int, optional): The number of consecutive empty replies tolerated. Defaults to 5.
+
+    Returns:
+        list: The parsed rows, at most batch_size of them.
     """
-    questions = []
-    progress = {cat: 0 for cat in categories}
-    if os.path.exists(csv_filename):
-        with open(csv_filename, mode="r", newline="", encoding="utf-8") as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                questions.append(row)
-                cat = row["Category"]
-                if cat in progress:
-                    progress[cat] += 1
-    return questions, progress
+    async def request(missing):
+        await limiter.acquire()
+        return await client.complete(build_prompt(category, missing))
 
-def main():
-    all_questions, progress = load_existing_progress()
-    next_id = len(all_questions) + 1
+    batch_questions = []
+    attempts = 0
+    while len(batch_questions) < batch_size and attempts < max_attempts:
+        missing = batch_size - len(batch_questions)
+        rows = parse_csv_output(await with_backoff(lambda: request(missing)))
+        if not rows:
+            attempts += 1
+            print(f"No valid data received for '{category}', retrying...")
+            continue
+        batch_questions.extend(rows[:missing])
+        attempts = 0
+    return batch_questions
+
+async def run(client, journal, categories=categories, batch_size=BATCH_SIZE, concurrency=4, rate=1.0, burst=2):
+    """
+    Generates the missing batches of every category with several batches in flight.
 
+    Args:
+        client (object): An LLM client with an async `complete(prompt)` method.
+        journal (CsvJournal): Where batches are appended; its progress decides what is missing.
+        categories (dict, optional): The number of questions wanted per category.
+        batch_size (int, optional): The number of questions per batch. Defaults to BATCH_SIZE.
+        concurrency (int, optional): The maximum number of batches in flight. Defaults to 4.
+        rate (float, optional): The maximum number of API requests per second. Defaults to 1.
+        burst (int, optional): The number of requests that may be sent back to back. Defaults to 2.
+
+    Returns:
+        int: The number of questions appended.
+    """
+    limiter = TokenBucket(rate, burst)
+    queue = asyncio.Queue()
     for category, total in categories.items():
-        already = progress.get(category, 0)
-        if already >= total:
+        already = journal.progress.get(category, 0)
+        num_batches = total // batch_size
+        completed_batches = already // batch_size
+        if completed_batches >= num_batches:
             print(f"Category '{category}' is already complete with {already} questions.")
-            continue
+        else:
+            print(f"'{category}': {completed_batches} of {num_batches} batches done, queueing the rest.")
+        for batch in range(completed_batches, num_batches):
+            queue.put_nowait((category, batch, num_batches))
 
-        num_batches = total // BATCH_SIZE
-        completed_batches = already // BATCH_SIZE
-        print(f"\nStarting category: {category} (Total: {total} questions in {num_batches} batches)")
-        print(f"{completed_batches} batches completed for '{category}'. Resuming remaining batches...")
+    appended = 0
 
-        for batch in range(completed_batches, num_batches):
-            batch_questions = []
-            attempts = 0
-            max_attempts = 5
-            print(f"\nStarting batch {batch+1} of {num_batches} for '{category}' (current questions in batch: {len(batch_questions)})")
-            
-            while len(batch_questions) < BATCH_SIZE and attempts < max_attempts:
-                missing = BATCH_SIZE - len(batch_questions)
-                print(f"Generating {missing} questions for '{category}' (current batch count: {len(batch_questions)}); attempt {attempts+1}")
-                
-                output = get_questions_for_category(category, missing)
-                rows = parse_csv_output(output)
-                
-                if not rows:
-                    attempts += 1
-                    print("No valid data received from API call, retrying...")
-                    time.sleep(1.3)
-                    continue
-                
-                for row in rows:
-                    if len(batch_questions) >= BATCH_SIZE:
-                        break
-                    batch_questions.append(row)
-                attempts = 0
-                time.sleep(2)
-            
-            if len(batch_questions) < BATCH_SIZE:
-                print(f"Warning: Batch {batch+1} for '{category}' completed with only {len(batch_questions)} questions due to repeated failures.")
-            
-            for row in batch_questions:
-                row[0] = str(next_id)
-                next_id += 1
-                row[1] = category
-                question_dict = {
-                    "ID": row[0],
-                    "Category": row[1],
-                    "Question": row[2],
-                    "Answer": row[3],
-                    "Difficulty": row[4]
-                }
-                all_questions.append(question_dict)
-            
-            print(f"Batch {batch+1} for '{category}' complete. Total questions so far for this category: {already + (batch - completed_batches + 1) * BATCH_SIZE}")
-            
-            save_progress(all_questions)
-
-    print("\nAll batches complete.")
+    async def worker():
+        nonlocal appended
+        while True:
+            try:
+                category, batch, num_batches = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            rows = await generate_batch(client, limiter, category, batch_size)
+            if len(rows) < batch_size:
+                print(f"Warning: Batch {batch+1} for '{category}' completed with only {len(rows)} questions due to repeated failures.")
+            journal.append(category, rows)
+            appended += len(rows)
+            print(f"Batch {batch+1} of {num_batches} for '{category}' saved ({journal.progress[category]} questions).")
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return appended
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate interview questions with an LLM, resuming from the CSV.")
+    parser.add_argument("--output", default=CSV_FILENAME)
+    parser.add_argument("--base-url", help="An OpenAI-compatible API base URL (e.g. a local stub). "
+                                           "Defaults to the openai package.")
+    parser.add_argument("--model", default=DESIRED_MODEL)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=4, help="Category batches in flight.")
+    parser.add_argument("--rate", type=float, default=1.0, help="API requests per second.")
+    parser.add_argument("--burst", type=int, default=2, help="Requests that may be sent back to back.")
+    parser.add_argument("--dedup", metavar="PATH", help="Also write a copy without exact and near-duplicate questions to PATH.")
+    args = parser.parse_args()
+
+    api_key = os.environ.get("OPENAI_API_KEY", "api_key")
+    if args.base_url:
+        client = ChatCompletionsClient(args.base_url, api_key, args.model)
+    else:
+        client = OpenAIClient(api_key, args.model)
+        try:
+            client.select_model(args.model)
+        except Exception as e:
+            print("Error retrieving available models:", e)
+            sys.exit(1)
+
+    journal = CsvJournal(args.output)
+    try:
+        appended = asyncio.run(run(client, journal, categories, args.batch_size, args.concurrency, args.rate, args.burst))
+    finally:
+        journal.close()
+    print(f"\nAll batches complete. {appended} questions appended to {args.output}.")
+
+    if args.dedup:
+        stats = dedup_csv(args.output, args.dedup)
+        print(f"Deduplicated {stats['rows']} questions into {args.dedup}: kept {stats['kept']}, "
+              f"dropped {stats['exact']} exact and {stats['near']} near duplicates.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,290 @@
+import hashlib
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+def cache_key(encoded, model_version):
+    """
+    Computes the cache key of an encoded sentence for a model version.
+
+    The key hashes the token ids rather than the text, so texts that only differ in case,
+    whitespace or out-of-vocabulary words share an entry. Including the model version means
+    entries of a previous model are never returned after the model changes.
+
+    Args:
+        encoded (np.ndarray): The encoded sentence (shape: [max_len]).
+        model_version (str): The version of the model that produced the result.
+
+    Returns:
+        str: The hex key.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(model_version.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(np.ascontiguousarray(encoded, dtype=np.int32).tobytes())
+    return digest.hexdigest()
+
+class ResultCache:
+    """
+    An in-process LRU cache of prediction results with an optional time to live.
+
+    Attributes:
+        max_entries (int): The maximum number of cached results.
+        ttl (float): The number of seconds a result stays valid, or None for no expiry.
+        hits (int): The number of lookups that found a valid result.
+        misses (int): The number of lookups that did not.
+    """
+    def __init__(self, max_entries=4096, ttl=None):
+        """
+        Initializes an empty cache.
+
+        Args:
+            max_entries (int, optional): The maximum number of cached results. Defaults to 4096.
+            ttl (float, optional): The number of seconds a result stays valid. Defaults to no expiry.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Looks up a result and marks it as recently used.
+
+        Args:
+            key (str): The key returned by `cache_key`.
+
+        Returns:
+            np.ndarray: The read-only cached probabilities, or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, probs):
+        """
+        Stores a result, evicting the least recently used one if the cache is full.
+
+        Args:
+            key (str): The key returned by `cache_key`.
+            probs (np.ndarray): The class probabilities (shape: [num_classes]).
+        """
+        probs = np.array(probs)
+        probs.flags.writeable = False
+        with self._lock:
+            self._entries[key] = (probs, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Drops every cached result.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class SQLiteResultCache:
+    """
+    A prediction result cache stored in an SQLite database shared by several processes.
+
+    Every gunicorn worker opening the same file sees the results the others computed.
+    Entries carry their last-use time, and the least recently used ones are evicted in
+    batches once the table grows past `max_entries`. Each thread gets its own connection,
+    and a process forked from one that used the cache (e.g. a gunicorn worker started with
+    --preload) opens new connections instead of using the inherited ones.
+
+    A hit only writes when the entry's last-use time is older than `touch_interval`, so
+    most lookups never take the database write lock. SQLite errors (such as "database is
+    locked" under write contention) never reach the caller: a failed lookup counts as a
+    miss and a failed store is skipped.
+
+    Attributes:
+        path (str): The database file.
+        max_entries (int): The maximum number of cached results.
+        ttl (float): The number of seconds a result stays valid, or None for no expiry.
+        touch_interval (float): The number of seconds between updates of an entry's last-use time.
+        hits (int): The number of lookups in this process that found a valid result.
+        misses (int): The number of lookups in this process that did not.
+        errors (int): The number of lookups and stores in this process that failed with an SQLite error.
+    """
+    def __init__(self, path, max_entries=100000, ttl=None, touch_interval=60.0):
+        """
+        Opens (and creates if needed) the cache database.
+
+        Args:
+            path (str): The database file.
+            max_entries (int, optional): The maximum number of cached results. Defaults to 100000.
+            ttl (float, optional): The number of seconds a result stays valid. Defaults to no expiry.
+            touch_interval (float, optional): The number of seconds between updates of an
+                entry's last-use time. Defaults to 60.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._local = threading.local()
+        self._puts = itertools.count(1)
+        self._last_len = 0
+        self._stats_lock = threading.Lock()
+        self._inherited = []
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # The schema is created on a short-lived connection, so a cache built at import
+        # time (app.py) leaves no connection for forked workers to inherit.
+        conn = self._connect()
+        try:
+            conn.execute("CREATE TABLE IF NOT EXISTS results "
+                         "(key TEXT PRIMARY KEY, probs BLOB NOT NULL, stored REAL NOT NULL, used REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        pid = os.getpid()
+        if conn is not None and self._local.pid != pid:
+            # SQLite connections must not be used across fork(). Closing the inherited one
+            # could disturb the parent's locks, so it is only kept from being finalized.
+            self._inherited.append(conn)
+            conn = None
+        if conn is None:
+            conn = self._connect()
+            self._local.conn, self._local.pid = conn, pid
+        return conn
+
+    def _count(self, name):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, key):
+        """
+        Looks up a result and marks it as recently used.
+
+        Expired entries count as misses and are left for `put` to replace or the eviction
+        to remove, so a lookup only writes to refresh a stale last-use time.
+
+        Args:
+            key (str): The key returned by `cache_key`.
+
+        Returns:
+            np.ndarray: The read-only cached probabilities, or None on a miss or an SQLite error.
+        """
+        try:
+            conn = self._connection()
+            row = conn.execute("SELECT probs, stored, used FROM results WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error:
+            self._count("errors")
+            row = None
+        now = time.time()
+        if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+            row = None
+        if row is None:
+            self._count("misses")
+            return None
+        if now - row[2] > self.touch_interval:
+            # A failed refresh only makes the entry look older to the eviction.
+            try:
+                conn.execute("UPDATE results SET used = ? WHERE key = ?", (now, key))
+            except sqlite3.Error:
+                self._count("errors")
+        self._count("hits")
+        return np.frombuffer(row[0], dtype=np.float64)
+
+    def put(self, key, probs):
+        """
+        Stores a result and periodically evicts the least recently used ones.
+
+        The result is not stored if the database reports an error.
+
+        Args:
+            key (str): The key returned by `cache_key`.
+            probs (np.ndarray): The class probabilities (shape: [num_classes]).
+        """
+        blob = np.ascontiguousarray(probs, dtype=np.float64).tobytes()
+        try:
+            self._store(key, blob)
+        except sqlite3.Error:
+            self._count("errors")
+
+    def _store(self, key, blob):
+        conn = self._connection()
+        now = time.time()
+        conn.execute("INSERT OR REPLACE INTO results (key, probs, stored, used) VALUES (?, ?, ?, ?)",
+                     (key, blob, now, now))
+        # Counting rows on every insert would dominate, so the size is checked every so often
+        # and trimmed to 90% of the limit.
+        if next(self._puts) % 256 == 0:
+            count = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            if count > self.max_entries:
+                conn.execute("DELETE FROM results WHERE key IN "
+                             "(SELECT key FROM results ORDER BY used LIMIT ?)",
+                             (count - int(self.max_entries * 0.9),))
+
+    def clear(self):
+        """
+        Drops every cached result, for all processes. Nothing is dropped if the database
+        reports an error.
+        """
+        try:
+            self._connection().execute("DELETE FROM results")
+        except sqlite3.Error:
+            self._count("errors")
+
+    def __len__(self):
+        # Backs the entries gauge, so an SQLite error reports the last known count.
+        try:
+            self._last_len = self._connection().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        except sqlite3.Error:
+            self._count("errors")
+        return self._last_len
+
+def cached_predict(cache, predict_fn, X, model_version):
+    """
+    Predicts a batch, reusing cached results and caching the new ones.
+
+    Args:
+        cache (ResultCache or SQLiteResultCache): The result cache.
+        predict_fn (callable): A batched prediction function, e.g. `TextCNN.predict`.
+        X (np.ndarray): The encoded sentences (shape: [batch_size, max_len]).
+        model_version (str): The version of the model behind predict_fn.
+
+    Returns:
+        np.ndarray: The probabilities for each sentence (shape: [batch_size, num_classes]).
+    """
+    keys = [cache_key(x, model_version) for x in X]
+    cached = [cache.get(key) for key in keys]
+    missing = [i for i, probs in enumerate(cached) if probs is None]
+    if missing:
+        preds = predict_fn(X[missing])
+        for i, probs in zip(missing, preds):
+            cache.put(keys[i], probs)
+            cached[i] = probs
+    return np.stack(cached)
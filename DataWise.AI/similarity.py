@@ -0,0 +1,362 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from itertools import islice
+import numpy as np
+
+from artifact import load_artifact
+from data_utils import iter_records
+from dataset_cache import file_digest
+from tokenizer import Encoder
+
+INDEX_VERSION = 1
+
+def normalize_rows(features):
+    """
+    Scales feature vectors to unit length, so inner products are cosine similarities.
+
+    Args:
+        features (np.ndarray): The feature vectors (shape: [num_vectors, dim]).
+
+    Returns:
+        np.ndarray: The normalized float32 vectors; all-zero vectors stay zero.
+    """
+    features = np.asarray(features, dtype=np.float32)
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    return features / np.maximum(norms, np.float32(1e-12))
+
+def _select_top_k(scores, ids, k):
+    # Keeps the k largest scores of each row (unordered) with their ids.
+    if scores.shape[1] <= k:
+        return scores, ids
+    part = np.argpartition(scores, scores.shape[1] - k, axis=1)[:, -k:]
+    return np.take_along_axis(scores, part, axis=1), np.take_along_axis(ids, part, axis=1)
+
+def _sort_top_k(scores, ids):
+    order = np.argsort(-scores, axis=1, kind="stable")
+    return np.take_along_axis(ids, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+def top_k_blocked(features, queries, k, block_size=65536):
+    """
+    Finds the k rows of a feature matrix with the largest inner product with each query.
+
+    The matrix is scanned in blocks of rows, one matrix product per block, and only the
+    running top k of every query is kept, so a memory-mapped matrix is streamed from disk
+    and the temporary scores never exceed [num_queries, block_size].
+
+    Args:
+        features (np.ndarray): The feature matrix (shape: [num_rows, dim]).
+        queries (np.ndarray): The query vectors (shape: [num_queries, dim]).
+        k (int): The number of rows to return per query.
+        block_size (int, optional): The number of rows scored at a time. Defaults to 65536.
+
+    Returns:
+        tuple: A tuple containing:
+            - rows (np.ndarray): The row indices, best first (shape: [num_queries, min(k, num_rows)]).
+            - scores (np.ndarray): Their inner products with the query.
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+    best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+    for start in range(0, len(features), block_size):
+        block = np.asarray(features[start:start + block_size])
+        scores = queries @ block.T
+        rows = np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+        scores, rows = _select_top_k(scores, rows, k)
+        best_scores, best_rows = _select_top_k(np.concatenate([best_scores, scores], axis=1),
+                                               np.concatenate([best_rows, rows], axis=1), k)
+    return _sort_top_k(best_scores, best_rows)
+
+def train_ivf(features, nlist, iterations=10, sample_size=None, block_size=65536, seed=0):
+    """
+    Clusters unit feature vectors with spherical k-means for an inverted file (IVF) index.
+
+    Args:
+        features (np.ndarray): The normalized feature matrix (shape: [num_rows, dim]).
+        nlist (int): The number of clusters (inverted lists).
+        iterations (int, optional): The number of k-means iterations. Defaults to 10.
+        sample_size (int, optional): The number of rows the centroids are trained on.
+            Defaults to 64 per list.
+        block_size (int, optional): The number of rows assigned at a time. Defaults to 65536.
+        seed (int, optional): The seed of the sampling and initialization. Defaults to 0.
+
+    Returns:
+        tuple: A tuple containing:
+            - centroids (np.ndarray): The unit centroids (shape: [nlist, dim]).
+            - assignments (np.ndarray): The list of every row (shape: [num_rows]).
+    """
+    def assign(rows):
+        # Scored a block at a time, so the [rows, nlist] similarities stay small.
+        assignments = np.empty(len(rows), dtype=np.int64)
+        for start in range(0, len(rows), block_size):
+            assignments[start:start + block_size] = np.argmax(np.asarray(rows[start:start + block_size]) @ centroids.T, axis=1)
+        return assignments
+
+    rng = np.random.default_rng(seed)
+    n = len(features)
+    block_size = max(1, min(block_size, (1 << 24) // nlist))
+    sample_size = min(n, sample_size or 64 * nlist)
+    sample = np.asarray(features[np.sort(rng.choice(n, sample_size, replace=False))])
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = assign(sample)
+        counts = np.bincount(assignments, minlength=nlist)
+        order = np.argsort(assignments, kind="stable")
+        sums = np.zeros_like(centroids)
+        filled = counts > 0
+        sums[filled] = np.add.reduceat(sample[order], np.concatenate(([0], np.cumsum(counts)[:-1]))[filled])
+        empty = ~filled
+        # Empty lists are re-seeded with random sample rows.
+        sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+        centroids = normalize_rows(sums)
+    return centroids, assign(features)
+
+class SimilarityIndex:
+    """
+    A memory-mapped index of normalized exercise feature vectors.
+
+    The index directory holds the feature matrix (float32, unit rows), the item id of each
+    row, the exercise texts as one UTF-8 blob with offsets, the labels, and optionally IVF
+    centroids with the rows sorted by list. Arrays are opened with mmap_mode="r", so
+    loading is immediate and the pages are shared by every worker process.
+
+    Attributes:
+        directory (str): The index directory.
+        manifest (dict): The index metadata ("model_version", "count", "dim", "nlist", "nprobe", ...).
+        features (np.ndarray): The feature matrix, rows in list order.
+        ids (np.ndarray): The item id of each feature row.
+        centroids (np.ndarray): The IVF centroids, or None without IVF.
+        offsets (np.ndarray): The first row of each inverted list, plus the row count.
+    """
+    def __init__(self, directory, manifest, features, ids, text_offsets, texts, label_ids, centroids=None, offsets=None):
+        self.directory = directory
+        self.manifest = manifest
+        self.features = features
+        self.ids = ids
+        self.centroids = centroids
+        self.offsets = offsets
+        self._text_offsets = text_offsets
+        self._texts = texts
+        self._label_ids = label_ids
+        self._labels = manifest.get("labels", [])
+
+    @classmethod
+    def load(cls, directory="models/similar"):
+        """
+        Opens an index written by `build_index`.
+
+        Args:
+            directory (str, optional): The index directory. Defaults to "models/similar".
+
+        Returns:
+            SimilarityIndex: The index.
+        """
+        with open(os.path.join(directory, "index.json"), "r") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported similarity index version {manifest.get('version')} in {directory}.")
+        arrays = {}
+        for name in ("features", "ids", "text_offsets", "label_ids", "centroids", "offsets"):
+            path = os.path.join(directory, f"{name}.npy")
+            arrays[name] = np.load(path, mmap_mode="r") if os.path.exists(path) else None
+        texts = np.memmap(os.path.join(directory, "texts.bin"), dtype=np.uint8, mode="r") \
+            if os.path.getsize(os.path.join(directory, "texts.bin")) else np.zeros(0, dtype=np.uint8)
+        return cls(directory, manifest, texts=texts, **arrays)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nlist(self):
+        """
+        int: The number of inverted lists, 0 without IVF.
+        """
+        return 0 if self.centroids is None else len(self.centroids)
+
+    def search(self, queries, k=5, nprobe=None, block_size=65536):
+        """
+        Finds the k items most similar to each query.
+
+        Args:
+            queries (np.ndarray): Normalized query vectors (shape: [num_queries, dim]).
+            k (int, optional): The number of items per query. Defaults to 5.
+            nprobe (int, optional): The number of inverted lists scanned per query; 0 scans
+                every row exactly. Defaults to the manifest's "nprobe".
+            block_size (int, optional): The rows scored at a time by an exact scan. Defaults to 65536.
+
+        Returns:
+            tuple: A tuple containing:
+                - ids (np.ndarray): The item ids, best first (shape: [num_queries, min(k, len(self))]).
+                - scores (np.ndarray): Their cosine similarities.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        nprobe = self.manifest.get("nprobe", 0) if nprobe is None else nprobe
+        if not self.nlist or nprobe <= 0 or nprobe >= self.nlist:
+            rows, scores = top_k_blocked(self.features, queries, k, block_size)
+            return np.asarray(self.ids)[rows], scores
+
+        probes = _select_top_k(queries @ self.centroids.T,
+                               np.broadcast_to(np.arange(self.nlist), (len(queries), self.nlist)), nprobe)[1]
+        all_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        all_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for i, lists in enumerate(probes):
+            rows = np.concatenate([np.arange(self.offsets[l], self.offsets[l + 1]) for l in np.sort(lists)])
+            scores = (np.asarray(self.features[rows]) @ queries[i])[None, :]
+            scores, rows = _select_top_k(scores, rows[None, :], k)
+            rows, scores = _sort_top_k(scores, rows)
+            all_ids[i, :rows.shape[1]] = np.asarray(self.ids)[rows[0]]
+            all_scores[i, :rows.shape[1]] = scores[0]
+        return all_ids, all_scores
+
+    def item(self, item_id):
+        """
+        Returns the exercise stored for an item id.
+
+        Args:
+            item_id (int): The item id, i.e. the position of the exercise in the source corpus.
+
+        Returns:
+            dict: The "exercise" text and its "label" (None if the corpus had none).
+        """
+        start, stop = int(self._text_offsets[item_id]), int(self._text_offsets[item_id + 1])
+        label_id = int(self._label_ids[item_id])
+        return {"exercise": bytes(self._texts[start:stop]).decode("utf-8"),
+                "label": self._labels[label_id] if label_id >= 0 else None}
+
+def build_index(model, encoder, records, directory="models/similar", model_version=None, nlist=0, nprobe=8,
+                chunk_size=1024, iterations=10, seed=0):
+    """
+    Computes, normalizes and persists the feature vectors of a corpus.
+
+    The records are streamed: each chunk is encoded and run through `TextCNN.features`,
+    and its vectors and texts are appended to disk. With nlist > 0 the vectors are then
+    clustered into an IVF index and rewritten in list order. The index is written to a
+    temporary directory that replaces `directory` once complete.
+
+    Args:
+        model (TextCNN): The model whose features are indexed.
+        encoder (Encoder): The encoder for the model's vocabulary.
+        records (iterable): Data items with an "Exercise" and an optional "Label".
+        directory (str, optional): The index directory. Defaults to "models/similar".
+        model_version (str, optional): Recorded in the manifest so a server can refuse an
+            index built for another model. Defaults to none.
+        nlist (int, optional): The number of IVF lists, 0 for exact search only. Defaults to 0.
+        nprobe (int, optional): The default number of lists scanned per query. Defaults to 8.
+        chunk_size (int, optional): The number of exercises encoded at a time. Defaults to 1024.
+        iterations (int, optional): The number of k-means iterations. Defaults to 10.
+        seed (int, optional): The k-means seed. Defaults to 0.
+
+    Returns:
+        dict: The manifest of the new index.
+    """
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix=".tmp-similar-")
+    try:
+        labels, label_ids, text_offsets = {}, [], [0]
+        count, dim = 0, model.fc_input_dim
+        raw_path = os.path.join(tmp_dir, "features.f32")
+        with open(raw_path, "wb") as raw, open(os.path.join(tmp_dir, "texts.bin"), "wb") as texts:
+            records = iter(records)
+            while True:
+                chunk = list(islice(records, chunk_size))
+                if not chunk:
+                    break
+                sentences = [item["Exercise"] for item in chunk]
+                raw.write(normalize_rows(model.features(encoder.encode_batch(sentences))).tobytes())
+                for item, sentence in zip(chunk, sentences):
+                    data = sentence.encode("utf-8")
+                    texts.write(data)
+                    text_offsets.append(text_offsets[-1] + len(data))
+                    label = item.get("Label")
+                    label_ids.append(-1 if label is None else labels.setdefault(label, len(labels)))
+                count += len(chunk)
+        np.save(os.path.join(tmp_dir, "text_offsets.npy"), np.array(text_offsets, dtype=np.int64))
+        np.save(os.path.join(tmp_dir, "label_ids.npy"), np.array(label_ids, dtype=np.int32))
+
+        features = np.memmap(raw_path, dtype=np.float32, mode="r", shape=(count, dim)) if count else np.zeros((0, dim), np.float32)
+        nlist = min(nlist, count)
+        if nlist > 0:
+            centroids, assignments = train_ivf(features, nlist, iterations, seed=seed)
+            ids = np.argsort(assignments, kind="stable")
+            offsets = np.concatenate(([0], np.cumsum(np.bincount(assignments, minlength=nlist))))
+            np.save(os.path.join(tmp_dir, "centroids.npy"), centroids)
+            np.save(os.path.join(tmp_dir, "offsets.npy"), offsets.astype(np.int64))
+        else:
+            ids = np.arange(count)
+        out = np.lib.format.open_memmap(os.path.join(tmp_dir, "features.npy"), mode="w+", dtype=np.float32,
+                                        shape=(count, dim))
+        for start in range(0, count, 65536):
+            out[start:start + 65536] = features[ids[start:start + 65536]]
+        out.flush()
+        del out, features
+        os.remove(raw_path)
+        np.save(os.path.join(tmp_dir, "ids.npy"), ids.astype(np.int64))
+
+        manifest = {
+            "version": INDEX_VERSION,
+            "model_version": model_version,
+            "count": count,
+            "dim": dim,
+            "nlist": nlist,
+            "nprobe": nprobe if nlist > 0 else 0,
+            "labels": sorted(labels, key=labels.get),
+            "created": time.time(),
+        }
+        with open(os.path.join(tmp_dir, "index.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        # Swap the directories; an older index is only removed once the new one is in place.
+        old_dir = None
+        if os.path.isdir(directory):
+            old_dir = tempfile.mkdtemp(dir=parent, prefix=".old-similar-")
+            os.replace(directory, os.path.join(old_dir, "index"))
+        os.replace(tmp_dir, directory)
+        if old_dir:
+            shutil.rmtree(old_dir, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return manifest
+
+def query_vectors(model, encoder, texts):
+    """
+    Computes the normalized feature vectors of query texts.
+
+    Args:
+        model (TextCNN): The model the index was built with.
+        encoder (Encoder): The encoder for the model's vocabulary.
+        texts (list): The query texts.
+
+    Returns:
+        np.ndarray: The unit query vectors (shape: [len(texts), fc_input_dim]).
+    """
+    return normalize_rows(model.features(encoder.encode_batch(texts)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the similar-exercise index of a corpus.")
+    parser.add_argument("input", nargs="?", default="exercises.json",
+                        help="A {\"data\": [...]} JSON file, a .jsonl/.ndjson file or a directory of JSONL shards.")
+    parser.add_argument("--model", default="models/cnn_model.bin")
+    parser.add_argument("--word2idx", default="word2idx.json")
+    parser.add_argument("--max-len", type=int, default=42)
+    parser.add_argument("--out", default="models/similar")
+    parser.add_argument("--nlist", type=int, default=None,
+                        help="IVF lists; defaults to sqrt(count) above 50000 exercises, otherwise exact search only.")
+    parser.add_argument("--nprobe", type=int, default=8)
+    args = parser.parse_args()
+
+    model = load_artifact(args.model)
+    encoder = Encoder.load(args.word2idx, args.max_len)
+    nlist = args.nlist
+    if nlist is None:
+        count = sum(1 for _ in iter_records(args.input))
+        nlist = int(np.sqrt(count)) if count > 50000 else 0
+    start = time.perf_counter()
+    manifest = build_index(model, encoder, iter_records(args.input), args.out, file_digest(args.model)[:12],
+                           nlist, args.nprobe)
+    print(f"Indexed {manifest['count']} exercises ({manifest['dim']} dims, {manifest['nlist']} IVF lists) "
+          f"into {args.out} in {time.perf_counter() - start:.1f}s.")
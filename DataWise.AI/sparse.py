@@ -0,0 +1,82 @@
+import numpy as np
+
+def segment_sum(ids, values):
+    """
+    Sums the rows of values that share the same id (sorted-segment sum).
+
+    Args:
+        ids (np.ndarray): Integer ids of any shape, one per row of values.
+        values (np.ndarray): The rows to sum (shape: [*ids.shape, dim]).
+
+    Returns:
+        tuple: A tuple containing:
+            - unique_ids (np.ndarray): The sorted distinct ids (shape: [n_unique]).
+            - rows (np.ndarray): The summed rows for each distinct id (shape: [n_unique, dim]).
+    """
+    ids = ids.ravel()
+    values = values.reshape(ids.size, -1)
+    order = np.argsort(ids, kind="stable")
+    sorted_ids = ids[order]
+    starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+    rows = np.add.reduceat(values[order], starts, axis=0)
+    return sorted_ids[starts], rows
+
+class RowState:
+    """
+    Optimizer state for a large table that is allocated lazily, one row at a time.
+
+    Rows of the parameter table get a slot the first time they receive a gradient, so
+    the state grows with the number of distinct rows actually updated instead of the
+    size of the table.
+
+    Attributes:
+        names (tuple): The names of the state arrays kept per row.
+        dim (int): The width of each state row.
+        slot_of (np.ndarray): Maps a table row to its slot index, or -1 if not allocated.
+        size (int): The number of allocated slots.
+        arrays (dict): The state arrays, one [capacity, dim] array per name.
+        steps (np.ndarray): The number of updates applied to each slot.
+    """
+    def __init__(self, num_rows, dim, names, dtype=np.float64):
+        """
+        Initializes an empty state table.
+
+        Args:
+            num_rows (int): The number of rows in the parameter table.
+            dim (int): The width of each parameter row.
+            names (tuple): The names of the state arrays to keep per row.
+            dtype (np.dtype, optional): The dtype of the state arrays. Defaults to np.float64.
+        """
+        self.names = tuple(names)
+        self.dim = dim
+        self.slot_of = np.full(num_rows, -1, dtype=np.int64)
+        self.size = 0
+        self.arrays = {name: np.zeros((0, dim), dtype=dtype) for name in self.names}
+        self.steps = np.zeros(0, dtype=np.int64)
+
+    def slots(self, ids):
+        """
+        Returns the slots for the given rows, allocating zeroed slots for rows seen for the first time.
+
+        Args:
+            ids (np.ndarray): Distinct row ids.
+
+        Returns:
+            np.ndarray: The slot index of each row.
+        """
+        new_ids = ids[self.slot_of[ids] < 0]
+        if new_ids.size:
+            needed = self.size + new_ids.size
+            capacity = len(self.steps)
+            if needed > capacity:
+                capacity = max(needed, 2 * capacity)
+                for name, array in self.arrays.items():
+                    grown = np.zeros((capacity, self.dim), dtype=array.dtype)
+                    grown[:self.size] = array[:self.size]
+                    self.arrays[name] = grown
+                steps = np.zeros(capacity, dtype=np.int64)
+                steps[:self.size] = self.steps[:self.size]
+                self.steps = steps
+            self.slot_of[new_ids] = np.arange(self.size, needed)
+            self.size = needed
+        return self.slot_of[ids]
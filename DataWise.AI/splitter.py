@@ -1,123 +1,299 @@
+import argparse
+import hashlib
 import json
-import numpy as np
-import random
+import math
+import os
 from collections import Counter
 
-def load_data(filename):
+from data_utils import iter_records, tokenize
+from dedup import normalize_text
+
+class DistinctCounter:
     """
-    Loads data from a JSON file.
+    Counts distinct strings in constant memory.
 
-    Args:
-        filename (str): The path to the JSON file containing the data.
+    Values are counted exactly until `exact_limit` distinct values have been seen; from then
+    on the count is a HyperLogLog estimate (about 1% standard error with the default
+    precision), so the memory use does not grow with the vocabulary.
 
-    Returns:
-        list: A list of data objects (usually containing "Exercise" and "Label" fields).
+    Attributes:
+        precision (int): The number of hash bits that select a register.
+        exact_limit (int): The number of distinct values counted exactly.
     """
-    with open(filename, 'r') as f:
-        data = json.load(f)
-    return data['data']
+    def __init__(self, precision=14, exact_limit=100000):
+        """
+        Initializes an empty counter.
 
-def tokenize(sentence):
-    """
-    Tokenizes a sentence into lowercase words.
+        Args:
+            precision (int, optional): The number of register bits (2**precision registers). Defaults to 14.
+            exact_limit (int, optional): The number of distinct values counted exactly. Defaults to 100000.
+        """
+        self.precision = precision
+        self.exact_limit = exact_limit
+        self._registers = bytearray(1 << precision)
+        self._exact = set()
 
-    Args:
-        sentence (str): The sentence to tokenize.
+    def update(self, values):
+        """
+        Adds values to the counter.
 
-    Returns:
-        list: A list of lowercase words.
+        Args:
+            values (iterable): The strings to add.
+        """
+        rest_bits = 64 - self.precision
+        rest_mask = (1 << rest_bits) - 1
+        registers = self._registers
+        for value in set(values):
+            if self._exact is not None:
+                self._exact.add(value)
+                if len(self._exact) > self.exact_limit:
+                    self._exact = None
+            h = int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+            index, rank = h >> rest_bits, rest_bits - (h & rest_mask).bit_length() + 1
+            if rank > registers[index]:
+                registers[index] = rank
+
+    @property
+    def exact(self):
+        """
+        bool: Whether `count` is exact rather than an estimate.
+        """
+        return self._exact is not None
+
+    def count(self):
+        """
+        Returns the number of distinct values added.
+
+        Returns:
+            int: The exact count, or the HyperLogLog estimate past `exact_limit`.
+        """
+        if self._exact is not None:
+            return len(self._exact)
+        m = len(self._registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -r for r in self._registers)
+        zeros = self._registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+class DatasetStats:
     """
-    return sentence.lower().split()
+    Streaming sentence-length, vocabulary and label statistics.
 
-def analyze_data(data):
+    Only counters are kept: a histogram of sentence lengths, a label counter and a
+    `DistinctCounter` for the vocabulary, so memory does not grow with the corpus.
     """
-    Analyzes the data and computes basic statistics, such as sentence length, vocabulary size, 
-    and label distribution.
+    def __init__(self):
+        """
+        Initializes empty statistics.
+        """
+        self.count = 0
+        self.lengths = Counter()
+        self.labels = Counter()
+        self.vocab = DistinctCounter()
 
-    Args:
-        data (list): A list of data items, where each item contains an "Exercise" and a "Label".
+    def update(self, item):
+        """
+        Adds one data item.
 
-    Returns:
-        dict: A dictionary containing the following statistics:
-            - "max_sentence_length": The maximum sentence length.
-            - "avg_sentence_length": The average sentence length.
-            - "min_sentence_length": The minimum sentence length.
-            - "vocab_size": The number of unique words in the dataset.
-            - "label_distribution": A Counter object showing the distribution of labels.
-    """
-    all_tokens = []
-    sentence_lengths = []
-    labels = []
-    for item in data:
+        Args:
+            item (dict): A data item containing an "Exercise" and a "Label".
+        """
         tokens = tokenize(item["Exercise"])
-        sentence_lengths.append(len(tokens))
-        all_tokens.extend(tokens)
-        labels.append(item["Label"])
-    
-    vocab = set(all_tokens)
-    label_counter = Counter(labels)
-    
-    return {
-        "max_sentence_length": max(sentence_lengths),
-        "avg_sentence_length": np.mean(sentence_lengths),
-        "min_sentence_length": min(sentence_lengths),
-        "vocab_size": len(vocab),
-        "label_distribution": label_counter
-    }
+        self.count += 1
+        self.lengths[len(tokens)] += 1
+        self.labels[item["Label"]] += 1
+        self.vocab.update(tokens)
+
+    def length_percentile(self, q):
+        """
+        Returns a sentence-length percentile from the length histogram.
+
+        Args:
+            q (float): The percentile, between 0 and 100.
+
+        Returns:
+            int: The smallest length with at least q% of the sentences at or below it.
+        """
+        target, seen = q / 100 * self.count, 0
+        for length in sorted(self.lengths):
+            seen += self.lengths[length]
+            if seen >= target:
+                return length
+        return 0
+
+    def summary(self):
+        """
+        Summarizes the statistics.
+
+        Returns:
+            dict: A dictionary containing the following statistics:
+                - "num_examples": The number of data items.
+                - "max_sentence_length", "avg_sentence_length", "min_sentence_length"
+                  and "p95_sentence_length": Sentence length statistics, in tokens.
+                - "vocab_size": The number of unique words, and "vocab_size_exact" whether it is exact.
+                - "label_distribution": The number of items per label.
+        """
+        total = sum(length * count for length, count in self.lengths.items())
+        return {
+            "num_examples": self.count,
+            "max_sentence_length": max(self.lengths, default=0),
+            "avg_sentence_length": total / self.count if self.count else 0.0,
+            "min_sentence_length": min(self.lengths, default=0),
+            "p95_sentence_length": self.length_percentile(95),
+            "vocab_size": self.vocab.count(),
+            "vocab_size_exact": self.vocab.exact,
+            "label_distribution": dict(sorted(self.labels.items())),
+        }
 
-def train_val_split(data, val_ratio=0.2, seed=42):
+def split_bucket(item, val_ratio, seed):
     """
-    Splits the data into training and validation sets.
+    Assigns a data item to the training or validation split from a keyed hash of its text.
+
+    The hash of the normalized exercise text, keyed by the seed, is mapped to [0, 1) and
+    compared with val_ratio, so every label contributes about val_ratio of its items to
+    validation (the realized per-label ratios are reported). The decision depends only on
+    the text and the seed: it needs no shuffle, does not change when the corpus is
+    reordered or re-sharded, and keeps duplicates of an exercise in the same split.
 
     Args:
-        data (list): The dataset to split.
-        val_ratio (float, optional): The proportion of data to use for validation. Defaults to 0.2.
-        seed (int, optional): The random seed to ensure reproducibility. Defaults to 42.
+        item (dict): A data item containing an "Exercise".
+        val_ratio (float): The proportion of data to use for validation.
+        seed (int): The split seed.
 
     Returns:
-        tuple: A tuple containing two lists: (train_data, val_data).
+        str: "train" or "val".
     """
-    random.seed(seed)
-    random.shuffle(data)
-    split_index = int(len(data) * (1 - val_ratio))
-    return data[:split_index], data[split_index:]
+    digest = hashlib.blake2b(normalize_text(item["Exercise"]).encode("utf-8"), digest_size=8,
+                             key=str(seed).encode("utf-8")).digest()
+    return "val" if int.from_bytes(digest, "big") / 2.0 ** 64 < val_ratio else "train"
+
+class ShardWriter:
+    """
+    Writes records as compact JSONL into numbered shards of a fixed size.
+
+    Shards are written under a temporary name and renamed once complete, so readers never
+    see a partial shard. Shards left in the directory by an earlier run are removed.
 
-def save_data(filename, data):
+    Attributes:
+        directory (str): The output directory.
+        shard_size (int): The maximum number of records per shard.
+        num_records (int): The number of records written so far.
+        shards (list): The paths of the completed shards.
     """
-    Saves the data to a JSON file.
+    def __init__(self, directory, shard_size=100000):
+        """
+        Creates the output directory.
+
+        Args:
+            directory (str): The output directory.
+            shard_size (int, optional): The maximum number of records per shard. Defaults to 100000.
+        """
+        self.directory = directory
+        self.shard_size = shard_size
+        self.num_records = 0
+        self.shards = []
+        self._file = None
+        self._path = None
+        os.makedirs(directory, exist_ok=True)
+        # Shards of an earlier, larger split would otherwise be read along with the new ones.
+        for name in os.listdir(directory):
+            if name.startswith("part-") and name.endswith((".jsonl", ".jsonl.tmp")):
+                os.remove(os.path.join(directory, name))
+
+    def write(self, record):
+        """
+        Appends one record, starting a new shard when the current one is full.
+
+        Args:
+            record (dict): The record.
+        """
+        if self._file is None or self.num_records % self.shard_size == 0:
+            self._finish()
+            self._path = os.path.join(self.directory, f"part-{len(self.shards):05d}.jsonl")
+            self._file = open(self._path + ".tmp", "w", encoding="utf-8")
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self.num_records += 1
+
+    def _finish(self):
+        if self._file is not None:
+            self._file.close()
+            os.replace(self._path + ".tmp", self._path)
+            self.shards.append(self._path)
+            self._file = None
+
+    def close(self):
+        """
+        Completes the last shard.
+        """
+        self._finish()
+
+def split_dataset(input_path, out_dir="splits", val_ratio=0.2, seed=42, shard_size=100000):
+    """
+    Computes statistics and writes a hash-based train/validation split in a single streaming pass.
 
     Args:
-        filename (str): The path to the file where data will be saved.
-        data (list): The data to save.
+        input_path (str): A {"data": [...]} JSON file, a .jsonl/.ndjson file or a directory of JSONL shards.
+        out_dir (str, optional): The output directory; shards go to its "train" and "val"
+            subdirectories and the statistics to "stats.json". Defaults to "splits".
+        val_ratio (float, optional): The proportion of data to use for validation. Defaults to 0.2.
+        seed (int, optional): The split seed. Defaults to 42.
+        shard_size (int, optional): The maximum number of records per shard. Defaults to 100000.
 
     Returns:
-        None
+        dict: The statistics of the whole corpus ("dataset") and of each split ("train", "val"),
+            plus the realized validation ratio per label ("val_ratio_by_label").
     """
-    with open(filename, 'w') as f:
-        json.dump({"data": data}, f, indent=4)
+    stats = DatasetStats()
+    split_labels = {"train": Counter(), "val": Counter()}
+    writers = {name: ShardWriter(os.path.join(out_dir, name), shard_size) for name in split_labels}
+    try:
+        for item in iter_records(input_path):
+            stats.update(item)
+            bucket = split_bucket(item, val_ratio, seed)
+            split_labels[bucket][item["Label"]] += 1
+            writers[bucket].write(item)
+    finally:
+        for writer in writers.values():
+            writer.close()
 
+    report = {
+        "dataset": stats.summary(),
+        "val_ratio": val_ratio,
+        "seed": seed,
+        "val_ratio_by_label": {label: split_labels["val"][label] / count for label, count in sorted(stats.labels.items())},
+    }
+    for name, writer in writers.items():
+        report[name] = {"num_examples": writer.num_records, "shards": writer.shards,
+                        "label_distribution": dict(sorted(split_labels[name].items()))}
+    with open(os.path.join(out_dir, "stats.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    return report
 
 if __name__ == "__main__":
-    filename = "exercises.json"
-    data = load_data(filename)
-    stats = analyze_data(data)
+    parser = argparse.ArgumentParser(description="Analyze a corpus and split it into train/validation JSONL shards.")
+    parser.add_argument("input", nargs="?", default="exercises.json",
+                        help="A {\"data\": [...]} JSON file, a .jsonl/.ndjson file or a directory of JSONL shards.")
+    parser.add_argument("--out-dir", default="splits")
+    parser.add_argument("--val-ratio", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--shard-size", type=int, default=100000)
+    args = parser.parse_args()
+
+    report = split_dataset(args.input, args.out_dir, args.val_ratio, args.seed, args.shard_size)
+    stats = report["dataset"]
     print("Dataset Statistics:")
+    print(f"  Number of examples: {stats['num_examples']}")
     print(f"  Max sentence length: {stats['max_sentence_length']}")
     print(f"  Average sentence length: {stats['avg_sentence_length']:.2f}")
     print(f"  Min sentence length: {stats['min_sentence_length']}")
-    print(f"  Vocabulary size: {stats['vocab_size']}")
+    print(f"  95th percentile sentence length: {stats['p95_sentence_length']}")
+    print(f"  Vocabulary size: {stats['vocab_size']}{'' if stats['vocab_size_exact'] else ' (estimated)'}")
     print("  Label distribution:")
     for label, count in stats['label_distribution'].items():
-        print(f"    {label}: {count}")
-    
-    train_data, val_data = train_val_split(data, val_ratio=0.2)
-    print("\nSplit Information:")
-    print(f"  Number of training examples: {len(train_data)}")
-    print(f"  Number of validation examples: {len(val_data)}")
-
-    train_data, val_data = train_val_split(data, val_ratio=0.2)
+        print(f"    {label}: {count} ({report['val_ratio_by_label'][label]:.1%} in validation)")
 
-    save_data("train_data.json", train_data)
-    save_data("val_data.json", val_data)
-
-    print("Train and validation data saved to 'train_data.json' and 'val_data.json'.")
\ No newline at end of file
+    print("\nSplit Information:")
+    print(f"  Number of training examples: {report['train']['num_examples']}")
+    print(f"  Number of validation examples: {report['val']['num_examples']}")
+    print(f"Shards written to '{args.out_dir}/train' and '{args.out_dir}/val'; statistics to '{args.out_dir}/stats.json'.")
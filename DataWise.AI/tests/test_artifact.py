@@ -0,0 +1,108 @@
+"""
+Round-trips models through the pickle-free artifact format and checks that
+truncated or corrupt files are rejected with a clear error.
+
+Run from the DataWise.AI directory:
+    python3 -m pytest tests/test_artifact.py
+"""
+import json
+import struct
+import numpy as np
+import pytest
+
+from artifact import MAGIC, export_model, load_artifact, read_manifest
+from model import TextCNN
+
+def make_model():
+    np.random.seed(0)
+    return TextCNN(vocab_size=80, embedding_dim=8, max_len=12, num_filters=6,
+                   filter_sizes=[2, 3, 4], num_classes=5)
+
+def make_batch(model):
+    rng = np.random.default_rng(0)
+    X = rng.integers(1, model.vocab_size, size=(16, model.max_len))
+    X[::2, 7:] = 0
+    return X
+
+@pytest.mark.parametrize("precision", ["float64", "float32"])
+@pytest.mark.parametrize("mmap", [True, False])
+def test_round_trip(tmp_path, precision, mmap):
+    model = make_model()
+    path = tmp_path / "cnn_model.bin"
+    export_model(model, str(path), precision)
+    loaded = load_artifact(str(path), mmap=mmap)
+
+    assert loaded.precision == precision
+    assert (loaded.vocab_size, loaded.embedding_dim, loaded.max_len, loaded.num_filters, loaded.num_classes) == \
+        (model.vocab_size, model.embedding_dim, model.max_len, model.num_filters, model.num_classes)
+    assert loaded.filter_sizes == model.filter_sizes
+    dtype = np.dtype(precision)
+    np.testing.assert_array_equal(loaded.embeddings, model.embeddings.astype(dtype))
+    for fs in model.filter_sizes:
+        np.testing.assert_array_equal(loaded.conv_filters[fs], model.conv_filters[fs].astype(dtype))
+    np.testing.assert_array_equal(loaded.fc_weights, model.fc_weights.astype(dtype))
+    np.testing.assert_array_equal(loaded.fc_bias, model.fc_bias.astype(dtype))
+
+    X = make_batch(model)
+    np.testing.assert_allclose(loaded.predict(X), model.predict(X), atol=1e-5)
+    np.testing.assert_array_equal(loaded.predict(X).argmax(axis=1), model.predict(X).argmax(axis=1))
+
+def test_int8_round_trip(tmp_path):
+    model = make_model()
+    path = tmp_path / "cnn_model.bin"
+    export_model(model, str(path), "int8")
+    loaded = load_artifact(str(path))
+
+    assert loaded.precision == "int8"
+    X = make_batch(model)
+    np.testing.assert_allclose(loaded.predict(X), model.predict(X), atol=2e-2)
+
+def test_mmap_arrays_are_read_only(tmp_path):
+    path = tmp_path / "cnn_model.bin"
+    export_model(make_model(), str(path))
+    loaded = load_artifact(str(path))
+    assert not loaded.embeddings.flags.writeable
+
+# The file ends with the 64-byte aligned block of fc_bias (20 bytes of data), so every
+# size here cuts into array data.
+@pytest.mark.parametrize("mmap", [True, False])
+@pytest.mark.parametrize("missing", [50, 200, 1000])
+def test_truncated_data_is_rejected(tmp_path, mmap, missing):
+    path = tmp_path / "cnn_model.bin"
+    export_model(make_model(), str(path))
+    data = path.read_bytes()
+    path.write_bytes(data[:-missing])
+    with pytest.raises(ValueError, match="truncated"):
+        load_artifact(str(path), mmap=mmap)
+
+def test_truncated_header_is_rejected(tmp_path):
+    path = tmp_path / "cnn_model.bin"
+    export_model(make_model(), str(path))
+    data = path.read_bytes()
+    for size in (len(MAGIC) + 4, len(MAGIC) + struct.calcsize("<IQ") + 10):
+        path.write_bytes(data[:size])
+        with pytest.raises(ValueError, match="truncated"):
+            load_artifact(str(path))
+
+def test_not_an_artifact_is_rejected(tmp_path):
+    path = tmp_path / "cnn_model.bin"
+    path.write_bytes(b"\x80\x04not an artifact")
+    with pytest.raises(ValueError, match="not a TextCNN model artifact"):
+        load_artifact(str(path))
+
+def test_wrong_shape_is_rejected(tmp_path):
+    path = tmp_path / "cnn_model.bin"
+    export_model(make_model(), str(path))
+    manifest, _ = read_manifest(str(path))
+    manifest["config"]["num_classes"] += 1
+    header = json.dumps(manifest).encode("utf-8")
+    old_header_len = struct.unpack("<IQ", path.read_bytes()[len(MAGIC):len(MAGIC) + struct.calcsize("<IQ")])[1]
+    # Same-length manifest, so the array offsets stay valid.
+    header = header.ljust(old_header_len)
+    assert len(header) == old_header_len
+    data = bytearray(path.read_bytes())
+    start = len(MAGIC) + struct.calcsize("<IQ")
+    data[start:start + old_header_len] = header
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="fc_weights"):
+        load_artifact(str(path))
@@ -0,0 +1,177 @@
+"""
+Checks the vectorized TextCNN.backward against the original loop implementation
+and against finite differences, on full-length batches and on batches with
+padding (trailing and leading zeros, and an all-PAD row).
+
+Run from the DataWise.AI directory:
+    python3 -m pytest tests/test_backward.py
+"""
+import copy
+import numpy as np
+import pytest
+
+from activations import relu, d_relu, cross_entropy_loss
+from data_utils import one_hot
+from model import TextCNN
+
+def loop_backward(model, X, y_onehot):
+    """
+    Reference backward pass with the original per-sample, per-filter and per-window loops.
+
+    Args:
+        model (TextCNN): The model, after a forward pass on X.
+        X (np.ndarray): The input batch of text sequences (shape: [batch_size, max_len]).
+        y_onehot (np.ndarray): One-hot encoded labels (shape: [batch_size, num_classes]).
+    """
+    d_logits = (model.probs - y_onehot) / model.batch_size
+    dW_fc = np.dot(model.fc_input.T, d_logits)
+    db_fc = np.sum(d_logits, axis=0, keepdims=True)
+    d_fc_input = np.dot(d_logits, model.fc_weights.T)
+
+    d_pooled_splits = np.split(d_fc_input, len(model.filter_sizes), axis=1)
+
+    embedded = model.embeddings[X]
+    d_embeddings = np.zeros_like(embedded)
+    d_filter_sum = {}
+
+    for idx, fs in enumerate(model.filter_sizes):
+        conv_out = relu(np.stack([np.tensordot(embedded[:, i:i+fs, :], model.conv_filters[fs], axes=([1, 2], [0, 1]))
+                                  for i in range(model.max_len - fs + 1)], axis=1))
+        d_pool = d_pooled_splits[idx]
+        d_conv = np.zeros_like(conv_out)
+
+        for b in range(model.batch_size):
+            for f in range(model.num_filters):
+                max_index = np.argmax(conv_out[b, :, f])
+                d_conv[b, max_index, f] = d_pool[b, f]
+
+        d_conv *= d_relu(conv_out)
+
+        for i in range(model.max_len - fs + 1):
+            window = embedded[:, i:i+fs, :]
+            d_conv_slice = d_conv[:, i, :]
+
+            d_filter = np.tensordot(window, d_conv_slice, axes=([0],[0]))
+            d_filter_sum.setdefault(fs, 0)
+            d_filter_sum[fs] += d_filter
+
+            for b in range(model.batch_size):
+                d_embeddings[b, i:i+fs, :] += np.tensordot(d_conv_slice[b, :], model.conv_filters[fs], axes=([0], [2]))
+
+    for fs in model.filter_sizes:
+        model.conv_filters[fs] -= model.lr * d_filter_sum[fs]
+
+    for b in range(model.batch_size):
+        for i in range(model.max_len):
+            word_idx = X[b, i]
+            model.embeddings[word_idx] -= model.lr * d_embeddings[b, i, :]
+
+    model.fc_weights -= model.lr * dW_fc
+    model.fc_bias -= model.lr * db_fc
+
+def parameters(model):
+    """
+    Lists the trainable arrays of a model under stable names.
+
+    Args:
+        model (TextCNN): The model.
+
+    Returns:
+        dict: A dictionary mapping parameter names to arrays.
+    """
+    params = {"embeddings": model.embeddings, "fc_weights": model.fc_weights, "fc_bias": model.fc_bias}
+    for fs in model.filter_sizes:
+        params[f"conv_filters[{fs}]"] = model.conv_filters[fs]
+    return params
+
+def make_model():
+    np.random.seed(0)
+    return TextCNN(vocab_size=60, embedding_dim=8, max_len=12, num_filters=6,
+                   filter_sizes=[2, 3, 4], num_classes=4, learning_rate=0.01)
+
+def make_batch(kind, batch_size=8, max_len=12, vocab_size=60, num_classes=4):
+    """
+    Builds an input batch and one-hot labels.
+
+    Args:
+        kind (str): "full" (no padding), "padded" (trailing zeros of varying length),
+            "inner_zeros" (leading, inner and trailing zeros) or "all_pad" (padded, with
+            one row of zeros only).
+
+    Returns:
+        tuple: (X, y_onehot).
+    """
+    rng = np.random.default_rng(0)
+    X = rng.integers(1, vocab_size, size=(batch_size, max_len))
+    if kind != "full":
+        for row, length in enumerate(rng.integers(1, max_len, size=batch_size)):
+            X[row, length:] = 0
+    if kind == "inner_zeros":
+        X[:, 0] = 0
+        X[::2, 2] = 0
+    if kind == "all_pad":
+        X[3] = 0
+    return X, one_hot(rng.integers(0, num_classes, size=batch_size), num_classes)
+
+BATCHES = ["full", "padded", "inner_zeros", "all_pad"]
+
+@pytest.mark.parametrize("kind", BATCHES)
+def test_matches_loop_backward(kind):
+    model = make_model()
+    X, y_onehot = make_batch(kind)
+    reference, fast = copy.deepcopy(model), copy.deepcopy(model)
+    reference.forward(X)
+    loop_backward(reference, X, y_onehot)
+    fast.forward(X)
+    fast.backward(X, y_onehot)
+
+    expected, actual = parameters(reference), parameters(fast)
+    for name in expected:
+        np.testing.assert_allclose(actual[name], expected[name], rtol=1e-7, atol=1e-12, err_msg=name)
+
+@pytest.mark.parametrize("kind", BATCHES)
+def test_matches_finite_differences(kind, samples=5, eps=1e-6):
+    model = make_model()
+    X, y_onehot = make_batch(kind)
+    rng = np.random.default_rng(1)
+    stepped = copy.deepcopy(model)
+    stepped.forward(X)
+    stepped.backward(X, y_onehot)
+
+    before, after = parameters(model), parameters(stepped)
+    for name, param in before.items():
+        if name == "embeddings":
+            rows = rng.choice(np.unique(X), size=samples)
+            if (X == 0).any():
+                rows = np.append(rows, 0)
+            entries = [(row, rng.integers(param.shape[1])) for row in rows]
+        else:
+            entries = [tuple(rng.integers(dim) for dim in param.shape) for _ in range(samples)]
+        for entry in entries:
+            original = param[entry]
+            param[entry] = original + eps
+            loss_plus = cross_entropy_loss(model.forward(X), y_onehot)
+            param[entry] = original - eps
+            loss_minus = cross_entropy_loss(model.forward(X), y_onehot)
+            param[entry] = original
+
+            numeric = (loss_plus - loss_minus) / (2 * eps)
+            analytic = (before[name][entry] - after[name][entry]) / model.lr
+            assert abs(numeric - analytic) <= 1e-5 + 1e-3 * abs(numeric), (name, entry, numeric, analytic)
+
+def test_all_pad_row_is_not_zero_features():
+    model = make_model()
+    X, _ = make_batch("all_pad")
+    full = copy.deepcopy(model)
+    full._trim = lambda X: X
+    np.testing.assert_array_equal(model.features(X), full.features(X))
+    assert model.features(X)[3].any()
+
+def test_integer_labels_match_one_hot():
+    model = make_model()
+    X, y_onehot = make_batch("padded")
+    one, integer = copy.deepcopy(model), copy.deepcopy(model)
+    one.train_on_batch(X, y_onehot)
+    integer.train_on_batch(X, y_onehot.argmax(axis=1))
+    for name, param in parameters(one).items():
+        np.testing.assert_allclose(parameters(integer)[name], param, rtol=1e-10, atol=1e-14, err_msg=name)
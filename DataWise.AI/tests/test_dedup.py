@@ -0,0 +1,41 @@
+"""
+Checks that near duplicates do not chain: when A ~ B and B ~ C but C is not similar
+to A, B is dropped as a duplicate of A and C is kept, however the texts are batched.
+
+Run from the DataWise.AI directory:
+    python3 -m pytest tests/test_dedup.py
+"""
+import numpy as np
+import pytest
+
+from dedup import Deduplicator
+
+WORDS = "how do you find the shortest path between two nodes of a weighted directed graph with negative edges".split()
+A = " ".join(WORDS)
+B = " ".join(WORDS[:-2] + ["in", "linear"])
+C = " ".join(["tell", "me"] + WORDS[2:-2] + ["in", "linear"])
+
+def estimated_similarity(deduplicator, x, y):
+    signatures, _ = deduplicator.signatures([x, y])
+    stored = (signatures & np.uint32((1 << deduplicator.bits) - 1)).astype(np.uint8)
+    return deduplicator._similarity(stored[0], stored[1])
+
+def test_chain_texts_are_a_chain():
+    deduplicator = Deduplicator()
+    assert estimated_similarity(deduplicator, A, B) >= deduplicator.threshold
+    assert estimated_similarity(deduplicator, B, C) >= deduplicator.threshold
+    assert estimated_similarity(deduplicator, A, C) < deduplicator.threshold
+
+@pytest.mark.parametrize("batches", [[[A, B, C]], [[A], [B], [C]], [[A, B], [C]], [[A], [B, C]]])
+def test_duplicates_do_not_chain(batches):
+    deduplicator = Deduplicator()
+    duplicate_of = np.concatenate([deduplicator.add(batch)[0] for batch in batches])
+    assert duplicate_of.tolist() == [-1, 0, -1]
+    assert deduplicator.num_near == 1
+
+def test_duplicate_of_a_kept_text_is_found_across_batches():
+    deduplicator = Deduplicator()
+    deduplicator.add([A, "an unrelated question about sorting arrays"])
+    duplicate_of, exact = deduplicator.add([B, A.upper()])
+    assert duplicate_of.tolist() == [0, 0]
+    assert exact.tolist() == [False, True]
@@ -0,0 +1,58 @@
+"""
+Checks that the lock-free counters, gauges and histograms lose no measurements when
+several threads record at once, and that pending measurements show up when rendered.
+
+Run from the DataWise.AI directory:
+    python3 -m pytest tests/test_metrics.py
+"""
+import threading
+
+from metrics import Counter, Gauge, Histogram, Registry
+
+THREADS = 8
+PER_THREAD = 5000
+
+def run_threads(target):
+    threads = [threading.Thread(target=target) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def test_concurrent_measurements_are_not_lost():
+    registry = Registry()
+    counter = Counter("c_total", "A counter.", ["label"], registry=registry).labels("a")
+    gauge = Gauge("g", "A gauge.", registry=registry).labels()
+    histogram = Histogram("h_seconds", "A histogram.", registry=registry, buckets=(0.5,)).labels()
+
+    def record():
+        for i in range(PER_THREAD):
+            counter.inc()
+            gauge.inc(2)
+            gauge.dec()
+            histogram.observe(0.25 if i % 2 else 1.0)
+
+    run_threads(record)
+    total = THREADS * PER_THREAD
+    assert counter.value == total
+    assert gauge.value == total
+    lines = registry.render().splitlines()
+    assert f'h_seconds_bucket{{le="0.5"}} {total // 2}' in lines
+    assert f'h_seconds_bucket{{le="+Inf"}} {total}' in lines
+    assert f"h_seconds_sum {total // 2 * 1.25!r}" in lines
+
+def test_pending_measurements_are_rendered():
+    registry = Registry()
+    Counter("c_total", "A counter.", registry=registry).labels().inc(3)
+    Histogram("h_seconds", "A histogram.", registry=registry, buckets=(1.0,)).labels().observe(0.5)
+    lines = registry.render().splitlines()
+    assert "c_total 3" in lines
+    assert 'h_seconds_bucket{le="1.0"} 1' in lines
+    assert "h_seconds_count 1" in lines
+
+def test_set_replaces_pending_increments():
+    gauge = Gauge("g", "A gauge.").labels()
+    gauge.inc(5)
+    gauge.set(2)
+    gauge.inc()
+    assert gauge.value == 3
@@ -0,0 +1,162 @@
+import json
+import os
+import struct
+from functools import lru_cache
+import numpy as np
+
+from data_utils import encode_sentences
+
+VOCAB_MAGIC = b"DWVOCAB\0"
+VOCAB_VERSION = 1
+
+def save_vocab(word2idx, filename):
+    """
+    Saves a vocabulary in a compact binary form.
+
+    The file holds a magic string, the format version and the number of words, followed
+    by the int32 index of every word and then the words themselves as one UTF-8 block
+    separated by newlines (tokens never contain whitespace).
+
+    Args:
+        word2idx (dict): A dictionary mapping words to indices.
+        filename (str): The path of the binary vocabulary file.
+    """
+    words = list(word2idx)
+    ids = np.fromiter((word2idx[word] for word in words), dtype="<i4", count=len(words))
+    blob = "\n".join(words).encode("utf-8")
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "wb") as f:
+        f.write(VOCAB_MAGIC)
+        f.write(struct.pack("<II", VOCAB_VERSION, len(words)))
+        f.write(ids.tobytes())
+        f.write(blob)
+    os.replace(tmp_filename, filename)
+
+def read_vocab(filename):
+    """
+    Reads a vocabulary written by `save_vocab`.
+
+    Args:
+        filename (str): The path of the binary vocabulary file.
+
+    Returns:
+        dict: A dictionary mapping words to indices.
+    """
+    with open(filename, "rb") as f:
+        data = f.read()
+    if data[:len(VOCAB_MAGIC)] != VOCAB_MAGIC:
+        raise ValueError(f"'{filename}' is not a binary vocabulary file.")
+    offset = len(VOCAB_MAGIC)
+    version, count = struct.unpack_from("<II", data, offset)
+    if version != VOCAB_VERSION:
+        raise ValueError(f"Unsupported vocabulary version {version} (expected {VOCAB_VERSION}).")
+    offset += struct.calcsize("<II")
+    ids = np.frombuffer(data, dtype="<i4", count=count, offset=offset)
+    words = data[offset + 4 * count:].decode("utf-8").split("\n") if count else []
+    return dict(zip(words, ids.tolist()))
+
+def load_vocab(filename="word2idx.json"):
+    """
+    Loads a JSON vocabulary through its compiled binary copy.
+
+    The binary copy sits next to the JSON file with a ".bin" extension. It is used when it
+    is at least as new as the JSON file, and (re)written otherwise so that later loads skip
+    JSON parsing. Failing to write the copy (e.g. on a read-only filesystem) is not an error.
+
+    Args:
+        filename (str, optional): The path of the JSON vocabulary. Defaults to "word2idx.json".
+
+    Returns:
+        dict: A dictionary mapping words to indices.
+    """
+    binary_filename = os.path.splitext(filename)[0] + ".bin"
+    if os.path.exists(binary_filename) and os.path.getmtime(binary_filename) >= os.path.getmtime(filename):
+        return read_vocab(binary_filename)
+    with open(filename, "r") as f:
+        word2idx = json.load(f)
+    try:
+        save_vocab(word2idx, binary_filename)
+    except OSError:
+        pass
+    return word2idx
+
+class Encoder:
+    """
+    Encodes sentences into fixed-length int32 index sequences.
+
+    Single sentences go through a bounded LRU cache, so exercises that are classified
+    repeatedly are only tokenized once. Batches are encoded straight into one
+    preallocated (n, max_len) array.
+
+    Attributes:
+        word2idx (dict): A dictionary mapping words to indices.
+        max_len (int): The length of the encoded sequences.
+        cache_size (int): The maximum number of cached sentences.
+    """
+    def __init__(self, word2idx, max_len, cache_size=4096):
+        """
+        Initializes the encoder.
+
+        Args:
+            word2idx (dict): A dictionary mapping words to indices.
+            max_len (int): The length of the encoded sequences.
+            cache_size (int, optional): The maximum number of cached sentences. Defaults to 4096.
+        """
+        self.word2idx = word2idx
+        self.max_len = max_len
+        self.cache_size = cache_size
+        self._cached_encode = lru_cache(maxsize=cache_size)(self._encode)
+
+    @classmethod
+    def load(cls, filename="word2idx.json", max_len=42, cache_size=4096):
+        """
+        Creates an encoder from a vocabulary file, using its compiled binary copy when available.
+
+        Args:
+            filename (str, optional): The JSON vocabulary path. Defaults to "word2idx.json".
+            max_len (int, optional): The length of the encoded sequences. Defaults to 42.
+            cache_size (int, optional): The maximum number of cached sentences. Defaults to 4096.
+
+        Returns:
+            Encoder: The encoder.
+        """
+        return cls(load_vocab(filename), max_len, cache_size)
+
+    def _encode(self, sentence):
+        encoded = self.encode_batch([sentence])[0]
+        encoded.flags.writeable = False
+        return encoded
+
+    def encode(self, sentence):
+        """
+        Encodes one sentence, reusing the cached result for recently seen sentences.
+
+        Args:
+            sentence (str): The sentence to encode.
+
+        Returns:
+            np.ndarray: The read-only encoded sentence (shape: [max_len], dtype: int32).
+        """
+        return self._cached_encode(sentence)
+
+    def encode_batch(self, sentences, out=None):
+        """
+        Encodes a batch of sentences into one array.
+
+        Args:
+            sentences (list): The sentences to encode.
+            out (np.ndarray, optional): A preallocated int32 array of shape (len(sentences), max_len) to fill.
+
+        Returns:
+            np.ndarray: The encoded sentences (shape: [len(sentences), max_len], dtype: int32).
+        """
+        return encode_sentences(sentences, self.word2idx, self.max_len, out=out)
+
+    def cache_info(self):
+        """
+        Returns the hit/miss statistics of the sentence cache.
+
+        Returns:
+            functools._CacheInfo: The cache statistics.
+        """
+        return self._cached_encode.cache_info()
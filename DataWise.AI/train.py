@@ -1,38 +1,60 @@
+import os
 import numpy as np
 import json
-from tqdm import trange
-from data_utils import load_data, build_vocab, prepare_dataset
-from model import TextCNN, save_model, load_model
+from contextlib import nullcontext
+from tqdm import tqdm
+from data_utils import DataLoader, BucketSampler
+from dataset_cache import load_dataset
+from model import TextCNN, save_model, load_model, sequence_lengths
+from optimizers import get_optimizer
+from artifact import export_model
+from parallel import DataParallelTrainer
+from evaluate import evaluate, label_names
+from cascade import train_fast_head, save_fast_head
+from tokenizer import save_vocab
 
-train_filename = "train_data.json"
-val_filename = "val_data.json"
+# JSON files, or directories of JSONL shards. The shards written by splitter.py are used
+# when they exist, and the train/validation JSON files otherwise.
+if os.path.isdir("splits/train") and os.path.isdir("splits/val"):
+    train_filename, val_filename = "splits/train", "splits/val"
+else:
+    train_filename, val_filename = "train_data.json", "val_data.json"
+max_len = 42
 
-train_data = load_data(train_filename)
-val_data = load_data(val_filename)
+# Encoded arrays are cached under cache/ keyed by the data, max_len and tokenizer code,
+# so unchanged data is memory-mapped instead of re-parsed and re-encoded.
+dataset = load_dataset(train_filename, val_filename, max_len)
+print("Loaded encoded dataset from cache." if dataset["cache_hit"] else "Encoded dataset and cached it.")
 
-word2idx = build_vocab(train_data)
+word2idx = dataset["word2idx"]
 vocab_size = len(word2idx)
 
-labels_set = sorted({item["Label"] for item in train_data})
-label2idx = {label: idx for idx, label in enumerate(labels_set)}
+label2idx = dataset["label2idx"]
 num_classes = len(label2idx)
 
 with open("word2idx.json", "w") as f:
     json.dump(word2idx, f)
+save_vocab(word2idx, "word2idx.bin")
 with open("label2idx.json", "w") as f:
     json.dump(label2idx, f)
 
-max_len = 42
-
-X_train, y_train, y_train_onehot = prepare_dataset(train_data, word2idx, label2idx, max_len)
-X_val, y_val, y_val_onehot = prepare_dataset(val_data, word2idx, label2idx, max_len)
+X_train, y_train = dataset["X_train"], dataset["y_train"]
+X_val, y_val = dataset["X_val"], dataset["y_val"]
 
 embedding_dim = 50
 filter_sizes = [2, 3, 4]
 num_filters = 64
 learning_rate = 0.001
+optimizer_name = "adam"
 num_epochs = 1
 batch_size = 32
+# Set above 0 to shard each batch over that many worker processes (use a larger batch_size).
+num_workers = 0
+# Group sentences of similar length so each batch is only convolved up to its longest sentence.
+bucket_by_length = True
+eval_chunk_size = 1024
+# Confidence (softmax margin) above which the cascade trusts the fast head; see cascade.py.
+cascade_threshold = 0.3
 
 try:
     model = load_model()
@@ -44,32 +66,34 @@ except Exception as e:
                     num_filters=num_filters,
                     filter_sizes=filter_sizes,
                     num_classes=num_classes,
-                    learning_rate=learning_rate)
+                    learning_rate=learning_rate,
+                    optimizer=get_optimizer(optimizer_name, learning_rate))
     print("No saved model found. Training from scratch.")
 
-num_batches = int(np.ceil(len(X_train) / batch_size))
-for epoch in range(num_epochs):
-    epoch_loss = 0
-    indices = np.arange(len(X_train))
-    np.random.shuffle(indices)
-    X_train = X_train[indices]
-    y_train_onehot = y_train_onehot[indices]
-    
-    for i in trange(num_batches, desc=f"Epoch {epoch+1}"):
-        start = i * batch_size
-        end = min((i+1) * batch_size, len(X_train))
-        X_batch = X_train[start:end]
-        y_batch_onehot = y_train_onehot[start:end]
-        loss = model.train_on_batch(X_batch, y_batch_onehot)
-        epoch_loss += loss
-    avg_loss = epoch_loss / num_batches
-    print(f"Epoch {epoch+1} average loss: {avg_loss:.4f}")
+sampler = BucketSampler(sequence_lengths(X_train), batch_size) if bucket_by_length else None
+train_loader = DataLoader(X_train, y_train, batch_size=batch_size, shuffle=True, sampler=sampler)
+# The trainer is closed even if training fails or is interrupted, so its shared memory is freed.
+with DataParallelTrainer(model, num_workers) if num_workers > 0 else nullcontext(model) as trainer:
+    for epoch in range(num_epochs):
+        epoch_loss = 0
+        for X_batch, y_batch in tqdm(train_loader, desc=f"Epoch {epoch+1}"):
+            loss = trainer.train_on_batch(X_batch, y_batch)
+            epoch_loss += loss
+        avg_loss = epoch_loss / len(train_loader)
+        print(f"Epoch {epoch+1} average loss: {avg_loss:.4f}")
+
+# Validation runs in chunks, so its memory does not grow with the validation set.
+report = evaluate(model, X_val, y_val, label_names(label2idx), chunk_size=eval_chunk_size)
+print(f"Validation Accuracy: {report['accuracy']:.4f} ({report['samples_per_sec']:.0f} samples/sec)")
+with open("models/val_report.json", "w") as f:
+    json.dump(report, f, indent=2)
 
-val_preds = model.forward(X_val)
-val_labels = np.argmax(val_preds, axis=1)
-true_labels = np.argmax(y_val_onehot, axis=1)
-accuracy = np.mean(val_labels == true_labels)
-print(f"Validation Accuracy: {accuracy:.4f}")
+# The fast head of the cascade reuses the final embeddings, so it is trained last.
+head, head_loss = train_fast_head(model, X_train, y_train, threshold=cascade_threshold)
+fast_accuracy = np.mean(np.argmax(head.predict(model, X_val), axis=1) == y_val)
+print(f"Fast head loss: {head_loss:.4f}, validation accuracy: {fast_accuracy:.4f}")
 
 save_model(model)
+export_model(model)
+save_fast_head(head)
 print("Model saved!")
\ No newline at end of file